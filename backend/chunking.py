@@ -0,0 +1,158 @@
+import json
+import os
+import re
+from typing import Any, List, Optional, Tuple
+from langchain_core.documents import Document
+
+MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s+(.*\S)\s*$')
+TEXT_HEADING = re.compile(r'^(\d+)\.\s+(\S.{0,80})$')
+
+
+class StructureChunker:
+    """Split documents on their own structure instead of sentence embeddings.
+
+    Markdown splits on headings (so each `### TS-xxx` scenario is its own chunk),
+    JSON on top-level objects (one per API endpoint), plain text on numbered
+    sections and PDFs on pages. Chunks are capped at `max_chars`; sections smaller
+    than `min_chars` are merged with the next one. No embeddings are computed.
+    """
+
+    def __init__(self, max_chars: int = 1500, min_chars: int = 80):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks = []
+        for document in documents:
+            source = str(document.metadata.get("source", ""))
+            extension = os.path.splitext(source)[1].lower()
+            if extension == ".md":
+                sections = self.markdown_sections(document.page_content)
+            elif extension == ".json":
+                sections = self.json_sections(document.page_content)
+            elif extension == ".txt":
+                sections = self.text_sections(document.page_content)
+            else:
+                # PDF loaders already yield one document per page
+                sections = [("", document.page_content)]
+            for title, text in self.pack(sections):
+                for piece in self.cap(text):
+                    metadata = dict(document.metadata)
+                    if title:
+                        metadata["section"] = title
+                    chunks.append(Document(page_content=piece, metadata=metadata))
+        return chunks
+
+    def markdown_sections(self, text: str) -> List[Tuple[str, str]]:
+        sections, path, lines = [], [], []
+
+        def flush():
+            body = "\n".join(lines).strip()
+            if body:
+                # Carry the parent headings so a scenario chunk still says which feature it belongs to
+                parents = " > ".join(title for _, title in path[:-1])
+                text = f"{parents}\n{body}" if parents else body
+                sections.append((" > ".join(title for _, title in path), text))
+
+        for line in text.splitlines():
+            match = MARKDOWN_HEADING.match(line)
+            if match:
+                flush()
+                lines = [line]
+                level = len(match.group(1))
+                path = [(depth, title) for depth, title in path if depth < level] + [(level, match.group(2))]
+            elif line.strip() not in ("---", "***"):
+                lines.append(line)
+        flush()
+        return sections
+
+    def text_sections(self, text: str) -> List[Tuple[str, str]]:
+        sections, title, lines = [], "", []
+        for line in text.splitlines():
+            match = TEXT_HEADING.match(line)
+            if match and lines:
+                sections.append((title, "\n".join(lines).strip()))
+                lines = []
+            if match:
+                title = match.group(2)
+            lines.append(line)
+        if "".join(lines).strip():
+            sections.append((title, "\n".join(lines).strip()))
+        return sections
+
+    def json_sections(self, text: str) -> List[Tuple[str, str]]:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return self.text_sections(text)
+        return self.value_sections(data)
+
+    def value_sections(self, data: Any, heading: str = "") -> List[Tuple[str, str]]:
+        """One section per key or element of `data`; `heading` starts every section title."""
+        # Descend through single-key wrappers such as {"paths": {...}}
+        prefix = [heading] if heading else []
+        while isinstance(data, dict) and len(data) == 1:
+            key, value = next(iter(data.items()))
+            if not isinstance(value, (dict, list)):
+                break
+            prefix.append(str(key))
+            data = value
+        items: List[Tuple[str, Any]]
+        if isinstance(data, dict):
+            items = [(str(key), value) for key, value in data.items()]
+        elif isinstance(data, list):
+            items = [(f"[{position}]", value) for position, value in enumerate(data)]
+        else:
+            items = [("", data)]
+        sections = []
+        for key, value in items:
+            title = " ".join(prefix + [key]).strip()
+            sections.append((title, f"{title}\n{json.dumps(value, indent=2, ensure_ascii=False)}".strip()))
+        return sections
+
+    def pack(self, sections: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        packed = []
+        for title, text in sections:
+            if packed and len(packed[-1][1]) < self.min_chars and \
+                    len(packed[-1][1]) + len(text) + 2 <= self.max_chars:
+                previous_title, previous_text = packed[-1]
+                packed[-1] = (previous_title or title, f"{previous_text}\n\n{text}")
+            else:
+                packed.append((title, text))
+        return packed
+
+    def split_value(self, title: str, data: Any) -> List[str]:
+        """Pieces of at most `max_chars` for one oversized JSON object, split on its own keys."""
+        pieces = []
+        for _, text in self.pack(self.value_sections(data, title)):
+            if len(text) <= self.max_chars:
+                pieces.append(text)
+                continue
+            # Hard-wrapped pieces repeat the title so each still names its endpoint or schema
+            for piece in self.cap(text, max(self.max_chars - len(title) - 1, 1)):
+                pieces.append(piece if piece.startswith(title) else f"{title}\n{piece}")
+        return pieces
+
+    def cap(self, text: str, max_chars: Optional[int] = None) -> List[str]:
+        max_chars = max_chars or self.max_chars
+        if len(text) <= max_chars:
+            return [text]
+        pieces, current = [], ""
+        for paragraph in re.split(r'\n\s*\n', text):
+            while len(paragraph) > max_chars:
+                # Hard-wrap oversized paragraphs at the last whitespace before the cap
+                cut = paragraph.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(paragraph[:cut].strip())
+                paragraph = paragraph[cut:].strip()
+            if current and len(current) + len(paragraph) + 2 > max_chars:
+                pieces.append(current)
+                current = paragraph
+            else:
+                current = f"{current}\n\n{paragraph}" if current else paragraph
+        if current:
+            pieces.append(current)
+        return [piece for piece in pieces if piece.strip()]
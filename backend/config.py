@@ -3,4 +3,42 @@ GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
 LLM_MODEL = "gemini-2.5-flash"
 CHUNK_THRESHOLD = "standard_deviation"
-RETRIEVAL_K = 5
\ No newline at end of file
+RETRIEVAL_K = 5
+CHROMA_DIR = "./chroma_db"
+MANIFEST_FILE = "manifest.json"
+EMBEDDING_CACHE_PATH = "./embedding_cache/embeddings.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))  # floor when throttling shrinks concurrency
+LLM_RPM = int(os.getenv("LLM_RPM", "0"))  # provider requests-per-minute quota, 0 = unlimited
+LLM_TPM = int(os.getenv("LLM_TPM", "0"))  # provider tokens-per-minute quota, 0 = unlimited
+LLM_BURST_SECONDS = float(os.getenv("LLM_BURST_SECONDS", "10"))  # quota the RPM/TPM buckets may spend at once
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "800"))  # TPM charge before usage is known
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "120"))  # per call, including retries and backoff
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "4"))  # retries after throttling or transient errors
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "20"))
+HTML_TOKEN_BUDGET = int(os.getenv("HTML_TOKEN_BUDGET", "2500"))
+BATCH_SCRIPT_CONCURRENCY = int(os.getenv("BATCH_SCRIPT_CONCURRENCY", "4"))
+LLM_CACHE_PATH = "./llm_cache/responses.sqlite"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "semantic")  # "semantic" or "structure"
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")  # "chroma" or "quantized" (in-process NumPy index)
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")  # quantized backend storage: "float16" or "int8"
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1") == "1"  # fuse BM25 with vector search
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # retrieved context per prompt
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))  # cosine similarity
+WORKSPACES_DIR = os.getenv("WORKSPACES_DIR", "./workspaces")  # non-default workspaces live here
+WORKSPACE_MEMORY_CAP_MB = int(os.getenv("WORKSPACE_MEMORY_CAP_MB", "1024"))  # loaded indexes, LRU-evicted above this
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))  # finished build jobs kept for /jobs/{id}
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "100"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"  # per-stage Server-Timing header on every response
+TEMPLATE_SCRIPTS = os.getenv("TEMPLATE_SCRIPTS", "1") == "1"  # rule-based scripts for simple steps, LLM only as fallback
+SCRIPT_REPAIR_ATTEMPTS = int(os.getenv("SCRIPT_REPAIR_ATTEMPTS", "2"))  # validate/repair rounds per generated script
+TEST_CASE_STORE_PATH = "./test_case_store/cases.sqlite"
+TEST_CASE_DUP_THRESHOLD = float(os.getenv("TEST_CASE_DUP_THRESHOLD", "0.92"))  # cosine similarity of scenario + steps
+FEATURE_CLUSTER_THRESHOLD = float(os.getenv("FEATURE_CLUSTER_THRESHOLD", "0.85"))  # cosine similarity of feature names
@@ -0,0 +1,107 @@
+import os
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from tokens import estimate_tokens
+
+
+class AssembledContext:
+    """Prompt context plus which sources actually made it in."""
+
+    def __init__(self, text: str, sources: List[Dict[str, Any]], stats: Dict[str, int]):
+        self.text = text
+        self.sources = sources
+        self.stats = stats
+
+    @property
+    def source_names(self) -> List[str]:
+        return [source["source"] for source in self.sources]
+
+
+class ContextAssembler:
+    """Turns ranked chunks into a prompt context that fits a token budget.
+
+    Near-duplicates (cosine similarity of their embeddings above `dedup_threshold`)
+    are dropped, neighbouring chunks of the same file are merged into one block,
+    and blocks are added in relevance order while they fit the budget.
+    """
+
+    def __init__(self, embeddings: Optional[Embeddings], token_budget: int, dedup_threshold: float = 0.95):
+        self.embeddings = embeddings
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+
+    def assemble(self, documents: List[Document]) -> AssembledContext:
+        kept = self.drop_near_duplicates(documents)
+        blocks = self.merge_adjacent(kept)
+
+        parts, sources, used = [], {}, 0
+        for block in blocks:
+            text = self.render(block)
+            tokens = estimate_tokens(text)
+            if used + tokens > self.token_budget:
+                if parts:
+                    continue  # a smaller, less relevant block may still fit
+                # Never return an empty context just because the best block is long
+                text = text[:self.token_budget * 4]
+                tokens = estimate_tokens(text)
+            parts.append(text)
+            used += tokens + 1
+            name = self.source_name(block[0])
+            entry = sources.setdefault(name, {"source": name, "chunks": 0, "tokens": 0})
+            entry["chunks"] += len(block)
+            entry["tokens"] += tokens
+
+        stats = {
+            "chunks_retrieved": len(documents),
+            "duplicates_dropped": len(documents) - len(kept),
+            "chunks_used": sum(entry["chunks"] for entry in sources.values()),
+            "retrieved_tokens": sum(estimate_tokens(self.render([document])) for document in documents),
+            "context_tokens": used
+        }
+        return AssembledContext("\n\n".join(parts), list(sources.values()), stats)
+
+    def drop_near_duplicates(self, documents: List[Document]) -> List[Document]:
+        if len(documents) < 2 or self.embeddings is None:
+            return list(documents)
+        # Chunk texts were embedded during the build, so this is normally all cache hits
+        vectors = np.asarray(self.embeddings.embed_documents([doc.page_content for doc in documents]),
+                             dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        similarity = (vectors / norms) @ (vectors / norms).T
+        kept_rows: List[int] = []
+        for row in range(len(documents)):
+            if not kept_rows or similarity[row, kept_rows].max() < self.dedup_threshold:
+                kept_rows.append(row)
+        return [documents[row] for row in kept_rows]
+
+    def merge_adjacent(self, documents: List[Document]) -> List[List[Document]]:
+        """Group chunks that are neighbours in the same file; blocks keep their best rank."""
+        blocks: List[List[Document]] = []
+        for document in documents:
+            index = document.metadata.get("chunk_index")
+            source = document.metadata.get("source")
+            target = None
+            if index is not None:
+                for block in blocks:
+                    if block[0].metadata.get("source") == source and any(
+                            abs(other.metadata.get("chunk_index", -2) - index) == 1 for other in block):
+                        target = block
+                        break
+            if target is None:
+                blocks.append([document])
+            else:
+                target.append(document)
+                target.sort(key=lambda doc: doc.metadata["chunk_index"])
+        return blocks
+
+    @staticmethod
+    def source_name(document: Document) -> str:
+        return os.path.basename(str(document.metadata.get("source", "Unknown_Source")))
+
+    @staticmethod
+    def render(block: List[Document]) -> str:
+        source = block[0].metadata.get("source", "Unknown_Source")
+        return f"[SOURCE: {source}]\n" + "\n".join(document.page_content for document in block)
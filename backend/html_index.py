@@ -0,0 +1,270 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Set, Tuple
+from metrics import span
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+             "meta", "param", "source", "track", "wbr"}
+RAW_TEXT_TAGS = {"script", "style"}
+CONTROL_TAGS = {"input", "select", "textarea", "button"}
+STOPWORDS = {"the", "and", "for", "with", "that", "this", "from", "into", "are", "should", "user",
+             "click", "enter", "verify", "check", "page", "field", "button", "test", "valid",
+             "invalid", "displayed", "shown", "open", "navigate", "then", "when", "has", "have"}
+
+
+class HTMLElement:
+    __slots__ = ("index", "tag", "attrs", "parent", "children", "line", "form", "text", "label")
+
+    def __init__(self, index: int, tag: str, attrs: Dict[str, str], parent: Optional[int],
+                 line: int, form: Optional[int]):
+        self.index = index
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children: List[int] = []
+        self.line = line
+        self.form = form  # index of the enclosing <form>, if any
+        self.text = ""  # direct text content
+        self.label = ""  # text of the <label> attached to this element
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.attrs.get("id")
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.attrs.get("name")
+
+    @property
+    def classes(self) -> List[str]:
+        return self.attrs.get("class", "").split()
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"tag": self.tag, "attrs": dict(self.attrs), "line": self.line,
+                "text": self.text, "label": self.label}
+
+
+def words(text: str) -> Set[str]:
+    """Content words of free text or identifiers; camelCase, kebab-case and snake_case are split."""
+    text = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', text or "")
+    return {word for word in re.split(r'[^a-z0-9]+', text.lower())
+            if len(word) > 2 and word not in STOPWORDS}
+
+
+def element_terms(element: HTMLElement) -> Set[str]:
+    """Words a test step might use to refer to an element: attributes, own text and label."""
+    attrs = element.attrs
+    text = " ".join([attrs.get(name, "") for name in ("id", "name", "class", "placeholder",
+                                                      "value", "aria-label", "title", "for")]
+                    + [element.text[:200], element.label])
+    return words(text)
+
+
+class HTMLIndex(HTMLParser):
+    """Single-pass parse of a page into elements plus lookup tables for selectors.
+
+    Every table maps a key (id, name, class, type, tag, form) to element indices in
+    document order, so script generation and validation never rescan the HTML.
+    """
+
+    def __init__(self, html_content: str, content_hash: Optional[str] = None):
+        super().__init__(convert_charrefs=True)
+        self.content_hash = content_hash or page_hash(html_content)
+        self.size = len(html_content)
+        self.elements: List[HTMLElement] = []
+        self.by_id: Dict[str, List[int]] = {}
+        self.by_name: Dict[str, List[int]] = {}
+        self.by_class: Dict[str, List[int]] = {}
+        self.by_type: Dict[str, List[int]] = {}
+        self.by_tag: Dict[str, List[int]] = {}
+        self.forms: Dict[int, List[int]] = {}
+        self.labels: Dict[str, str] = {}  # label "for" target -> label text
+        self._stack: List[int] = []
+        self._summary = None
+        self.feed(html_content)
+        self.close()
+        self._attach_labels()
+
+    def _current_form(self) -> Optional[int]:
+        for index in reversed(self._stack):
+            if self.elements[index].tag == "form":
+                return index
+        return None
+
+    def handle_starttag(self, tag: str, attrs):
+        attrs = {key.lower(): (value or "") for key, value in attrs}
+        parent = self._stack[-1] if self._stack else None
+        element = HTMLElement(len(self.elements), tag, attrs, parent, self.getpos()[0], self._current_form())
+        self.elements.append(element)
+        if parent is not None:
+            self.elements[parent].children.append(element.index)
+
+        self.by_tag.setdefault(tag, []).append(element.index)
+        if element.id:
+            self.by_id.setdefault(element.id, []).append(element.index)
+        if element.name:
+            self.by_name.setdefault(element.name, []).append(element.index)
+        for css_class in element.classes:
+            self.by_class.setdefault(css_class, []).append(element.index)
+        if "type" in attrs:
+            self.by_type.setdefault(attrs["type"].lower(), []).append(element.index)
+        if element.form is not None:
+            self.forms[element.form].append(element.index)
+        if tag == "form":
+            self.forms[element.index] = []
+
+        if tag not in VOID_TAGS:
+            self._stack.append(element.index)
+
+    def handle_startendtag(self, tag: str, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self._stack.pop()
+
+    def handle_endtag(self, tag: str):
+        # Tolerate unclosed children: pop up to the matching open tag, ignore strays
+        for position in range(len(self._stack) - 1, -1, -1):
+            if self.elements[self._stack[position]].tag == tag:
+                del self._stack[position:]
+                return
+
+    def handle_data(self, data: str):
+        if not self._stack or not data.strip():
+            return
+        element = self.elements[self._stack[-1]]
+        if element.tag in RAW_TEXT_TAGS:
+            return
+        element.text = f"{element.text} {data.strip()}".strip()
+
+    def text_content(self, index: int) -> str:
+        element = self.elements[index]
+        if element.tag in RAW_TEXT_TAGS:
+            return ""
+        parts = [element.text] + [self.text_content(child) for child in element.children]
+        return " ".join(part for part in parts if part)
+
+    def _attach_labels(self):
+        for index in self.by_tag.get("label", []):
+            label = self.elements[index]
+            text = self.text_content(index)
+            target = label.attrs.get("for")
+            if target:
+                self.labels[target] = text
+                for target_index in self.by_id.get(target, []):
+                    self.elements[target_index].label = text
+            # <label>Text <input></label> labels its nested controls
+            nested = False
+            pending = list(label.children)
+            while pending:
+                child = self.elements[pending.pop()]
+                if child.tag in CONTROL_TAGS:
+                    nested = True
+                    if not child.label:
+                        child.label = text
+                pending.extend(child.children)
+            if target or nested or label.parent is None:
+                continue
+            # <label>Text</label><input> with no "for": attach to the next sibling control
+            siblings = self.elements[label.parent].children
+            for sibling in siblings[siblings.index(index) + 1:]:
+                if self.elements[sibling].tag in CONTROL_TAGS:
+                    if not self.elements[sibling].label:
+                        self.elements[sibling].label = text
+                    break
+
+    def find(self, element_id: str = None, name: str = None, css_class: str = None) -> List[HTMLElement]:
+        if element_id is not None:
+            indices = self.by_id.get(element_id, [])
+        elif name is not None:
+            indices = self.by_name.get(name, [])
+        else:
+            indices = self.by_class.get(css_class, [])
+        return [self.elements[index] for index in indices]
+
+    def ancestors(self, index: int) -> List[int]:
+        chain = []
+        parent = self.elements[index].parent
+        while parent is not None:
+            chain.append(parent)
+            parent = self.elements[parent].parent
+        return chain
+
+    def summary(self) -> Dict[str, List[str]]:
+        """Same shape as the legacy regex extraction: element type -> ids/names."""
+        if self._summary is not None:
+            return self._summary
+        elements = {
+            "buttons": [],
+            "input_fields": [],
+            "forms": [],
+            "selects": [],
+            "textareas": [],
+            "labels": [],
+            "divs_with_id": []
+        }
+        for element in self.elements:
+            if element.tag == "button":
+                elements["buttons"] += [value for value in (element.id, element.name) if value]
+            elif element.tag == "input":
+                elements["input_fields"] += [value for value in (element.id, element.name) if value]
+                if element.attrs.get("type", "").lower() in ("submit", "button") and element.id:
+                    elements["buttons"].append(element.id)
+            elif element.tag in ("select", "textarea"):
+                key = "selects" if element.tag == "select" else "textareas"
+                elements[key] += [value for value in (element.id, element.name) if value]
+            elif element.tag == "form" and element.id:
+                elements["forms"].append(element.id)
+            elif element.tag == "label" and element.attrs.get("for"):
+                elements["labels"].append(element.attrs["for"])
+            elif element.tag == "div" and element.id:
+                elements["divs_with_id"].append(element.id)
+        # Remove duplicates, keep document order
+        for key in elements:
+            elements[key] = list(dict.fromkeys(elements[key]))
+        self._summary = elements
+        return elements
+
+
+_index_cache: "OrderedDict[str, HTMLIndex]" = OrderedDict()
+# Pages already hashed, by identity: a workspace hands the same str to every call of a request
+_recent_pages: "OrderedDict[int, Tuple[str, HTMLIndex]]" = OrderedDict()
+_index_lock = threading.Lock()
+_INDEX_CACHE_SIZE = 16
+
+
+def page_hash(html_content: str) -> str:
+    return hashlib.sha256(html_content.encode("utf-8")).hexdigest()
+
+
+def get_html_index(html_content: str) -> HTMLIndex:
+    """Parsed index for a page, reused across requests via its content hash.
+
+    Repeat calls with the same string object skip hashing, so the many lookups of
+    one script request cost one hash at most.
+    """
+    with _index_lock:
+        recent = _recent_pages.get(id(html_content))
+        if recent is not None and recent[0] is html_content:
+            _recent_pages.move_to_end(id(html_content))
+            return recent[1]
+    key = page_hash(html_content)
+    with _index_lock:
+        index = _index_cache.get(key)
+    if index is None:
+        # Parsed outside the lock; a concurrent parse of the same page just loses the race
+        with span("html_parse"):
+            index = HTMLIndex(html_content, key)
+    with _index_lock:
+        index = _index_cache.setdefault(key, index)
+        _index_cache.move_to_end(key)
+        if len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+        # Holding the string keeps its id from being reused by another object
+        _recent_pages[id(html_content)] = (html_content, index)
+        _recent_pages.move_to_end(id(html_content))
+        if len(_recent_pages) > _INDEX_CACHE_SIZE:
+            _recent_pages.popitem(last=False)
+    return index
@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class BuildCancelled(Exception):
+    pass
+
+
+class BuildJob:
+    def __init__(self, workspace: str = "default"):
+        self.id = uuid.uuid4().hex
+        self.workspace = workspace
+        self.status = "queued"  # queued, running, succeeded, failed, cancelled
+        self.stage = None
+        self.counts: Dict[str, int] = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def update(self, stage: str, **counts):
+        """Progress callback handed to the build; also the cancellation point."""
+        if self._cancel_event.is_set():
+            raise BuildCancelled(f"Build {self.id} cancelled")
+        self.stage = stage
+        self.counts.update(counts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "workspace": self.workspace,
+            "status": self.status,
+            "stage": self.stage,
+            "counts": dict(self.counts),
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self._cancel_event.is_set(),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """Runs knowledge-base builds one at a time on a worker thread, off the event loop.
+
+    Builds for different workspaces queue behind each other. Finished jobs are
+    forgotten once older than `retention_seconds` or beyond the newest
+    `max_finished`, except the latest job of each workspace.
+    """
+
+    def __init__(self, max_workers: int = 1, retention_seconds: float = 3600.0, max_finished: int = 100):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kb-build")
+        self._jobs: Dict[str, BuildJob] = {}
+        self._lock = threading.Lock()
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+
+    def submit(self, fn: Callable[[BuildJob], Any], workspace: str = "default") -> BuildJob:
+        job = BuildJob(workspace)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: BuildJob, fn: Callable[[BuildJob], Any]):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.update("starting")
+            job.result = fn(job)
+            job.status = "succeeded"
+        except BuildCancelled:
+            job.status = "cancelled"
+            print(f"⚠️ Build job {job.id} cancelled")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"✗ Build job {job.id} failed: {str(e)}")
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        """Drop expired finished jobs; caller holds the lock. Dicts keep submission order."""
+        latest = {job.workspace: job.id for job in self._jobs.values()}
+        finished = [job for job in self._jobs.values() if job.done and job.id not in latest.values()]
+        cutoff = time.time() - self.retention_seconds
+        expired = finished[:max(len(finished) - self.max_finished, 0)]
+        expired += [job for job in finished if job.finished_at < cutoff]
+        for job in expired:
+            self._jobs.pop(job.id, None)
+
+    def get(self, job_id: str) -> Optional[BuildJob]:
+        return self._jobs.get(job_id)
+
+    def active(self, workspace: Optional[str] = None) -> Optional[BuildJob]:
+        """The unfinished job for `workspace` (any workspace if None)."""
+        with self._lock:
+            for job in self._jobs.values():
+                if not job.done and workspace in (None, job.workspace):
+                    return job
+        return None
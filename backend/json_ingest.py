@@ -0,0 +1,128 @@
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+import ijson
+from langchain_core.documents import Document
+from chunking import StructureChunker
+from config import CHUNK_MAX_CHARS
+
+HTTP_METHODS = {"get", "post", "put", "patch", "delete", "head", "options", "trace"}
+ENDPOINT_KEY = re.compile(r'^(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS|TRACE)\s+(\S+)$', re.IGNORECASE)
+
+PathPart = Union[str, int]
+
+
+def is_unit(path: List[PathPart], container: bool) -> bool:
+    """Whether the value at `path` becomes one document (True) or is descended into."""
+    if not path:
+        return not container
+    top = path[0]
+    if top == "paths":
+        return len(path) == 3  # /route -> method
+    if top == "components":
+        return len(path) == 3  # components -> schemas -> Name
+    if top == "definitions":
+        return len(path) == 2
+    if len(path) == 1:
+        # Arrays such as {"endpoints": [...]} are split per element
+        return not (container and container == "array")
+    return len(path) == 2 and isinstance(path[1], int)
+
+
+def describe(path: List[PathPart], value: Any) -> Tuple[str, Dict[str, Any]]:
+    metadata: Dict[str, Any] = {"json_path": "/".join(str(part) for part in path)}
+    method = route = None
+    if len(path) == 3 and path[0] == "paths" and str(path[2]).lower() in HTTP_METHODS:
+        method, route = str(path[2]).upper(), str(path[1])
+    elif path and isinstance(path[-1], str) and ENDPOINT_KEY.match(path[-1]):
+        match = ENDPOINT_KEY.match(path[-1])
+        method, route = match.group(1).upper(), match.group(2)
+    elif isinstance(value, dict):
+        route = value.get("path") or value.get("url") or value.get("endpoint") or value.get("route")
+        method = value.get("method") or value.get("http_method")
+        method = str(method).upper() if isinstance(method, str) else None
+        route = route if isinstance(route, str) else None
+
+    if method or route:
+        metadata["kind"] = "endpoint"
+        title = " ".join(part for part in (method, route) if part)
+    elif path and path[0] in ("components", "definitions"):
+        metadata["kind"] = "schema"
+        title = f"Schema {path[-1]}"
+    else:
+        metadata["kind"] = "object"
+        title = " ".join(str(part) for part in path) or "document"
+    if method:
+        metadata["method"] = method
+    if route:
+        metadata["path"] = route
+    return title, metadata
+
+
+def iter_json_documents(file_path: str, max_chars: int = CHUNK_MAX_CHARS) -> Iterator[Document]:
+    """Stream a JSON/OpenAPI file, yielding one document per endpoint, schema or top-level object.
+
+    Only the object currently being emitted is held in memory; everything else is
+    consumed event by event. Objects longer than `max_chars` are split on their own
+    keys (parameters, responses, ...) into numbered parts that share the metadata.
+    """
+    splitter = StructureChunker(max_chars=max_chars)
+    stack: List[List[Any]] = []  # [container type, current key or index]
+    builder: Optional[ijson.ObjectBuilder] = None
+    builder_path: List[PathPart] = []
+    depth = 0
+    seq_num = 0
+
+    def value_done():
+        if stack and stack[-1][0] == "array":
+            stack[-1][1] += 1
+
+    def emit(path: List[PathPart], value: Any) -> List[Document]:
+        nonlocal seq_num
+        seq_num += 1
+        title, metadata = describe(path, value)
+        metadata.update({"source": file_path, "seq_num": seq_num, "prechunked": True})
+        text = f"{title}\n{json.dumps(value, indent=2, ensure_ascii=False)}"
+        if len(text) <= max_chars:
+            return [Document(page_content=text, metadata=metadata)]
+        return [Document(page_content=piece, metadata={**metadata, "part": part})
+                for part, piece in enumerate(splitter.split_value(title, value), 1)]
+
+    with open(file_path, "rb") as f:
+        for _, event, value in ijson.parse(f, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if event in ("start_map", "start_array"):
+                    depth += 1
+                elif event in ("end_map", "end_array"):
+                    depth -= 1
+                if depth == 0:
+                    yield from emit(builder_path, builder.value)
+                    builder = None
+                    value_done()
+                continue
+
+            if event == "map_key":
+                stack[-1][1] = value
+                continue
+            if event in ("end_map", "end_array"):
+                stack.pop()
+                value_done()
+                continue
+
+            path = [frame[1] for frame in stack]
+            container = {"start_map": "map", "start_array": "array"}.get(event)
+            if is_unit(path, container):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                builder_path = path
+                if container:
+                    depth = 1
+                else:
+                    yield from emit(path, builder.value)
+                    builder = None
+                    value_done()
+            elif container:
+                stack.append([container, 0 if container == "array" else None])
+            else:
+                value_done()
@@ -0,0 +1,172 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# Keeps identifiers such as SAVE15, TS-007, /apply_coupon, #00aa00 or email-input whole
+TOKEN_PATTERN = re.compile(r'[A-Za-z0-9_#]+(?:[-./][A-Za-z0-9_#]+)*')
+IDENTIFIER_PATTERN = re.compile(r'^[/#.]?[A-Za-z0-9_#]+(?:[-./][A-Za-z0-9_#]+)*/?$')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens; compound identifiers also contribute their parts."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text):
+        token = match.group().lower()
+        tokens.append(token)
+        parts = [part for part in re.split(r'[-./_#]', token) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def looks_like_identifier(word: str) -> bool:
+    # Plain words ("coupon") don't count; codes, paths, ids and snake/kebab/camel case do
+    return bool(IDENTIFIER_PATTERN.match(word)) and (
+        bool(re.search(r'[0-9_#/.-]', word)) or bool(re.search(r'[a-z][A-Z]|^[A-Z]{2,}$', word))
+    )
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk ids, kept next to each vector store collection.
+
+    Only term frequencies are stored; chunk texts stay in the vector store.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks: Dict[str, Dict[str, int]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                chunks = json.load(f).get("chunks", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read lexical index {path}: {str(e)}")
+            return index
+        for chunk_id, terms in chunks.items():
+            index._insert(chunk_id, terms)
+        return index
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"chunks": self.chunks}, f)
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.chunks
+
+    def add(self, chunk_ids: Iterable[str], texts: Iterable[str]):
+        for chunk_id, text in zip(chunk_ids, texts):
+            self.remove([chunk_id])
+            self._insert(chunk_id, dict(Counter(tokenize(text))))
+
+    def _insert(self, chunk_id: str, terms: Dict[str, int]):
+        self.chunks[chunk_id] = terms
+        self.lengths[chunk_id] = sum(terms.values())
+        self.total_length += self.lengths[chunk_id]
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[chunk_id] = frequency
+
+    def remove(self, chunk_ids: Iterable[str]):
+        for chunk_id in chunk_ids:
+            terms = self.chunks.pop(chunk_id, None)
+            if terms is None:
+                continue
+            self.total_length -= self.lengths.pop(chunk_id)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(chunk_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+    def is_identifier_query(self, query: str) -> bool:
+        """True when every word is an identifier this index knows, so embedding the query adds nothing."""
+        words = [word.strip("\"'`,;:?!()") for word in query.split()]
+        if not 0 < len(words) <= 3:
+            return False
+        for word in words:
+            tokens = tokenize(word)
+            if not looks_like_identifier(word) or not tokens or tokens[0] not in self.postings:
+                return False
+        return True
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        if not self.chunks:
+            return []
+        count = len(self.chunks)
+        average_length = self.total_length / count or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for chunk_id, frequency in posting.items():
+                norm = frequency + self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses vector and BM25 results with reciprocal rank fusion.
+
+    Identifier-only queries (e.g. "SAVE15", "/apply_coupon") are answered from the
+    lexical index alone, without embedding the query.
+    """
+
+    vectorstore: Any
+    lexical: Any
+    fetch: Callable[[List[str]], List[Document]]
+    k: int = 4
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        lexical_hits = self.lexical.search(query, self.k)
+        if lexical_hits and self.lexical.is_identifier_query(query):
+            return self.dedupe(self.fetch([chunk_id for chunk_id, _ in lexical_hits]))
+
+        # Keyed by whitespace-normalized text, which also merges copies of the same chunk
+        scores: Dict[str, float] = {}
+        documents: Dict[str, Document] = {}
+        ranked_lists = [self.vectorstore.similarity_search(query, k=self.k),
+                        self.fetch([chunk_id for chunk_id, _ in lexical_hits])]
+        for ranked in ranked_lists:
+            for rank, document in enumerate(ranked):
+                key = " ".join(document.page_content.split())
+                documents.setdefault(key, document)
+                scores[key] = scores.get(key, 0.0) + 1 / (self.rrf_k + rank + 1)
+        fused = sorted(scores, key=scores.get, reverse=True)
+        return self.dedupe([documents[key] for key in fused])[:self.k]
+
+    @staticmethod
+    def dedupe(documents: List[Document]) -> List[Document]:
+        """Drop chunks whose text repeats, or is contained in, a higher-ranked chunk."""
+        kept: List[Document] = []
+        for document in documents:
+            text = " ".join(document.page_content.split())
+            if any(text in " ".join(other.page_content.split()) for other in kept):
+                continue
+            kept.append(document)
+        return kept
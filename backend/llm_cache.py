@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class AbandonedCall(RuntimeError):
+    """The leading identical call was cancelled or its stream closed before it finished."""
+
+
+class LLMResponseCache:
+    """Content-addressed, disk-backed cache of LLM responses.
+
+    Keys hash the model, temperature, retrieved context and rendered prompt. Entries
+    expire after `ttl_seconds`, the least recently used are evicted beyond
+    `max_entries`, and concurrent identical async requests (streamed or not) share
+    one in-flight call. Async paths run the SQLite work on a worker thread.
+    """
+
+    def __init__(self, cache_path: str, ttl_seconds: float, max_entries: int):
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL, index_version TEXT NOT NULL, html_version TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, temperature: Optional[float], context: str, prompt: str) -> str:
+        payload = json.dumps([model, temperature, context, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            elif row:
+                self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str, index_version: str = "", html_version: str = ""):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response, now, now, index_version or "", html_version or "")
+            )
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, response: str, index_version: str = "", html_version: str = ""):
+        await asyncio.to_thread(self.put, key, response, index_version, html_version)
+
+    async def _join(self, key: str) -> Tuple[Optional[str], Optional[asyncio.Future]]:
+        """(response, None) from the cache or an identical in-flight call, else (None, future) to lead one."""
+        while True:
+            cached = await self.aget(key)
+            if cached is not None:
+                return cached, None
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[key] = future
+                return None, future
+            try:
+                # An identical request is already calling the LLM: wait for its answer
+                response = await asyncio.shield(inflight)
+            except AbandonedCall:
+                continue  # its caller went away; check again and lead the call if still needed
+            self.coalesced += 1
+            return response, None
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: BaseException):
+        if future.done():
+            return
+        # Cancellation or a closed stream concerns the leader only; waiters retry instead of inheriting it
+        future.set_exception(error if isinstance(error, Exception) else AbandonedCall("Identical LLM call was abandoned"))
+        future.exception()  # mark retrieved when nobody is waiting
+
+    async def get_or_create(self, key: str, create: Callable[[], Awaitable[str]],
+                            index_version: str = "", html_version: str = "") -> str:
+        response, future = await self._join(key)
+        if future is None:
+            return response
+        try:
+            response = await create()
+            await self.aput(key, response, index_version, html_version)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            self._fail(future, e)
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def stream_or_create(self, key: str, create: Callable[[], AsyncIterator[str]],
+                               index_version: str = "", html_version: str = "") -> AsyncIterator[str]:
+        """Streaming get_or_create: a miss passes `create()` through and caches the joined text.
+
+        Identical requests arriving meanwhile (streamed or not) wait for that call
+        and get the whole response as one piece.
+        """
+        response, future = await self._join(key)
+        if future is None:
+            yield response
+            return
+        parts = []
+        try:
+            async for part in create():
+                parts.append(part)
+                yield part
+            response = "".join(parts)
+            await self.aput(key, response, index_version, html_version)
+            future.set_result(response)
+        except BaseException as e:
+            self._fail(future, e)
+            raise
+        finally:
+            del self._inflight[key]
+
+    def invalidate_index(self, current_version: str):
+        """Drop responses generated against any other knowledge-base version."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM responses WHERE index_version != ?", (current_version,)
+            ).rowcount
+            self._conn.commit()
+        if deleted:
+            print(f"✓ Invalidated {deleted} cached LLM responses (knowledge base changed)")
+
+    def invalidate_html(self, current_version: str):
+        """Drop responses that depended on a different HTML page."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM responses WHERE html_version != '' AND html_version != ?", (current_version,)
+            ).rowcount
+            self._conn.commit()
+        if deleted:
+            print(f"✓ Invalidated {deleted} cached LLM responses (HTML changed)")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "llm_calls_avoided_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+            "entries": entries
+        }
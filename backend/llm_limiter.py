@@ -0,0 +1,393 @@
+import asyncio
+import random
+import re
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from config import (LLM_BURST_SECONDS, LLM_CALL_DEADLINE, LLM_EXPECTED_COMPLETION_TOKENS, LLM_MAX_CONCURRENCY,
+                    LLM_MIN_CONCURRENCY, LLM_QUEUE_TIMEOUT, LLM_RETRY_ATTEMPTS, LLM_RETRY_BASE_SECONDS,
+                    LLM_RETRY_MAX_SECONDS, LLM_RPM, LLM_TPM)
+from metrics import LLM_RETRIES, observe
+from tokens import estimate_tokens
+
+THROTTLE = re.compile(r"\b429\b|resource.exhausted|quota|rate.limit|too many requests", re.I)
+TRANSIENT = re.compile(r"\b50[0234]\b|internal|unavailable|deadline|timed out|timeout|connection|overloaded", re.I)
+RETRY_AFTER = re.compile(r"retry(?:_delay)?\s*(?:in|after|\{)?\s*(?:seconds:)?\s*([\d.]+)\s*s?", re.I)
+
+
+if hasattr(asyncio, "timeout"):
+    queue_deadline = asyncio.timeout
+else:  # Python 3.10
+    @asynccontextmanager
+    async def queue_deadline(seconds: float):
+        task = asyncio.current_task()
+        expired = False
+
+        def expire():
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        handle = asyncio.get_running_loop().call_later(seconds, expire)
+        try:
+            yield
+        except asyncio.CancelledError:
+            if expired:
+                raise asyncio.TimeoutError from None
+            raise
+        finally:
+            handle.cancel()
+
+
+class LLMBusyError(Exception):
+    pass
+
+
+class LLMUnavailableError(LLMBusyError):
+    """The provider kept throttling or failing until retries or the call deadline ran out."""
+
+
+class TokenBucket:
+    """Refills `per_minute` units continuously and holds at most `burst_seconds` worth.
+
+    `reserve()` takes the units at once, possibly into debt, and returns how long
+    the caller has to wait before using them, so callers are served in arrival
+    order without polling. A limit of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: int, burst_seconds: float = 60.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0) if per_minute > 0 else 0.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens) / self.rate
+
+    def refund(self, amount: float):
+        """Return units (negative amounts charge more) once the real usage is known."""
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    for candidate in (error, getattr(error, "response", None), error.__cause__):
+        for attribute in ("status_code", "code", "status"):
+            value = getattr(candidate, attribute, None)
+            if isinstance(value, int):
+                return value
+    return None
+
+
+def classify(error: BaseException) -> str:
+    """"throttle" (quota/429), "transient" (5xx, timeouts, dropped connections) or "fatal"."""
+    code = status_code(error)
+    text = f"{type(error).__name__} {error}"
+    if code == 429 or THROTTLE.search(text):
+        return "throttle"
+    if (code is not None and code >= 500) or isinstance(error, ConnectionError) or TRANSIENT.search(text):
+        return "transient"
+    return "fatal"
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Server-suggested delay: a `retry_after` attribute, a Retry-After header or a 'retry in Ns' hint."""
+    value = getattr(error, "retry_after", None)
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if value is None and "retry-after" in {key.lower() for key in headers}:
+        value = next(headers[key] for key in headers if key.lower() == "retry-after")
+    if value is None:
+        match = RETRY_AFTER.search(str(error))
+        value = match.group(1) if match else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMLimiter:
+    """Rate-limited, self-tuning gateway for every LLM call.
+
+    Calls wait for a concurrency slot and for room in the requests-per-minute and
+    tokens-per-minute buckets; together that wait is bounded by `queue_timeout`,
+    after which LLMBusyError is raised. The concurrency limit follows AIMD: it is
+    halved (at most once per `decrease_interval`) when the provider throttles and
+    grows by one slot per window of successful calls, between `min_concurrency`
+    and `max_concurrency`. The buckets allow bursts of up to `burst_seconds` of
+    quota. Throttled and transient failures are retried with
+    full-jitter exponential backoff (or the server's retry hint) until
+    `retry_attempts` or the per-call `deadline` runs out, which raises
+    LLMUnavailableError. Streams are only retried before their first chunk.
+    """
+
+    def __init__(self, max_concurrency: int, queue_timeout: float, min_concurrency: int = 1,
+                 rpm: int = 0, tpm: int = 0, deadline: float = 120.0, retry_attempts: int = 4,
+                 retry_base: float = 1.0, retry_max: float = 20.0, expected_completion_tokens: int = 800,
+                 decrease_interval: float = 2.0, burst_seconds: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.retry_attempts = retry_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.expected_completion_tokens = expected_completion_tokens
+        self.decrease_interval = decrease_interval
+        self.requests = TokenBucket(rpm, burst_seconds)
+        self.tokens = TokenBucket(tpm, burst_seconds)
+        self.rpm, self.tpm = rpm, tpm
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failed = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._conditions = weakref.WeakKeyDictionary()
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self.limit)
+
+    # --- admission --------------------------------------------------------
+
+    def reserve(self, prompt: str) -> Tuple[float, float]:
+        """Charge one request and the expected tokens; returns (seconds to wait, tokens charged)."""
+        charged = estimate_tokens(prompt) + self.expected_completion_tokens
+        return max(self.requests.reserve(1), self.tokens.reserve(charged)), charged
+
+    def release_reservation(self, charged: float):
+        self.requests.refund(1)
+        self.tokens.refund(charged)
+
+    @asynccontextmanager
+    async def slot(self, prompt: str = ""):
+        self.waiting += 1
+        start = time.perf_counter()
+        taken = False
+
+        def take() -> bool:
+            nonlocal taken
+            with self._lock:
+                if self.in_flight < self.concurrency_limit:
+                    self.in_flight += 1
+                    taken = True
+            return taken
+
+        try:
+            async with queue_deadline(self.queue_timeout):
+                condition = self._loop_condition()
+                async with condition:
+                    await condition.wait_for(take)
+        except BaseException as e:
+            # Cancelled or timed out, possibly just after the slot was taken
+            if taken:
+                self._release()
+            if not isinstance(e, asyncio.TimeoutError):
+                raise
+            self.rejected += 1
+            raise LLMBusyError(
+                f"All {self.concurrency_limit} LLM slots busy for {self.queue_timeout}s, try again later"
+            ) from None
+        finally:
+            self.waiting -= 1
+            observe("llm_queue", time.perf_counter() - start)
+        try:
+            wait, charged = self.reserve(prompt)
+            if wait > self.queue_timeout - (time.perf_counter() - start):
+                self.release_reservation(charged)
+                self.rejected += 1
+                raise LLMBusyError(f"LLM rate limit ({self.rpm} RPM, {self.tpm} TPM) reached, try again later")
+            if wait:
+                observe("llm_rate_limit", wait)
+                await asyncio.sleep(wait)
+            yield charged
+        finally:
+            self._release()
+
+    def _loop_condition(self) -> asyncio.Condition:
+        """The waiters' condition for the running loop; a Condition is bound to one loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            condition = self._conditions.get(loop)
+            if condition is None:
+                condition = self._conditions[loop] = asyncio.Condition()
+            return condition
+
+    def _release(self):
+        # Synchronous so a cancelled caller can never skip it; waiters on every loop get a wake-up
+        with self._lock:
+            self.in_flight -= 1
+            conditions = list(self._conditions.items())
+        for loop, condition in conditions:
+            if loop.is_closed():
+                continue
+            try:
+                loop.call_soon_threadsafe(self._notify, condition)
+            except RuntimeError:
+                pass  # closed meanwhile
+
+    @staticmethod
+    def _notify(condition: asyncio.Condition):
+        async def notify_all():
+            async with condition:
+                condition.notify_all()
+        asyncio.get_running_loop().create_task(notify_all())
+
+    # --- feedback ---------------------------------------------------------
+
+    def on_success(self, prompt: str, completion_tokens: int, charged: float):
+        self.tokens.refund(charged - estimate_tokens(prompt) - completion_tokens)
+        with self._lock:
+            self.limit = min(float(self.max_concurrency), self.limit + 1.0 / max(self.limit, 1.0))
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            now = time.monotonic()
+            # One burst of 429s from calls started together counts as one signal
+            if now - self._last_decrease >= self.decrease_interval and self.limit > self.min_concurrency:
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+                self._last_decrease = now
+                print(f"⚠️ LLM throttled, concurrency limit now {self.concurrency_limit}")
+
+    def backoff(self, error: BaseException, attempt: int, deadline: float) -> float:
+        """Seconds to wait before the next attempt; raises when the error is final or time is up."""
+        kind = classify(error)
+        if kind == "throttle":
+            self.on_throttle()
+        if kind == "fatal":
+            raise error
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+        hint = retry_after(error)
+        if hint is not None:
+            delay = max(delay, min(hint, self.retry_max))
+        if attempt >= self.retry_attempts or time.monotonic() + delay >= deadline:
+            self.failed += 1
+            raise LLMUnavailableError(f"LLM unavailable after {attempt + 1} attempt(s): {error}") from error
+        self.retries += 1
+        LLM_RETRIES.labels(reason=kind).inc()
+        observe("llm_backoff", delay)
+        return delay
+
+    @staticmethod
+    def completion_tokens(response: Any, completion: str = "") -> int:
+        usage = getattr(response, "usage_metadata", None) or {}
+        return usage.get("output_tokens") or estimate_tokens(completion or getattr(response, "content", "") or "")
+
+    # --- calls ------------------------------------------------------------
+
+    async def ainvoke(self, llm: Any, prompt: str) -> Any:
+        return await self.acall(prompt, lambda: llm.ainvoke(prompt))
+
+    async def acall(self, prompt: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            async with self.slot(prompt) as charged:
+                try:
+                    response = await asyncio.wait_for(call(), timeout=max(deadline - time.monotonic(), 0.001))
+                except asyncio.TimeoutError as e:
+                    if time.monotonic() < deadline:
+                        error = e  # the client's own timeout, retried like any transient failure
+                    else:
+                        self.failed += 1
+                        raise LLMUnavailableError(f"LLM call exceeded its {self.deadline:g}s deadline")
+                except Exception as e:
+                    error = e
+                else:
+                    self.on_success(prompt, self.completion_tokens(response), charged)
+                    return response
+            await asyncio.sleep(self.backoff(error, attempt, deadline))
+            attempt += 1
+
+    async def astream(self, llm: Any, prompt: str) -> AsyncIterator[Any]:
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            started = False
+            async with self.slot(prompt) as charged:
+                parts = []
+                stream = llm.astream(prompt).__aiter__()
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(),
+                                                           timeout=max(deadline - time.monotonic(), 0.001))
+                        except StopAsyncIteration:
+                            break
+                        started = True
+                        parts.append(str(chunk.content or ""))
+                        yield chunk
+                except asyncio.TimeoutError as e:
+                    if started or time.monotonic() >= deadline:
+                        self.failed += 1
+                        raise LLMUnavailableError(f"LLM stream exceeded its {self.deadline:g}s deadline")
+                    error = e
+                except Exception as e:
+                    if started:
+                        raise
+                    error = e
+                else:
+                    self.on_success(prompt, estimate_tokens("".join(parts)), charged)
+                    return
+                finally:
+                    # Release the provider's HTTP stream now, not when the GC finds the iterator
+                    aclose = getattr(stream, "aclose", None)
+                    if aclose is not None:
+                        with suppress(Exception):
+                            await aclose()
+            await asyncio.sleep(self.backoff(error, attempt, deadline))
+            attempt += 1
+
+    def invoke(self, llm: Any, prompt: str) -> Any:
+        """Blocking variant for sync callers: rate limits, retries and deadline, but no slot."""
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            wait, charged = self.reserve(prompt)
+            if wait:
+                observe("llm_rate_limit", wait)
+                time.sleep(wait)
+            try:
+                response = llm.invoke(prompt)
+            except Exception as e:
+                time.sleep(self.backoff(e, attempt, deadline))
+                attempt += 1
+                continue
+            self.on_success(prompt, self.completion_tokens(response), charged)
+            return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "concurrency_limit": self.concurrency_limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failed": self.failed,
+            "rpm": self.rpm,
+            "tpm": self.tpm
+        }
+
+
+llm_limiter = LLMLimiter(LLM_MAX_CONCURRENCY, LLM_QUEUE_TIMEOUT, min_concurrency=LLM_MIN_CONCURRENCY,
+                         rpm=LLM_RPM, tpm=LLM_TPM, deadline=LLM_CALL_DEADLINE, retry_attempts=LLM_RETRY_ATTEMPTS,
+                         retry_base=LLM_RETRY_BASE_SECONDS, retry_max=LLM_RETRY_MAX_SECONDS,
+                         expected_completion_tokens=LLM_EXPECTED_COMPLETION_TOKENS, burst_seconds=LLM_BURST_SECONDS)
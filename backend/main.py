@@ -1,12 +1,28 @@
-from fastapi import FastAPI,UploadFile,File,HTTPException
+import time
+_import_started = time.perf_counter()
+from fastapi import FastAPI,UploadFile,File,HTTPException,Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+import asyncio
+import json
 import os
 import shutil
-from typing import List,Dict,Any
-from rag_system import RAGSystem
-from test_case_generator import TestCaseGenerator
-from script_generator import ScriptGenerator
+from typing import List,Dict,Any,Optional
+from jobs import BuildJob, JobManager
+from llm_limiter import LLMBusyError, llm_limiter
+from html_index import get_html_index
+from workspaces import DEFAULT_WORKSPACE, Workspace, WorkspaceManager
+from model_registry import models
+from metrics import REQUEST_SECONDS, render_metrics, server_timing_header, start_request_timings, track_gauge
+from config import JOB_MAX_FINISHED, JOB_RETENTION_SECONDS, SERVER_TIMING
+
+# Heavy libraries (loaders, Chroma, sentence-transformers, GenAI) are imported lazily, so this stays small
+startup_metrics: Dict[str, Any] = {
+    "import_seconds": round(time.perf_counter() - _import_started, 3),
+    "startup_seconds": None,
+    "first_request_seconds": {}  # per route: latency of its first call, including any lazy loading
+}
+print(f"✓ API modules imported in {startup_metrics['import_seconds']:.2f}s")
 
 app = FastAPI(title="Autonomous QA Agent")
 
@@ -18,24 +34,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-rag_system = None
-test_case_generator = None
-script_generator = None
-html_content = None  # Store HTML content separately
+build_jobs = JobManager(retention_seconds=JOB_RETENTION_SECONDS, max_finished=JOB_MAX_FINISHED)
+# Each workspace has its own uploads, HTML page, index and LLM cache; see workspaces.py
+workspaces = WorkspaceManager(is_busy=lambda name: build_jobs.active(name) is not None)
+track_gauge("qa_llm_in_flight", "LLM calls in progress", lambda: llm_limiter.in_flight)
+track_gauge("qa_llm_waiting", "Requests queued for an LLM slot", lambda: llm_limiter.waiting)
+track_gauge("qa_llm_concurrency_limit", "Current adaptive LLM concurrency limit", lambda: llm_limiter.concurrency_limit)
+track_gauge("qa_workspace_memory_bytes", "Estimated memory of loaded workspaces", lambda: workspaces.memory_estimate())
+
+
+@app.exception_handler(LLMBusyError)
+async def llm_busy_handler(request: Request, exc: LLMBusyError):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "5"})
+
+
+async def open_workspace(name: str) -> Workspace:
+    try:
+        WorkspaceManager.validate(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # First use loads the persisted index from disk, keep that off the event loop
+    return await asyncio.to_thread(workspaces.get, name)
+
+
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = getattr(route, "path", request.url.path)
+    if path not in startup_metrics["first_request_seconds"]:
+        startup_metrics["first_request_seconds"][path] = round(time.perf_counter() - start, 3)
+    return response
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    # Spans recorded while handling this request (see metrics.span) are summed per stage
+    timings = start_request_timings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    # Route templates, not raw paths, so job ids don't explode the label set
+    REQUEST_SECONDS.labels(route=getattr(route, "path", "unmatched"), method=request.method,
+                           status=str(response.status_code)).observe(elapsed)
+    if SERVER_TIMING or request.headers.get("X-Debug-Timing") == "1":
+        # Streaming responses only include the stages that ran before the first byte
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
 
-UPLOAD_DIR = "uploads"
-HTML_DIR = "html_files"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(HTML_DIR, exist_ok=True)
+
+@app.on_event("startup")
+async def warm_start():
+    start = time.perf_counter()
+    # The model loads on a background thread while the server already accepts requests
+    models.warm_up()
+    # Reuse the persisted index so restarts don't re-embed the whole corpus
+    app.state.warm_task = asyncio.create_task(open_workspace(DEFAULT_WORKSPACE))
+    startup_metrics["startup_seconds"] = round(time.perf_counter() - start, 3)
 
 @app.post("/upload-documents")
-async def upload_documents(files: List[UploadFile] = File(...)):
+async def upload_documents(files: List[UploadFile] = File(...), workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
     saved_files = []
     for file in files:
         # Skip HTML
         if file.filename.endswith('.html'):
             continue
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        file_path = os.path.join(ws.upload_dir, file.filename)
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
             saved_files.append(file_path)
@@ -48,76 +115,213 @@ async def upload_documents(files: List[UploadFile] = File(...)):
 
 
 @app.post("/upload-html")
-async def upload_html(file: UploadFile = File(...)):
-    global html_content
+async def upload_html(file: UploadFile = File(...), workspace: str = DEFAULT_WORKSPACE):
     if not file.filename.endswith('.html'):
         raise HTTPException(status_code=400, detail="Only HTML files allowed")
+    ws = await open_workspace(workspace)
 
-    html_path = os.path.join(HTML_DIR, file.filename)
+    html_path = os.path.join(ws.html_dir, file.filename)
     with open(html_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
     with open(html_path, "r", encoding="utf-8") as f:
         html_content = f.read()
+    # Parse once here, off the event loop; script requests reuse the cached selector index
+    html_index = await asyncio.to_thread(get_html_index, html_content)
+    ws.html_content = html_content
+    await asyncio.to_thread(ws.llm_cache.invalidate_html, html_index.content_hash)
+    workspaces.evict(keep=ws.name)
     return JSONResponse({
         "status": "success",
         "message": "HTML file uploaded successfully",
-        "file": html_path
+        "file": html_path,
+        "elements_indexed": len(html_index.elements)
     })
 
+def run_build(ws: Workspace, job: BuildJob):
+    system = ws.new_rag_system()
+    summary = system.build_knowledge_base(progress=job.update)
+    # Requests keep using the previous system until this swap
+    ws.activate(system, "rebuilt")
+    workspaces.evict(keep=ws.name)
+    return summary
+
+
 @app.post("/build-knowledge-base")
-async def build_knowledge_base():
-    global rag_system, test_case_generator, script_generator
-    if not os.listdir(UPLOAD_DIR):
+async def build_knowledge_base(workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    if not os.listdir(ws.upload_dir):
         raise HTTPException(status_code=400, detail="No documents uploaded. Please upload documents first.")
-    rag_system = RAGSystem(UPLOAD_DIR)
-    rag_system.build_knowledge_base()
-    test_case_generator = TestCaseGenerator(rag_system)
-    script_generator = ScriptGenerator(rag_system)
+    active_job = build_jobs.active(ws.name)
+    if active_job:
+        return JSONResponse({
+            "status": "running",
+            "message": "A knowledge base build is already in progress",
+            "job_id": active_job.id
+        }, status_code=409)
+    job = build_jobs.submit(lambda job: run_build(ws, job), workspace=ws.name)
     return JSONResponse({
-        "status": "success",
-        "message": "Knowledge base built successfully"
-    })
+        "status": "accepted",
+        "message": "Knowledge base build started",
+        "job_id": job.id
+    }, status_code=202)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = build_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job.to_dict())
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = build_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.done:
+        job.cancel()
+    return JSONResponse(job.to_dict())
 
 
 @app.post("/generate-test-cases")
-async def generate_test_cases(query: str):
-    if not test_case_generator:
+async def generate_test_cases(query: str, workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    # Read once: an eviction on another thread may unload the workspace at any point
+    generator = ws.test_case_generator
+    if not generator:
         raise HTTPException(status_code=400, detail="Knowledge base not built. Please build knowledge base first.")
-    test_cases = test_case_generator.generate_test_cases(query)
+    test_cases = await generator.agenerate_test_cases(query)
     return JSONResponse({
         "status": "success",
-        "test_cases": test_cases
+        "test_cases": test_cases,
+        "new_cases": sum(1 for test_case in test_cases if test_case.get("status") == "new"),
+        "merged_cases": sum(1 for test_case in test_cases if test_case.get("status") == "merged")
         })
 
 
+@app.get("/test-cases")
+async def list_test_cases(workspace: str = DEFAULT_WORKSPACE, cluster: Optional[int] = None,
+                          limit: int = 100, offset: int = 0):
+    ws = await open_workspace(workspace)
+    test_cases = await asyncio.to_thread(ws.test_case_store.list_cases, cluster, min(max(limit, 1), 1000), max(offset, 0))
+    return JSONResponse({"test_cases": test_cases, "cluster": cluster, "offset": offset})
+
+
+@app.get("/test-cases/clusters")
+async def list_test_case_clusters(workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    clusters = await asyncio.to_thread(ws.test_case_store.clusters)
+    return JSONResponse({"clusters": clusters, "store": ws.test_case_store.stats()})
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate-test-cases/stream")
+async def stream_test_cases(query: str, workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    generator = ws.test_case_generator
+    if not generator:
+        raise HTTPException(status_code=400, detail="Knowledge base not built. Please build knowledge base first.")
+
+    async def events():
+        count = 0
+        try:
+            async for test_case in generator.astream_test_cases(query):
+                count += 1
+                yield sse_event("test_case", test_case)
+        except Exception as e:
+            print(f"✗ Test case stream failed: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+            return
+        yield sse_event("done", {"count": count})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.post("/generate-script")
-async def generate_selenium_script(test_case: Dict[str, Any]):
-    global html_content
-    if not script_generator:
+async def generate_selenium_script(test_case: Dict[str, Any], workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    # Read once: an eviction on another thread may unload the workspace at any point
+    generator, page = ws.script_generator, ws.html_content
+    if not generator:
         raise HTTPException(status_code=400, detail="Knowledge base not built")
-    if not html_content:
+    if not page:
         raise HTTPException(status_code=400, detail="HTML file not uploaded. Please upload HTML file first.")
-    script = script_generator.generate_script_with_html(test_case, html_content) 
+    result = await generator.agenerate_script(test_case, page)
     return JSONResponse({
         "status": "success",
-        "script": script
+        "script": result["script"],
+        "html_context": result["html_context"],
+        "generation_path": result["generation_path"],
+        "unresolved_steps": result["unresolved_steps"],
+        "validation": result["validation"]
     })
 
 
+@app.post("/generate-scripts/batch")
+async def generate_scripts_batch(test_cases: List[Dict[str, Any]], workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    generator, page = ws.script_generator, ws.html_content
+    if not generator:
+        raise HTTPException(status_code=400, detail="Knowledge base not built")
+    if not page:
+        raise HTTPException(status_code=400, detail="HTML file not uploaded. Please upload HTML file first.")
+
+    async def events():
+        succeeded = failed = 0
+        async for result in generator.astream_scripts(test_cases, page):
+            if "error" in result:
+                failed += 1
+                yield sse_event("script_error", result)
+            else:
+                succeeded += 1
+                yield sse_event("script", result)
+        yield sse_event("done", {"succeeded": succeeded, "failed": failed})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.get("/health")
 async def health_check():
+    # Reports on the default workspace without loading it
+    ws = workspaces.peek(DEFAULT_WORKSPACE)
     return {
         "status": "healthy",
-        "rag_system": rag_system is not None,
-        "html_uploaded": html_content is not None
+        "rag_system": ws is not None and ws.rag_system is not None,
+        "html_uploaded": ws is not None and ws.html_content is not None
     }
 
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
 @app.get("/status")
-async def get_status():
+async def get_status(workspace: str = DEFAULT_WORKSPACE):
+    ws = await open_workspace(workspace)
+    active_job = build_jobs.active(ws.name)
+    rag_system = ws.rag_system
     return JSONResponse({
+        "workspace": ws.name,
         "knowledge_base_built": rag_system is not None,
-        "html_uploaded": html_content is not None,
-        "documents_count": len(os.listdir(UPLOAD_DIR)) if os.path.exists(UPLOAD_DIR) else 0
+        "index_source": ws.index_source,
+        "build_job": active_job.to_dict() if active_job else None,
+        "llm_concurrency": llm_limiter.stats(),
+        "llm_cache": ws.llm_cache.stats(),
+        "embedding_cache": rag_system.embedding.stats() if rag_system else None,
+        "test_case_store": ws.test_case_store.stats(),
+        "html_uploaded": ws.html_content is not None,
+        "documents_count": ws.documents_count(),
+        "workspaces": workspaces.stats(),
+        "workspace_memory_mb": round(workspaces.memory_estimate() / (1024 * 1024), 2),
+        "workspace_memory_cap_mb": workspaces.memory_cap_bytes // (1024 * 1024),
+        "startup": startup_metrics,
+        "models": models.stats()
     })
 
 if __name__ == "__main__":
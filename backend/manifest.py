@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Tuple
+
+
+class DocumentManifest:
+    """Per-file record of what is currently indexed in the vector store."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.embedding_model = None
+        self.chunk_strategy = "semantic"
+        self.collection = "langchain"  # langchain_chroma's default collection name
+        self.vector_backend = "chroma"
+        self.files: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentManifest":
+        manifest = cls(path)
+        if not os.path.exists(path):
+            return manifest
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            manifest.embedding_model = data.get("embedding_model")
+            manifest.chunk_strategy = data.get("chunk_strategy", manifest.chunk_strategy)
+            manifest.collection = data.get("collection", manifest.collection)
+            manifest.vector_backend = data.get("vector_backend", manifest.vector_backend)
+            manifest.files = data.get("files", {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read manifest {path}: {str(e)}")
+        return manifest
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "embedding_model": self.embedding_model,
+                "chunk_strategy": self.chunk_strategy,
+                "collection": self.collection,
+                "vector_backend": self.vector_backend,
+                "files": self.files
+            }, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def diff(self, current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """Compare {filename: content_hash} against the manifest -> (added, changed, removed)."""
+        added = [name for name in current if name not in self.files]
+        changed = [name for name in current
+                   if name in self.files and self.files[name]["hash"] != current[name]]
+        removed = [name for name in self.files if name not in current]
+        return added, changed, removed
+
+    def version(self) -> str:
+        """Identifies the indexed content (model, chunking, file hashes), independent of collection names."""
+        digest = hashlib.sha256(f"{self.embedding_model}\0{self.chunk_strategy}".encode("utf-8"))
+        for name in sorted(self.files):
+            digest.update(f"\0{name}\0{self.files[name]['hash']}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def chunk_ids(self, filenames: List[str]) -> List[str]:
+        ids = []
+        for name in filenames:
+            ids.extend(self.files.get(name, {}).get("chunk_ids", []))
+        return ids
+
+    def all_chunk_ids(self) -> List[str]:
+        return self.chunk_ids(list(self.files))
+
+    def update_file(self, filename: str, content_hash: str, chunk_ids: List[str]):
+        self.files[filename] = {"hash": content_hash, "chunk_ids": chunk_ids}
+
+    def remove_file(self, filename: str):
+        self.files.pop(filename, None)
@@ -0,0 +1,77 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from tokens import estimate_tokens
+
+# Stages: load, chunk, embed, vector_write, retrieval, context_assembly, html_parse, html_analysis,
+# html_slice, template, prompt, llm_queue, llm_rate_limit, llm_backoff, llm, parse, validate, dedup, build
+STAGE_SECONDS = Histogram(
+    "qa_stage_duration_seconds", "Time spent per pipeline stage", ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+REQUEST_SECONDS = Histogram(
+    "qa_http_request_duration_seconds", "HTTP request latency until the response starts", ["route", "method", "status"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+LLM_TOKENS = Counter("qa_llm_tokens_total", "LLM tokens sent and received", ["kind"])
+LLM_CALLS = Counter("qa_llm_calls_total", "LLM calls by outcome", ["outcome"])
+LLM_RETRIES = Counter("qa_llm_retries_total", "LLM call retries by reason (throttle or transient)", ["reason"])
+EMBEDDED_TEXTS = Counter("qa_embedded_texts_total", "Texts sent to the embedding model (cache misses)")
+SCRIPT_GENERATIONS = Counter("qa_script_generations_total", "Generated scripts by path (template or llm)", ["path"])
+SCRIPT_VALIDATIONS = Counter("qa_script_validations_total", "Validated scripts by result (valid, repaired, invalid)", ["result"])
+SCRIPT_ISSUES = Counter("qa_script_issues_total", "Problems found in generated scripts", ["kind"])
+TEST_CASES = Counter("qa_test_cases_total", "Generated test cases by store outcome (new or merged)", ["outcome"])
+CONTEXT_TOKENS = Histogram("qa_context_tokens", "Tokens of assembled retrieval context per query",
+                           buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000, 8000))
+
+# Per-request stage totals for the Server-Timing header; None outside a request.
+# asyncio.to_thread copies the context, so stages run on worker threads land in the same dict.
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def observe(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block as one stage; works in sync and async code alike."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def record_llm_call(prompt: str, response: Any = None, completion: str = "", outcome: str = "ok"):
+    """Count tokens of one LLM call, using the provider's usage metadata when it reports it."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    content = completion or getattr(response, "content", "") or ""
+    LLM_TOKENS.labels(kind="prompt").inc(usage.get("input_tokens") or estimate_tokens(prompt))
+    LLM_TOKENS.labels(kind="completion").inc(usage.get("output_tokens") or estimate_tokens(content))
+    LLM_CALLS.labels(outcome=outcome).inc()
+
+
+def start_request_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def track_gauge(name: str, description: str, read):
+    Gauge(name, description).set_function(read)
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
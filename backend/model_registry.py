@@ -0,0 +1,109 @@
+import importlib
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from embedding_cache import CachedEmbeddings
+from config import EMBEDDING_MODEL, EMBEDDING_CACHE_MAX_ENTRIES, LLM_CALL_DEADLINE, LLM_MODEL
+
+_import_seconds: Dict[str, float] = {}
+
+
+def lazy_import(module_name: str, attribute: str) -> Any:
+    """Import a heavy dependency on first use, recording how long the import took."""
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if module_name not in _import_seconds:
+        _import_seconds[module_name] = round(time.perf_counter() - start, 3)
+    return getattr(module, attribute)
+
+
+class ModelRegistry:
+    """Process-wide embedding model and LLM client, loaded once and shared by every RAGSystem.
+
+    `warm_up()` loads and exercises the embedding model on a background thread, so
+    the first build or query doesn't pay for reading the weights from disk.
+    """
+
+    def __init__(self):
+        self._embedding_model = None
+        self._cached: Dict[str, CachedEmbeddings] = {}
+        self._llm = None
+        self._lock = threading.Lock()
+        self._llm_lock = threading.Lock()
+        self._warm_thread: Optional[threading.Thread] = None
+        self.embedding_load_seconds: Optional[float] = None
+        self.llm_load_seconds: Optional[float] = None
+        self.warm_up_seconds: Optional[float] = None
+        self.warm_up_error: Optional[str] = None
+
+    def embedding_model(self):
+        with self._lock:
+            if self._embedding_model is None:
+                start = time.perf_counter()
+                HuggingFaceEmbeddings = lazy_import("langchain_huggingface", "HuggingFaceEmbeddings")
+                self._embedding_model = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL,
+                    encode_kwargs={'normalize_embeddings': True}
+                )
+                self.embedding_load_seconds = round(time.perf_counter() - start, 3)
+                print(f"✓ Loaded embedding model {EMBEDDING_MODEL} ({self.embedding_load_seconds:.2f}s)")
+            return self._embedding_model
+
+    def embeddings(self, cache_path: str) -> CachedEmbeddings:
+        """The shared model behind a disk cache; one wrapper per cache file."""
+        model = self.embedding_model()
+        with self._lock:
+            if cache_path not in self._cached:
+                self._cached[cache_path] = CachedEmbeddings(
+                    model,
+                    model_name=EMBEDDING_MODEL,
+                    cache_path=cache_path,
+                    max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+                )
+            return self._cached[cache_path]
+
+    def llm(self):
+        with self._llm_lock:
+            if self._llm is None:
+                start = time.perf_counter()
+                ChatGoogleGenerativeAI = lazy_import("langchain_google_genai", "ChatGoogleGenerativeAI")
+                self._llm = ChatGoogleGenerativeAI(
+                    model=LLM_MODEL,
+                    google_api_key=os.environ["GOOGLE_API_KEY"],
+                    temperature=0.3,
+                    # Retries, backoff and deadlines are handled by llm_limiter for every call
+                    max_retries=1,
+                    timeout=LLM_CALL_DEADLINE
+                )
+                self.llm_load_seconds = round(time.perf_counter() - start, 3)
+            return self._llm
+
+    def warm_up(self):
+        """Load and run the embedding model once in the background; returns immediately."""
+        if self._warm_thread is not None:
+            return
+        self._warm_thread = threading.Thread(target=self._warm, name="model-warm-up", daemon=True)
+        self._warm_thread.start()
+
+    def _warm(self):
+        start = time.perf_counter()
+        try:
+            self.embedding_model().embed_query("warm up")
+            self.warm_up_seconds = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            self.warm_up_error = str(e)
+            print(f"✗ Model warm-up failed: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embedding_model_loaded": self._embedding_model is not None,
+            "embedding_load_seconds": self.embedding_load_seconds,
+            "llm_load_seconds": self.llm_load_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+            "warm_up_error": self.warm_up_error,
+            "import_seconds": dict(_import_seconds)
+        }
+
+
+models = ModelRegistry()
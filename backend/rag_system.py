@@ -1,133 +1,621 @@
+import asyncio
+import itertools
+import multiprocessing
 import os
-from typing import List
-from langchain_community.document_loaders import PyPDFLoader,UnstructuredMarkdownLoader,TextLoader,JSONLoader,UnstructuredHTMLLoader
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Any, Optional, Tuple
 from langchain_core.documents import Document
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
+from config import (EMBEDDING_MODEL, LLM_MODEL, CHUNK_THRESHOLD, RETRIEVAL_K, CHROMA_DIR, MANIFEST_FILE,
+                    EMBEDDING_CACHE_PATH, INGEST_WORKERS, CHUNK_STRATEGY,
+                    CHUNK_MAX_CHARS, VECTOR_BACKEND, VECTOR_DTYPE, HYBRID_RETRIEVAL,
+                    CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD)
+from manifest import DocumentManifest
+from model_registry import lazy_import, models
+from llm_limiter import llm_limiter
+from llm_cache import LLMResponseCache
+from chunking import StructureChunker
+from json_ingest import iter_json_documents
+from vector_index import QuantizedVectorStore
+from lexical_index import LexicalIndex, HybridRetriever
+from context_assembly import AssembledContext, ContextAssembler
+from metrics import CONTEXT_TOKENS, LLM_CALLS, observe, record_llm_call, span
 
 load_dotenv()
 
+SUPPORTED_EXTENSIONS = ('.pdf', '.md', '.txt', '.json', '.html')
+
+QA_TEMPLATE = """You are a QA expert. Answer the question based ONLY on the following context.
+                If the context doesn't contain the answer, say "The provided documents don't contain information about this."
+
+                Context:
+                {context}
+
+                Question: {question}
+
+                Answer: """
+
+
+LOADERS = "langchain_community.document_loaders"
+
+
+def load_file(file_path: str, raw_markdown: bool = False) -> List[Document]:
+    # Loaders (and unstructured/pypdf behind them) are imported only once a file of their type shows up
+    filename = os.path.basename(file_path)
+    if filename.endswith('.pdf'):
+        loader = lazy_import(LOADERS, "PyPDFLoader")(file_path)
+    elif filename.endswith('.md') and raw_markdown:
+        # Keep the '#' headings for structure-aware chunking
+        loader = lazy_import(LOADERS, "TextLoader")(file_path, encoding="utf-8")
+    elif filename.endswith('.md'):
+        loader = lazy_import(LOADERS, "UnstructuredMarkdownLoader")(file_path)
+    elif filename.endswith('.txt'):
+        loader = lazy_import(LOADERS, "TextLoader")(file_path, encoding="utf-8")
+    elif filename.endswith('.json'):
+        return list(iter_json_documents(file_path))
+    elif filename.endswith('.html'):
+        loader = lazy_import(LOADERS, "UnstructuredHTMLLoader")(file_path)
+    else:
+        print(f"Unsupported file type: {filename}")
+        return []
+    return loader.load()
+
+
+def timed_load(file_path: str, raw_markdown: bool = False) -> Tuple[str, List[Document], float, Optional[str]]:
+    # Module-level so it can run in a worker process
+    start = time.perf_counter()
+    try:
+        return file_path, load_file(file_path, raw_markdown), time.perf_counter() - start, None
+    except Exception as e:
+        return file_path, [], time.perf_counter() - start, str(e)
+
+
 class RAGSystem:
-    def __init__(self, docs_folder: str):
+    def __init__(self, docs_folder: str, persist_directory: str = CHROMA_DIR,
+                 llm_cache: Optional[LLMResponseCache] = None, chunk_strategy: str = CHUNK_STRATEGY,
+                 embedding_cache_path: str = EMBEDDING_CACHE_PATH, vector_backend: str = VECTOR_BACKEND):
+        if chunk_strategy not in ("semantic", "structure"):
+            raise ValueError(f"Unknown chunk strategy: {chunk_strategy}")
+        if vector_backend not in ("chroma", "quantized"):
+            raise ValueError(f"Unknown vector backend: {vector_backend}")
         self.docs_folder = docs_folder
+        self.persist_directory = persist_directory
+        self.chunk_strategy = chunk_strategy
+        self.embedding_cache_path = embedding_cache_path
+        # Recorded in the manifest; vectors stored by another backend or dtype are not reused
+        self.vector_backend = vector_backend if vector_backend == "chroma" else f"quantized/{VECTOR_DTYPE}"
+        self.manifest_path = os.path.join(persist_directory, MANIFEST_FILE)
+        self.llm_cache = llm_cache
+        self.index_version = ""
         self.vectorstore = None
+        self.lexical = None
         self.retriever = None
         self.llm = None
         self.embedding = None
-        
+
+    def load_file(self, file_path: str) -> List[Document]:
+        return load_file(file_path, self.chunk_strategy == "structure")
+
     def load_documents(self) -> List[Document]:
         documents = [] 
         # Check if folder exists
         if not os.path.exists(self.docs_folder):
             print(f"Warning: Folder {self.docs_folder} does not exist")
             return documents    
-        files = os.listdir(self.docs_folder)
+        files = [filename for filename in os.listdir(self.docs_folder)
+                 if not os.path.isdir(os.path.join(self.docs_folder, filename))]
         if not files:
             print(f"Warning: No files found in {self.docs_folder}")
             return documents  
-        for filename in files:
-            file_path = os.path.join(self.docs_folder, filename)  
-            # Skip dirct
-            if os.path.isdir(file_path):
-                continue
+        for filename, loaded_docs, _ in self.iter_documents(files):
             try:
-                if filename.endswith('.pdf'):
-                    loader = PyPDFLoader(file_path)
-                elif filename.endswith('.md'):
-                    loader = UnstructuredMarkdownLoader(file_path)
-                elif filename.endswith('.txt'):
-                    loader = TextLoader(file_path, encoding="utf-8")
-                elif filename.endswith('.json'):
-                    loader = JSONLoader(
-                        file_path=file_path,
-                        jq_schema='.',
-                        text_content=False
-                    )
-                elif filename.endswith('.html'):
-                    loader = UnstructuredHTMLLoader(file_path)
-                else:
-                    print(f"Unsupported file type: {filename}")
-                    continue
-                loaded_docs = loader.load()
-                documents.extend(loaded_docs)
-                print(f"✓ Loaded {filename} ({len(loaded_docs)} documents)")
-                
+                # JSON documents are lazy: parse errors surface while consuming them
+                docs = list(loaded_docs)
             except Exception as e:
-                print(f"✗ Error loading {filename}: {str(e)}")
+                print(f"✗ Error loading {filename}: {e}")
                 continue
+            documents.extend(docs)
         print(f"Total documents loaded: {len(documents)}")
         return documents
+
+    def iter_documents(self, filenames: List[str],
+                       workers: int = INGEST_WORKERS) -> Iterator[Tuple[str, Iterable[Document], Optional[float]]]:
+        """Load files in a process pool, yielding (filename, documents, seconds) as each finishes.
+
+        At most `2 * workers` files are in flight, so memory stays bounded while the
+        caller chunks and embeds earlier files. JSON files are streamed instead: their
+        documents come as a lazy iterator, parsed as the caller consumes it, and
+        seconds is None since loading interleaves with the caller's work.
+        """
+        paths = [os.path.join(self.docs_folder, filename) for filename in filenames]
+        streamed = [path for path in paths if path.endswith('.json')]
+        paths = [path for path in paths if not path.endswith('.json')]
+        raw_markdown = self.chunk_strategy == "structure"
+        executor = None
+        if workers > 1 and len(paths) > 1:
+            # spawn: builds run on a worker thread, and forking a threaded process is unsafe
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            queue = iter(paths)
+            pending = {executor.submit(timed_load, path, raw_markdown)
+                       for path in itertools.islice(queue, 2 * workers)}
+        try:
+            # The pool is already busy with the other files while these stream
+            for path in streamed:
+                yield os.path.basename(path), iter_json_documents(path), None
+            if executor is None:
+                for path in paths:
+                    yield self._loaded(*timed_load(path, raw_markdown))
+                return
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    next_path = next(queue, None)
+                    if next_path:
+                        pending.add(executor.submit(timed_load, next_path, raw_markdown))
+                    yield self._loaded(*future.result())
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _loaded(self, file_path: str, documents: List[Document], seconds: float,
+                error: Optional[str]) -> Tuple[str, List[Document], float]:
+        filename = os.path.basename(file_path)
+        if error:
+            print(f"✗ Error loading {filename}: {error}")
+        elif documents:
+            print(f"✓ Loaded {filename} ({len(documents)} documents, {seconds:.2f}s)")
+        return filename, documents, seconds
+
+    def scan_documents(self) -> Dict[str, str]:
+        """Content hash of every supported file in the docs folder, keyed by filename."""
+        hashes = {}
+        if not os.path.exists(self.docs_folder):
+            print(f"Warning: Folder {self.docs_folder} does not exist")
+            return hashes
+        for filename in sorted(os.listdir(self.docs_folder)):
+            file_path = os.path.join(self.docs_folder, filename)
+            if os.path.isdir(file_path):
+                continue
+            if not filename.endswith(SUPPORTED_EXTENSIONS):
+                print(f"Unsupported file type: {filename}")
+                continue
+            hashes[filename] = DocumentManifest.hash_file(file_path)
+        return hashes
     
-    def build_knowledge_base(self):  
-        print("Starting knowledge base build...")
-        print("Initializing LLM...")
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            google_api_key=os.environ["GOOGLE_API_KEY"],
-            temperature=0.3
-        )
-        print("Initializing embeddings...")
-        self.embedding = HuggingFaceEmbeddings(
-            model_name="BAAI/bge-small-en-v1.5",
-            encode_kwargs={'normalize_embeddings': True}
+    def initialize_models(self):
+        # Both come from the process-wide registry, so only the first call loads anything
+        self.llm = models.llm()
+        # One cached instance serves both the SemanticChunker and the vector store
+        self.embedding = models.embeddings(self.embedding_cache_path)
+
+    def load_existing_index(self) -> bool:
+        """Reopen the persisted collection without re-embedding, if it still matches the uploads."""
+        manifest = DocumentManifest.load(self.manifest_path)
+        if not manifest.files:
+            print("No persisted knowledge base found")
+            return False
+        if manifest.embedding_model != EMBEDDING_MODEL:
+            print(f"⚠️ Persisted index uses {manifest.embedding_model}, expected {EMBEDDING_MODEL}")
+            return False
+        if manifest.chunk_strategy != self.chunk_strategy:
+            print(f"⚠️ Persisted index uses {manifest.chunk_strategy} chunking, expected {self.chunk_strategy}")
+            return False
+        if manifest.vector_backend != self.vector_backend:
+            print(f"⚠️ Persisted index uses the {manifest.vector_backend} backend, expected {self.vector_backend}")
+            return False
+        current = self.scan_documents()
+        added, changed, removed = manifest.diff(current)
+        if added or changed or removed:
+            print(f"⚠️ Persisted index is stale ({len(added)} added, {len(changed)} changed, {len(removed)} removed)")
+            return False
+
+        self.initialize_models()
+        vectorstore = self.open_vectorstore(manifest.collection)
+        expected = len(manifest.all_chunk_ids())
+        stored = self.collection(vectorstore).count()
+        if stored != expected:
+            print(f"⚠️ Persisted collection has {stored} chunks, manifest expects {expected}")
+            return False
+        self.vectorstore = vectorstore
+        self.lexical = self.load_lexical(vectorstore, manifest)
+        self.index_version = manifest.version()
+        self.retriever = self.create_retriever()
+        print(f"✓ Loaded persisted knowledge base ({stored} chunks, {len(manifest.files)} files)")
+        return True
+
+    def open_vectorstore(self, collection_name: str):
+        if self.vector_backend != "chroma":
+            return QuantizedVectorStore(
+                collection_name=collection_name,
+                embedding_function=self.embedding,
+                persist_directory=os.path.join(self.persist_directory, "quantized"),
+                dtype=VECTOR_DTYPE
+            )
+        Chroma = lazy_import("langchain_chroma", "Chroma")
+        return Chroma(
+            collection_name=collection_name,
+            embedding_function=self.embedding,
+            persist_directory=self.persist_directory
         )
-        print("Loading documents...")
-        documents = self.load_documents() 
-        if not documents:
+
+    @staticmethod
+    def collection(vectorstore):
+        """The object taking raw count/get/upsert calls: Chroma's collection, or the quantized store itself."""
+        if isinstance(vectorstore, QuantizedVectorStore):
+            return vectorstore
+        return vectorstore._collection
+
+    def lexical_path(self, collection_name: str) -> str:
+        return os.path.join(self.persist_directory, "lexical", f"{collection_name}.json")
+
+    def load_lexical(self, vectorstore, manifest: DocumentManifest, batch_size: int = 500) -> LexicalIndex:
+        """The collection's BM25 index, rebuilt from the stored chunk texts if missing or incomplete."""
+        path = self.lexical_path(manifest.collection)
+        lexical = LexicalIndex.load(path)
+        chunk_ids = manifest.all_chunk_ids()
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in lexical]
+        if missing:
+            print(f"Indexing {len(missing)} chunks for lexical search...")
+            for start in range(0, len(missing), batch_size):
+                batch = self.collection(vectorstore).get(ids=missing[start:start + batch_size], include=["documents"])
+                lexical.add(batch["ids"], batch["documents"])
+            lexical.save(path)
+        return lexical
+
+    def fetch_chunks(self, vectorstore, chunk_ids: List[str]) -> List[Document]:
+        """Stored chunks by id, in the order given."""
+        if not chunk_ids:
+            return []
+        batch = self.collection(vectorstore).get(ids=chunk_ids, include=["documents", "metadatas"])
+        found = {chunk_id: Document(id=chunk_id, page_content=text, metadata=metadata or {})
+                 for chunk_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"])}
+        return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found]
+
+    def create_retriever(self):
+        if not HYBRID_RETRIEVAL:
+            return self.vectorstore.as_retriever(search_kwargs={"k": RETRIEVAL_K})
+        vectorstore = self.vectorstore
+        return HybridRetriever(vectorstore=vectorstore, lexical=self.lexical, k=RETRIEVAL_K,
+                               fetch=lambda chunk_ids: self.fetch_chunks(vectorstore, chunk_ids))
+
+    def memory_estimate(self) -> int:
+        """Rough resident size of the loaded index in bytes (vectors, texts, BM25 postings)."""
+        if self.vectorstore is None:
+            return 0
+        total = 0
+        if self.lexical is not None:
+            total += 100 * sum(len(terms) for terms in self.lexical.chunks.values())
+        if isinstance(self.vectorstore, QuantizedVectorStore):
+            total += self.vectorstore.memory_bytes()
+        else:
+            # Chroma keeps float32 vectors in its in-memory HNSW index; texts stay in SQLite
+            collection = self.vectorstore._collection
+            sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            dims = len(sample[0]) if sample is not None and len(sample) else 0
+            total += collection.count() * dims * 4
+        return total
+
+    def drop_collections(self, keep: str):
+        """Remove collections left behind by superseded or cancelled builds."""
+        lexical_dir = os.path.dirname(self.lexical_path(keep))
+        if os.path.isdir(lexical_dir):
+            for name in os.listdir(lexical_dir):
+                if name != os.path.basename(self.lexical_path(keep)):
+                    os.remove(os.path.join(lexical_dir, name))
+        if self.vector_backend != "chroma":
+            for name in QuantizedVectorStore.list_collections(os.path.join(self.persist_directory, "quantized")):
+                if name != keep:
+                    self.open_vectorstore(name).delete_collection()
+                    print(f"✓ Dropped old collection {name}")
+            return
+        store = self.open_vectorstore(keep)
+        for collection in store._client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name != keep:
+                store._client.delete_collection(name)
+                print(f"✓ Dropped old collection {name}")
+
+    def copy_chunks(self, source, target, chunk_ids: List[str], lexical: Optional[LexicalIndex] = None,
+                    batch_size: int = 500):
+        # Reuse stored vectors of unchanged files instead of re-embedding them
+        with span("vector_write"):
+            for start in range(0, len(chunk_ids), batch_size):
+                batch = self.collection(source).get(
+                    ids=chunk_ids[start:start + batch_size],
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                if batch["ids"]:
+                    self.collection(target).upsert(
+                        ids=batch["ids"],
+                        embeddings=batch["embeddings"],
+                        documents=batch["documents"],
+                        metadatas=batch["metadatas"]
+                    )
+                    if lexical is not None:
+                        # Only chunks the previous lexical index lacks (e.g. built before it existed)
+                        missing = [(chunk_id, text) for chunk_id, text in zip(batch["ids"], batch["documents"])
+                                   if chunk_id not in lexical]
+                        lexical.add([chunk_id for chunk_id, _ in missing], [text for _, text in missing])
+
+    def create_splitter(self):
+        if self.chunk_strategy == "structure":
+            return StructureChunker(max_chars=CHUNK_MAX_CHARS)
+        SemanticChunker = lazy_import("langchain_experimental.text_splitter", "SemanticChunker")
+        return SemanticChunker(embeddings=self.embedding,breakpoint_threshold_type=CHUNK_THRESHOLD)
+
+    def build_knowledge_base(self, progress: Optional[Callable[..., None]] = None) -> Dict[str, Any]:
+        """Incrementally (re)build the index into a fresh collection.
+
+        The collection being served is never modified; the new one only becomes
+        current once the manifest pointing at it is saved. `progress(stage, **counts)`
+        is called between units of work and may raise to cancel the build.
+        """
+        report = progress or (lambda stage, **counts: None)
+        build_started = time.perf_counter()
+        print("Starting knowledge base build...")
+        self.initialize_models()
+        report("loading")
+        print("Scanning documents...")
+        current = self.scan_documents()
+        if not current:
             raise ValueError("❌ No documents were loaded. Please upload documents first.")
-        print(f"✓ Loaded {len(documents)} documents")
-        print("Splitting documents into chunks...")
-        splitter = SemanticChunker(embeddings=self.embedding,breakpoint_threshold_type="standard_deviation")
-        chunks = splitter.split_documents(documents)
-        if not chunks:
+
+        previous = DocumentManifest.load(self.manifest_path)
+        self.drop_collections(keep=previous.collection)
+        if (previous.embedding_model != EMBEDDING_MODEL or previous.chunk_strategy != self.chunk_strategy
+                or previous.vector_backend != self.vector_backend):
+            # Vectors from another model, chunking or backend (or from a build without a manifest) can't be reused
+            print("Embedding model, chunking or vector backend changed, or no manifest found, re-indexing all documents...")
+            previous = DocumentManifest(self.manifest_path)
+
+        added, changed, removed = previous.diff(current)
+        unchanged = [name for name in current if name in previous.files and name not in changed]
+        print(f"✓ {len(added)} added, {len(changed)} changed, {len(removed)} removed, {len(unchanged)} unchanged")
+
+        manifest = DocumentManifest(self.manifest_path)
+        manifest.embedding_model = EMBEDDING_MODEL
+        manifest.chunk_strategy = self.chunk_strategy
+        manifest.vector_backend = self.vector_backend
+        manifest.collection = f"kb_{uuid.uuid4().hex[:12]}"
+        vectorstore = self.open_vectorstore(manifest.collection)
+        to_index = added + changed
+        # The BM25 index follows the same incremental path: start from the previous one,
+        # drop chunks of changed/removed files, add new chunks as they are indexed
+        lexical = LexicalIndex.load(self.lexical_path(previous.collection)) if previous.files else LexicalIndex()
+        lexical.remove(previous.chunk_ids(changed + removed))
+        counts = {"files_total": len(to_index), "files_done": 0, "chunks_total": 0,
+                  "chunks_embedded": 0, "chunks_indexed": 0, "chunks_copied": 0}
+        file_timings = {}
+        try:
+            if unchanged:
+                report("indexing", **counts)
+                copied_ids = previous.chunk_ids(unchanged)
+                self.copy_chunks(self.open_vectorstore(previous.collection), vectorstore, copied_ids, lexical)
+                for filename in unchanged:
+                    manifest.files[filename] = previous.files[filename]
+                counts["chunks_copied"] = len(copied_ids)
+
+            splitter = self.create_splitter()
+            report("loading", **counts)
+            # Workers keep loading later files while this loop chunks and embeds earlier ones
+            for filename, documents, load_seconds in self.iter_documents(to_index):
+                timing = {"documents": 0, "load_seconds": load_seconds or 0.0,
+                          "chunk_seconds": 0.0, "embed_seconds": 0.0}
+                chunk_ids = []
+                documents = iter(documents)
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        document = next(documents, None)
+                    except Exception as e:
+                        # A malformed streamed file: drop what it indexed so far, retry once it changes
+                        print(f"✗ Error loading {filename}: {e}")
+                        if chunk_ids:
+                            vectorstore.delete(ids=chunk_ids)
+                            lexical.remove(chunk_ids)
+                        chunk_ids = []
+                        break
+                    if load_seconds is None:
+                        timing["load_seconds"] += time.perf_counter() - start
+                    if document is None:
+                        break
+                    timing["documents"] += 1
+                    report("chunking", **counts)
+                    start = time.perf_counter()
+                    if document.metadata.get("prechunked"):
+                        # One endpoint/schema per document, already split to CHUNK_MAX_CHARS at ingest
+                        chunks = [document]
+                    else:
+                        chunks = splitter.split_documents([document])
+                    timing["chunk_seconds"] += time.perf_counter() - start
+                    start = time.perf_counter()
+                    chunk_ids += self.index_chunks(vectorstore, filename, current[filename], chunks,
+                                                   len(chunk_ids), report, counts, lexical)
+                    timing["embed_seconds"] += time.perf_counter() - start
+                # Files without chunks are recorded too, or every restart would see them as added
+                manifest.update_file(filename, current[filename], chunk_ids)
+                if chunk_ids:
+                    print(f"✓ Indexed {filename} ({len(chunk_ids)} chunks)")
+                elif timing["documents"]:
+                    print(f"⚠️ No chunks created from {filename}")
+                timing["chunks"] = len(chunk_ids)
+                observe("load", timing["load_seconds"])
+                observe("chunk", timing["chunk_seconds"])
+                timing["load_seconds"] = round(timing["load_seconds"], 3)
+                timing["chunk_seconds"] = round(timing["chunk_seconds"], 3)
+                timing["embed_seconds"] = round(timing["embed_seconds"], 3)
+                file_timings[filename] = timing
+                counts["files_done"] += 1
+                report("loading", **counts)
+            if isinstance(vectorstore, QuantizedVectorStore):
+                # Staged rows only reach disk here, before the manifest points at them
+                with span("vector_write"):
+                    vectorstore.flush()
+            lexical.save(self.lexical_path(manifest.collection))
+        except BaseException:
+            vectorstore.delete_collection()
+            raise
+
+        if not manifest.all_chunk_ids():
+            vectorstore.delete_collection()
             raise ValueError("❌ No chunks created from documents.")
-        print(f"✓ Created {len(chunks)} chunks")       
-        print("Creating vector store...")
-        self.vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=self.embedding,
-            persist_directory="./chroma_db"
-        )
-        self.retriever = self.vectorstore.as_retriever(
-            search_kwargs={"k": 5}
-        )
+        manifest.save()
+        print(f"✓ Embedding cache: {self.embedding.stats()}")
+
+        self.vectorstore = vectorstore
+        self.lexical = lexical
+        self.index_version = manifest.version()
+        self.retriever = self.create_retriever()
+        report("done", **counts)
+        observe("build", time.perf_counter() - build_started)
         print("✓ Knowledge base built successfully!")
-    
-    def query_knowledge_base(self, question: str) -> str:
+        return {
+            "added": len(added),
+            "changed": len(changed),
+            "removed": len(removed),
+            "unchanged": len(unchanged),
+            "new_chunks": counts["chunks_indexed"],
+            "total_chunks": len(manifest.all_chunk_ids()),
+            "file_timings": file_timings
+        }
+
+    def index_chunks(self, vectorstore, filename: str, content_hash: str, chunks: List[Document],
+                     first_index: int, report: Callable[..., None], counts: Dict[str, int],
+                     lexical: Optional[LexicalIndex] = None, batch_size: int = 64) -> List[str]:
+        counts["chunks_total"] += len(chunks)
+        chunk_ids = [f"{content_hash[:16]}:{filename}:{first_index + i}" for i in range(len(chunks))]
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            report("embedding", **counts)
+            embeddings = self.embedding.embed_documents([chunk.page_content for chunk in batch])
+            counts["chunks_embedded"] += len(batch)
+            report("indexing", **counts)
+            with span("vector_write"):
+                self.collection(vectorstore).upsert(
+                    ids=chunk_ids[start:start + batch_size],
+                    embeddings=embeddings,
+                    documents=[chunk.page_content for chunk in batch],
+                    # chunk_index lets context assembly merge neighbouring chunks of a file
+                    metadatas=[{**(chunk.metadata or {"source": filename}), "chunk_index": first_index + start + offset}
+                               for offset, chunk in enumerate(batch)]
+                )
+                if lexical is not None:
+                    lexical.add(chunk_ids[start:start + batch_size], [chunk.page_content for chunk in batch])
+            counts["chunks_indexed"] += len(batch)
+        return chunk_ids
+
+    def assemble_context(self, relevant_docs: List[Document]) -> AssembledContext:
+        assembler = ContextAssembler(self.embedding, CONTEXT_TOKEN_BUDGET, CONTEXT_DEDUP_THRESHOLD)
+        with span("context_assembly"):
+            assembled = assembler.assemble(relevant_docs)
+        CONTEXT_TOKENS.observe(assembled.stats["context_tokens"])
+        return assembled
+
+    def retrieve_context(self, question: str) -> AssembledContext:
+        """Retrieved chunks, de-duplicated, merged and trimmed to the context token budget."""
+        if not self.retriever:
+            raise ValueError("Knowledge base not built. Please build it first.")
+        with span("retrieval"):
+            relevant_docs = self.retriever.invoke(question)
+        return self.assemble_context(relevant_docs)
+
+    async def aretrieve_context(self, question: str) -> AssembledContext:
         if not self.retriever:
             raise ValueError("Knowledge base not built. Please build it first.")
-        relevant_docs = self.retriever.invoke(question)
-        context_parts = []
-        for doc in relevant_docs:
-            source_name = doc.metadata.get("source", "Unknown_Source")
-            context_parts.append(f"[SOURCE: {source_name}]\n{doc.page_content}")
-        context = "\n\n".join(context_parts)
-        return context
+        with span("retrieval"):
+            relevant_docs = await self.retriever.ainvoke(question)
+        # Embedding lookups for de-duplication hit SQLite (or the model), keep them off the event loop
+        return await asyncio.to_thread(self.assemble_context, relevant_docs)
+
+    def query_knowledge_base(self, question: str) -> str:
+        return self.retrieve_context(question).text
+
+    async def aquery_knowledge_base(self, question: str) -> str:
+        return (await self.aretrieve_context(question)).text
+
+    def render_prompt(self, question: str, context: str, template: str = QA_TEMPLATE) -> str:
+        # str.format does not re-parse substituted values, so braces in context/question are safe
+        with span("prompt"):
+            return template.format(context=context, question=question)
+
+    def cache_key(self, prompt: str, context: str) -> str:
+        return self.llm_cache.key(LLM_MODEL, getattr(self.llm, "temperature", None), context, prompt)
+
+    def generate_with_context(self, question: str, context: str, template: str = QA_TEMPLATE,
+                              html_version: str = "") -> str:
+        """Generate from context the caller already retrieved, without another vector search."""
+        prompt = self.render_prompt(question, context, template)
+        if self.llm_cache is None:
+            return self.invoke_llm(prompt)
+        key = self.cache_key(prompt, context)
+        cached = self.llm_cache.get(key)
+        if cached is not None:
+            return cached
+        response = self.invoke_llm(prompt)
+        self.llm_cache.put(key, response, self.index_version, html_version)
+        return response
+
+    async def agenerate_with_context(self, question: str, context: str, template: str = QA_TEMPLATE,
+                                     html_version: str = "") -> str:
+        prompt = self.render_prompt(question, context, template)
+        if self.llm_cache is None:
+            return await self.ainvoke_llm(prompt)
+        return await self.llm_cache.get_or_create(
+            self.cache_key(prompt, context), lambda: self.ainvoke_llm(prompt),
+            self.index_version, html_version
+        )
     
     def generate_response(self, question: str) -> str:
         context = self.query_knowledge_base(question)
-        template = """You are a QA expert. Answer the question based ONLY on the following context.
-                If the context doesn't contain the answer, say "The provided documents don't contain information about this."
+        return self.generate_with_context(question, context)
 
-                Context:
-                {context}
+    async def agenerate_response(self, question: str) -> str:
+        context = await self.aquery_knowledge_base(question)
+        return await self.agenerate_with_context(question, context)
 
-                Question: {question}
+    async def astream_with_context(self, question: str, context: str,
+                                   template: str = QA_TEMPLATE) -> AsyncIterator[str]:
+        prompt = self.render_prompt(question, context, template)
+        if self.llm_cache is None:
+            stream = self.astream_llm(prompt)
+        else:
+            stream = self.llm_cache.stream_or_create(
+                self.cache_key(prompt, context), lambda: self.astream_llm(prompt), self.index_version
+            )
+        async for text in stream:
+            yield text
 
-                Answer: """
-        
-        prompt = ChatPromptTemplate.from_template(template)
-        rag_chain = (
-            {"context": lambda x: context, "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
-        
-        return rag_chain.invoke(question)
+    async def astream_llm(self, prompt: str) -> AsyncIterator[str]:
+        parts = []
+        with span("llm"):
+            try:
+                async for chunk in llm_limiter.astream(self.llm, prompt):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield chunk.content
+            except Exception:
+                LLM_CALLS.labels(outcome="error").inc()
+                raise
+        record_llm_call(prompt, completion="".join(parts))
+
+    def invoke_llm(self, prompt: str) -> str:
+        with span("llm"):
+            try:
+                response = llm_limiter.invoke(self.llm, prompt)
+            except Exception:
+                LLM_CALLS.labels(outcome="error").inc()
+                raise
+        record_llm_call(prompt, response)
+        return response.content
+
+    async def ainvoke_llm(self, prompt: str) -> str:
+        with span("llm"):
+            try:
+                response = await llm_limiter.ainvoke(self.llm, prompt)
+            except Exception:
+                LLM_CALLS.labels(outcome="error").inc()
+                raise
+        record_llm_call(prompt, response)
+        return response.content
@@ -1,32 +1,31 @@
+import asyncio
 import json
 import re
-from typing import Dict, Any, List
+from typing import AsyncIterator, Dict, Any, List, Optional, Set, Tuple
 from rag_system import RAGSystem
+from html_index import get_html_index, element_terms, words, CONTROL_TAGS, VOID_TAGS
+from config import HTML_TOKEN_BUDGET, BATCH_SCRIPT_CONCURRENCY, TEMPLATE_SCRIPTS, SCRIPT_REPAIR_ATTEMPTS
+from tokens import estimate_tokens
+from metrics import SCRIPT_GENERATIONS, SCRIPT_ISSUES, SCRIPT_VALIDATIONS, span
+from script_templates import TemplateScriptSynthesizer
+from script_validation import REPAIR_TEMPLATE, ScriptValidator
 
-class ScriptGenerator:
-    def __init__(self, rag_system: RAGSystem):
-        self.rag_system = rag_system
-    
-    def generate_script_with_html(self, test_case: Dict[str, Any], html_content: str) -> str:
-
-        html_elements = self.analyze_html_content(html_content)
-        feature_context = self.rag_system.query_knowledge_base(
-            test_case.get('feature', '') + " " + test_case.get('test_scenario', '')
-        )
-
-        prompt = f"""You are a Selenium Python expert. Generate a complete, runnable Selenium test script.
+PAGE_HTML_PLACEHOLDER = "__PAGE_HTML__"
+# What a script prompt sees of a test case; store bookkeeping (queries, occurrences, cluster,
+# status, similarity) would bloat the prompt and change the LLM cache key on every merge
+TEST_CASE_FIELDS = ("test_id", "feature", "test_scenario", "test_steps", "expected_result", "test_type",
+                    "grounded_in")
+SKIPPED_TAGS = {"head", "script", "style", "noscript", "svg", "template", "meta", "link"}
+KEPT_ATTRIBUTES = {"id", "name", "class", "type", "for", "placeholder", "value", "href", "action",
+                   "method", "role", "aria-label", "title", "checked", "selected", "disabled",
+                   "required", "min", "max", "data-testid"}
 
-TEST CASE DETAILS:
-{json.dumps(test_case, indent=2)}
+SCRIPT_TEMPLATE = """You are a Selenium Python expert. Generate a complete, runnable Selenium test script.
 
-FULL HTML STRUCTURE (Assign this string to a variable in the script):
-{html_content}
-
-EXTRACTED HTML ELEMENTS (quick reference):
-{json.dumps(html_elements, indent=2)}
+{question}
 
 RELEVANT DOCUMENTATION:
-{feature_context}
+{context}
 
 REQUIREMENTS:
 1. Generate complete Python code with all necessary imports (including os, tempfile).
@@ -64,7 +63,7 @@ CRITICAL STABILITY INSTRUCTIONS:
     - DO NOT use `data:text/html` URLs in `driver.get()`. This causes browser security errors and blank pages.
     - Instead, your script MUST implement the `setUp` method to:
       1. Create a temporary file using Python's `tempfile` module: `self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8')`
-      2. Write the HTML content variable into this file.
+      2. Write HTML_CONTENT into this file.
       3. Close the file.
       4. Load the file in the driver using: `self.driver.get(f'file://{{self.temp_file.name}}')`
     - Implement the `tearDown` method to close the driver AND remove the temporary file using `os.remove(self.temp_file.name)`.
@@ -79,65 +78,350 @@ SPECIFIC INSTRUCTIONS:
 
 Generate ONLY the Python code without any explanations outside the code comments.
 """
-        
-        script = self.rag_system.generate_response(prompt)
+
+class ScriptGenerator:
+    def __init__(self, rag_system: RAGSystem):
+        self.rag_system = rag_system
+        self.synthesizer = TemplateScriptSynthesizer(PAGE_HTML_PLACEHOLDER)
+        self.validator = ScriptValidator()
+
+    def template_script(self, test_case: Dict[str, Any], html_content: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """A rule-based result when every step maps onto page elements, else the unresolved steps."""
+        if not TEMPLATE_SCRIPTS:
+            return None, []
+        with span("template"):
+            script, unresolved = self.synthesizer.synthesize(test_case, html_content)
+        if script is None:
+            return None, unresolved
+        # Selectors come from the index, so this only records stats; nothing to repair
+        script, validation = self.validate_script(script, html_content, max_attempts=0)
+        with span("parse"):
+            script = self.finalize_script(script, html_content)
+        SCRIPT_GENERATIONS.labels(path="template").inc()
+        return {"script": script, "html_context": None, "generation_path": "template", "unresolved_steps": [],
+                "validation": validation}, []
+
+    def generate_script(self, test_case: Dict[str, Any], html_content: str) -> Dict[str, Any]:
+        result, unresolved = self.template_script(test_case, html_content)
+        if result is not None:
+            return result
+        html_elements = self.analyze_html_content(html_content)
+        feature_context = self.rag_system.query_knowledge_base(self.feature_query(test_case))
+        with span("html_slice"):
+            html_excerpt, html_stats = self.slice_html(test_case, html_content)
+        with span("prompt"):
+            task = self.build_task(test_case, html_excerpt, html_elements)
+        script = self.rag_system.generate_with_context(task, feature_context, SCRIPT_TEMPLATE,
+                                                       html_version=get_html_index(html_content).content_hash)
+        script, validation = self.validate_script(self.extract_code(script), html_content)
+        with span("parse"):
+            script = self.finalize_script(script, html_content)
+        SCRIPT_GENERATIONS.labels(path="llm").inc()
+        return {"script": script, "html_context": html_stats, "generation_path": "llm", "unresolved_steps": unresolved,
+                "validation": validation}
+
+    async def agenerate_script(self, test_case: Dict[str, Any], html_content: str,
+                               feature_context: Optional[str] = None) -> Dict[str, Any]:
+        result, unresolved = self.template_script(test_case, html_content)
+        if result is not None:
+            return result
+        html_elements = self.analyze_html_content(html_content)
+        if feature_context is None:
+            feature_context = await self.rag_system.aquery_knowledge_base(self.feature_query(test_case))
+        with span("html_slice"):
+            html_excerpt, html_stats = self.slice_html(test_case, html_content)
+        with span("prompt"):
+            task = self.build_task(test_case, html_excerpt, html_elements)
+        script = await self.rag_system.agenerate_with_context(task, feature_context, SCRIPT_TEMPLATE,
+                                                              html_version=get_html_index(html_content).content_hash)
+        script, validation = await self.avalidate_script(self.extract_code(script), html_content)
+        with span("parse"):
+            script = self.finalize_script(script, html_content)
+        SCRIPT_GENERATIONS.labels(path="llm").inc()
+        return {"script": script, "html_context": html_stats, "generation_path": "llm", "unresolved_steps": unresolved,
+                "validation": validation}
+
+    async def astream_scripts(self, test_cases: List[Dict[str, Any]], html_content: str,
+                              max_parallel: int = BATCH_SCRIPT_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+        """Generate scripts for many test cases, yielding each result as soon as it completes.
+
+        Retrieval runs once per distinct feature and the HTML index is shared; a failing
+        item is reported in its result instead of aborting the batch.
+        """
+        get_html_index(html_content)
+        semaphore = asyncio.Semaphore(max_parallel)
+        contexts: Dict[str, asyncio.Future] = {}
+
+        def feature_context(feature: str) -> asyncio.Future:
+            # Only test cases the template path can't handle need feature context, once per feature
+            if feature not in contexts:
+                contexts[feature] = asyncio.ensure_future(self.rag_system.aquery_knowledge_base(feature))
+            return contexts[feature]
+
+        async def run(position: int, test_case: Dict[str, Any]) -> Dict[str, Any]:
+            result = {"index": position, "test_id": test_case.get('test_id', f"TC-{position + 1:03d}")}
+            try:
+                templated, _ = self.template_script(test_case, html_content)
+                if templated is not None:
+                    result.update(templated)
+                    return result
+                context = feature_context(str(test_case.get('feature', '')))
+                async with semaphore:
+                    # Shielded: the retrieval is shared with other items of the same feature
+                    result.update(await self.agenerate_script(test_case, html_content, await asyncio.shield(context)))
+            except Exception as e:
+                print(f"✗ Script generation failed for {result['test_id']}: {str(e)}")
+                result["error"] = str(e)
+            return result
+
+        tasks = [asyncio.ensure_future(run(position, test_case)) for position, test_case in enumerate(test_cases)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks + list(contexts.values()):
+                task.cancel()
+
+    def validate_script(self, script: str, html_content: str,
+                        max_attempts: int = SCRIPT_REPAIR_ATTEMPTS) -> Tuple[str, Dict[str, Any]]:
+        """Check syntax and selectors before the page HTML is injected; repair failing fragments."""
+        index = get_html_index(html_content)
+        repair = self.validator.repair(script, index, max_attempts)
+        try:
+            with span("validate"):
+                task, context = next(repair)
+            while True:
+                reply = self.rag_system.generate_with_context(task, context, REPAIR_TEMPLATE,
+                                                              html_version=index.content_hash)
+                with span("validate"):
+                    task, context = repair.send(reply)
+        except StopIteration as done:
+            return self.record_validation(*done.value)
+
+    async def avalidate_script(self, script: str, html_content: str,
+                               max_attempts: int = SCRIPT_REPAIR_ATTEMPTS) -> Tuple[str, Dict[str, Any]]:
+        index = get_html_index(html_content)
+        repair = self.validator.repair(script, index, max_attempts)
+        try:
+            with span("validate"):
+                task, context = next(repair)
+            while True:
+                reply = await self.rag_system.agenerate_with_context(task, context, REPAIR_TEMPLATE,
+                                                                     html_version=index.content_hash)
+                with span("validate"):
+                    task, context = repair.send(reply)
+        except StopIteration as done:
+            return self.record_validation(*done.value)
+
+    def record_validation(self, script: str, report: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        for kind, count in report["issue_kinds"].items():
+            SCRIPT_ISSUES.labels(kind=kind).inc(count)
+        result = "valid" if not report["issues_found"] else ("repaired" if report["valid"] else "invalid")
+        SCRIPT_VALIDATIONS.labels(result=result).inc()
+        report["result"] = result
+        if result != "valid":
+            print(f"{'✓' if report['valid'] else '⚠️'} Script validation: {report['issues_found']} issue(s), {result} "
+                  f"({report['local_fixes']} local fix(es), {report['llm_repairs']} LLM repair(s))")
+        return script, report
+
+    def generate_script_with_html(self, test_case: Dict[str, Any], html_content: str) -> str:
+        return self.generate_script(test_case, html_content)["script"]
+
+    async def agenerate_script_with_html(self, test_case: Dict[str, Any], html_content: str) -> str:
+        return (await self.agenerate_script(test_case, html_content))["script"]
+
+    def feature_query(self, test_case: Dict[str, Any]) -> str:
+        return test_case.get('feature', '') + " " + test_case.get('test_scenario', '')
+
+    def build_task(self, test_case: Dict[str, Any], html_excerpt: str,
+                   html_elements: Dict[str, List[str]]) -> str:
+        details = {field: test_case[field] for field in TEST_CASE_FIELDS if field in test_case}
+        return f"""TEST CASE DETAILS:
+{json.dumps(details, indent=2)}
+
+RELEVANT HTML STRUCTURE (excerpt of the page under test; scripts, styles and unrelated sections removed):
+{html_excerpt}
+
+EXTRACTED HTML ELEMENTS (quick reference):
+{json.dumps(html_elements, indent=2)}
+
+PAGE HTML VARIABLE:
+Assign the page HTML in the script with exactly this line: HTML_CONTENT = "{PAGE_HTML_PLACEHOLDER}"
+The placeholder is replaced with the full page after generation. Do NOT paste HTML into the script."""
+
+    def slice_html(self, test_case: Dict[str, Any], html_content: str,
+                   token_budget: int = HTML_TOKEN_BUDGET) -> Tuple[str, Dict[str, int]]:
+        """Keep only page elements relevant to the test case, within a token budget."""
+        index = get_html_index(html_content)
+        terms = self._relevance_terms(test_case)
+        scored = []
+        skipped = set()
+        for element in index.elements:
+            # Parents precede children in document order, so one pass covers whole subtrees
+            if element.tag in SKIPPED_TAGS or element.parent in skipped:
+                skipped.add(element.index)
+                continue
+            score = len(terms & element_terms(element))
+            if score:
+                scored.append((score, element.index))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        # Rendered size is tracked incrementally: each element adds its own line(s), so
+        # checking a candidate costs its new elements only, not a re-render of the excerpt
+        kept: Set[int] = set()
+        rendered = 0  # characters of the excerpt so far, counting a newline after every line
+        depths: Dict[int, int] = {}
+        parents: Set[int] = set()
+        char_budget = token_budget * 4
+        for _, element_index in scored:
+            added = self._subtree(index, element_index) + index.ancestors(element_index)
+            form = index.elements[element_index].form
+            if form is not None:
+                # Keep the sibling controls of the form so submissions can be scripted
+                added.append(form)
+                added += index.ancestors(form)
+                for member in index.forms[form]:
+                    if index.elements[member].tag in CONTROL_TAGS:
+                        added.append(member)
+                        added += index.ancestors(member)
+            added = sorted(set(added) - kept)
+            if not added:
+                continue
+            # The last line has no newline, hence the + 1
+            limit = char_budget + 1 - rendered
+            growth, new_parents = self._added_size(index, kept, set(added), depths, parents, limit)
+            if growth > limit:
+                continue
+            kept.update(added)
+            parents |= new_parents
+            rendered += growth
+        if not kept:
+            # Nothing matched: fall back to every interactive control on the page
+            for name in CONTROL_TAGS:
+                for element_index in index.by_tag.get(name, []):
+                    kept.add(element_index)
+                    kept.update(index.ancestors(element_index))
+        excerpt = self._render(index, kept)
+        if estimate_tokens(excerpt) > token_budget:
+            # Only the fallback can overshoot; cut at a line boundary
+            excerpt = excerpt[:char_budget].rsplit("\n", 1)[0]
+
+        original_tokens = estimate_tokens(html_content)
+        excerpt_tokens = estimate_tokens(excerpt)
+        stats = {
+            "original_tokens": original_tokens,
+            "excerpt_tokens": excerpt_tokens,
+            "saved_tokens": max(original_tokens - excerpt_tokens, 0),
+            "elements_kept": len(kept),
+            "elements_total": len(index.elements)
+        }
+        print(f"✓ HTML context: {excerpt_tokens}/{original_tokens} tokens ({len(kept)} elements)")
+        return excerpt, stats
+
+    def _relevance_terms(self, test_case: Dict[str, Any]) -> Set[str]:
+        steps = test_case.get('test_steps', [])
+        if isinstance(steps, str):
+            steps = [steps]
+        text = " ".join([test_case.get('feature', ''), test_case.get('test_scenario', ''),
+                         test_case.get('expected_result', '')] + list(steps))
+        return words(text)
+
+    def _subtree(self, index, element_index: int) -> List[int]:
+        nodes, pending = [], [element_index]
+        while pending:
+            current = pending.pop()
+            if index.elements[current].tag in SKIPPED_TAGS:
+                continue
+            nodes.append(current)
+            pending.extend(index.elements[current].children)
+        return nodes
+
+    @staticmethod
+    def _attrs(element) -> str:
+        return "".join(f' {name}="{value}"' if value else f' {name}'
+                       for name, value in element.attrs.items() if name in KEPT_ATTRIBUTES)
+
+    def _line_size(self, element, depth: int, has_children: bool) -> int:
+        """Characters `_render` produces for one element, excluding its children, plus a newline per line."""
+        head = 2 * depth + len(element.tag) + 3 + len(self._attrs(element))
+        if element.tag in VOID_TAGS:
+            return head
+        tail = len(element.tag) + 3
+        text = len(element.text[:120])
+        if not has_children:
+            return head + text + tail
+        return head + text + 2 * depth + tail + 1
+
+    def _added_size(self, index, kept: Set[int], added: Set[int], depths: Dict[int, int],
+                    parents: Set[int], limit: int) -> Tuple[int, Set[int]]:
+        """Characters that adding `added` to `kept` contributes to the rendered excerpt.
+
+        Stops counting once past `limit`. Records the depth of each added element in
+        `depths` and returns the elements that gain their first kept child (whose
+        closing tag moves onto its own line).
+        """
+        new_parents = {index.elements[element_index].parent for element_index in added} - {None}
+        new_parents = {parent for parent in new_parents if parent in kept or parent in added} - parents
+        growth = 0
+        for parent in new_parents & kept:
+            # Already counted as a single line: move its closing tag down
+            element = index.elements[parent]
+            growth += self._line_size(element, depths[parent], True) - self._line_size(element, depths[parent], False)
+        # Document order: parents are sized before their children
+        for element_index in sorted(added):
+            if growth > limit:
+                break
+            element = index.elements[element_index]
+            in_tree = element.parent is not None and (element.parent in kept or element.parent in added)
+            depths[element_index] = depths[element.parent] + 1 if in_tree else 0
+            growth += self._line_size(element, depths[element_index], element_index in new_parents)
+        return growth, new_parents
+
+    def _render(self, index, kept: Set[int]) -> str:
+        lines = []
+
+        def render(element_index: int, depth: int):
+            element = index.elements[element_index]
+            attrs = self._attrs(element)
+            indent = "  " * depth
+            children = [child for child in element.children if child in kept]
+            text = element.text[:120]
+            if element.tag in VOID_TAGS:
+                lines.append(f"{indent}<{element.tag}{attrs}>")
+            elif not children:
+                lines.append(f"{indent}<{element.tag}{attrs}>{text}</{element.tag}>")
+            else:
+                lines.append(f"{indent}<{element.tag}{attrs}>{text}")
+                for child in children:
+                    render(child, depth + 1)
+                lines.append(f"{indent}</{element.tag}>")
+
+        for element_index in sorted(kept):
+            if index.elements[element_index].parent not in kept:
+                render(element_index, 0)
+        return "\n".join(lines)
+
+    def finalize_script(self, script: str, html_content: str = None) -> str:
         script = self.extract_code(script)
+        if html_content is not None:
+            script = self.inject_page_html(script, html_content)
         script = self.validate_and_clean_script(script)
         return script
+
+    def inject_page_html(self, script: str, html_content: str) -> str:
+        pattern = r'[rRuU]?("""|\'\'\'|"|\')' + PAGE_HTML_PLACEHOLDER + r'\1'
+        if '"""' not in html_content and '\\' not in html_content and not html_content.endswith('"'):
+            literal = '"""' + html_content + '"""'
+        else:
+            literal = repr(html_content)
+        return re.sub(pattern, lambda match: literal, script)
     
     def analyze_html_content(self, html_content: str) -> Dict[str, List[str]]:
         """Analyze HTML content to extract elements with IDs, names, classes"""
-        elements = {
-            "buttons": [],
-            "input_fields": [],
-            "forms": [],
-            "selects": [],
-            "textareas": [],
-            "labels": [],
-            "divs_with_id": []
-        }
-        # Extract elements
-        patterns = {
-            "buttons": [
-                r'<button[^>]*\sid="([^"]+)"',
-                r'<button[^>]*\sname="([^"]+)"',
-                r'<input[^>]*\stype="(?:submit|button)"[^>]*\sid="([^"]+)"',
-            ],
-            "input_fields": [
-                r'<input[^>]*\sid="([^"]+)"',
-                r'<input[^>]*\sname="([^"]+)"',
-            ],
-            "forms": [
-                r'<form[^>]*\sid="([^"]+)"',
-            ],
-            "selects": [
-                r'<select[^>]*\sid="([^"]+)"',
-                r'<select[^>]*\sname="([^"]+)"',
-            ],
-            "textareas": [
-                r'<textarea[^>]*\sid="([^"]+)"',
-                r'<textarea[^>]*\sname="([^"]+)"',
-            ],
-            "labels": [
-                r'<label[^>]*\sfor="([^"]+)"',
-            ],
-            "divs_with_id": [
-                r'<div[^>]*\sid="([^"]+)"',
-            ]
-        }
-
-        for element_type, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                matches = re.findall(pattern, html_content, re.IGNORECASE)
-                for match in matches:
-                    if isinstance(match, tuple):
-                        elements[element_type].extend([m for m in match if m])
-                    else:
-                        elements[element_type].append(match)
-        # Remove duplicate
-        for key in elements:
-            elements[key] = list(set(elements[key]))
-        return elements
+        # Parsed once per distinct page (see html_index.get_html_index) and reused
+        with span("html_analysis"):
+            summary = get_html_index(html_content).summary()
+            return {key: list(values) for key, values in summary.items()}
     
     def extract_code(self, script: str) -> str:
         if "```python" in script:
@@ -0,0 +1,326 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from html_index import HTMLElement, HTMLIndex, element_terms, get_html_index, words
+
+NAVIGATE_VERBS = {"open", "navigate", "go", "load", "visit", "launch", "access"}
+ENTER_VERBS = {"enter", "type", "input", "set", "provide", "key", "fill", "populate"}
+CLICK_VERBS = {"click", "press", "tap", "submit", "hit"}
+SELECT_VERBS = {"select", "choose", "pick", "tick", "toggle"}
+VERIFY_VERBS = {"verify", "check", "assert", "ensure", "confirm", "observe", "see", "validate", "expect"}
+CLEAR_VERBS = {"clear", "empty", "erase"}
+WAIT_VERBS = {"wait"}
+TEXT_INPUT_TYPES = {"", "text", "email", "password", "number", "tel", "search", "url", "date"}
+CLICKABLE_INPUT_TYPES = {"submit", "button", "radio", "checkbox", "reset"}
+NEGATIVE_WORDS = {"invalid", "wrong", "incorrect", "malformed", "bad"}
+EMPTY_WORDS = {"empty", "blank", "nothing"}
+# Realistic data for fields a step names without giving a value: (terms, valid, invalid)
+FIELD_DATA = [
+    ({"email", "mail"}, "qa.tester@example.com", "invalid-email"),
+    ({"zip", "postal", "postcode"}, "94105", "ABC"),
+    ({"phone", "mobile", "tel"}, "5551234567", "phone"),
+    ({"city"}, "San Francisco", ""),
+    ({"state", "province"}, "CA", ""),
+    ({"country"}, "United States", ""),
+    ({"address", "street"}, "123 Market Street", ""),
+    ({"name", "fullname"}, "Jane Tester", ""),
+    ({"password"}, "S3cure!Pass", "123"),
+    ({"qty", "quantity", "number"}, "2", "-1"),
+]
+STEP_SEPARATORS = r"\s+(?:in|into|as|for|on|to)\s+(?:the\s+)?"
+QUOTED = re.compile(r"""["'‘’“”]([^"'‘’“”]+)["'‘’“”]""")
+LITERAL = re.compile(r"^\s*(\S+)" + STEP_SEPARATORS + r"(.+)$", re.I)
+# Values that go into CSS selectors unescaped; anything else is left to the LLM path
+CSS_IDENTIFIER = re.compile(r"^-?[_a-zA-Z][\w-]*$")
+CSS_STRING_UNSAFE = re.compile(r'["\\\x00-\x1f]')
+
+SCRIPT_HEADER = '''import os
+import tempfile
+import unittest
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.select import Select
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+HTML_CONTENT = "{placeholder}"
+
+
+class Test{class_name}(unittest.TestCase):
+    """{test_id}: {scenario}
+
+    Expected: {expected}
+    """
+
+    def setUp(self):
+        self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8')
+        self.temp_file.write(HTML_CONTENT)
+        self.temp_file.close()
+        options = webdriver.ChromeOptions()
+        options.add_argument("--start-maximized")
+        options.add_argument("--disable-notifications")
+        service = Service(ChromeDriverManager().install())
+        self.driver = webdriver.Chrome(service=service, options=options)
+        self.driver.get(f'file://{{self.temp_file.name}}')
+        self.wait = WebDriverWait(self.driver, 15)
+        self.wait.until(lambda driver: driver.execute_script("return document.readyState") == "complete")
+
+    def find(self, by, selector, clickable=False):
+        condition = EC.element_to_be_clickable if clickable else EC.presence_of_element_located
+        element = self.wait.until(condition((by, selector)))
+        self.driver.execute_script("arguments[0].scrollIntoView({{block: 'center'}});", element)
+        return element
+
+    def test_{method_name}(self):
+'''
+
+SCRIPT_FOOTER = '''
+    def tearDown(self):
+        self.driver.quit()
+        os.remove(self.temp_file.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
+'''
+
+
+class TemplateScriptSynthesizer:
+    """Builds Selenium scripts for simple form interactions without calling the LLM.
+
+    Each step is classified by its leading verb and the element it mentions is
+    resolved against the page's HTML index (ID, then NAME, then a unique CSS
+    selector). If any step can't be resolved, or nothing would be asserted,
+    `synthesize` returns no script and the caller falls back to the LLM.
+    """
+
+    def __init__(self, placeholder: str):
+        self.placeholder = placeholder
+
+    def synthesize(self, test_case: Dict[str, Any], html_content: str) -> Tuple[Optional[str], List[str]]:
+        """The script (with the page HTML placeholder) and the steps that could not be resolved."""
+        index = get_html_index(html_content)
+        steps = test_case.get('test_steps', [])
+        if isinstance(steps, str):
+            steps = steps.split(';')
+        steps = [str(step).strip() for step in steps if str(step).strip()]
+        if not steps:
+            return None, []
+
+        body, unresolved, assertions = [], [], 0
+        for number, step in enumerate(steps, 1):
+            lines = self.render_step(index, step)
+            if lines is None:
+                unresolved.append(step)
+                continue
+            body.append(f"        # Step {number}: {self.comment(step)}")
+            body.extend(lines)
+            assertions += self.split_step(step)[0] in VERIFY_VERBS
+        if unresolved:
+            return None, unresolved
+
+        expected = str(test_case.get('expected_result', '')).strip()
+        if expected:
+            lines = self.render_verify(index, expected)
+            if lines and lines[0] not in body:
+                body.append(f"        # Expected result: {self.comment(expected)}")
+                body.extend(lines)
+                assertions += 1
+        if not assertions:
+            # A script that checks nothing is worse than an LLM one
+            return None, [expected or "(no verification step)"]
+
+        header = SCRIPT_HEADER.format(
+            placeholder=self.placeholder,
+            class_name=self.identifier(test_case.get('feature', '') or "Generated", title=True) or "Generated",
+            method_name=self.identifier(test_case.get('test_scenario', '') or "scenario") or "scenario",
+            test_id=self.comment(str(test_case.get('test_id', 'TC'))),
+            scenario=self.comment(str(test_case.get('test_scenario', ''))),
+            expected=self.comment(expected or "n/a")
+        )
+        return header + "\n".join(body) + "\n" + SCRIPT_FOOTER, []
+
+    @staticmethod
+    def split_step(step: str) -> Tuple[str, str]:
+        """("enter", "SAVE15 in the discount code field") from "2. Enter SAVE15 in the discount code field"."""
+        text = re.sub(r"^\s*(?:step\s*)?\d+[.):]?\s*", "", step, flags=re.I)
+        verb, _, rest = text.partition(" ")
+        return verb.lower().strip(",.:"), rest
+
+    def render_step(self, index: HTMLIndex, step: str) -> Optional[List[str]]:
+        verb, rest = self.split_step(step)
+        if verb in NAVIGATE_VERBS or verb in WAIT_VERBS:
+            # setUp already loaded the page under test
+            return ["        self.wait.until(lambda driver: driver.execute_script(\"return document.readyState\") == \"complete\")"]
+        if verb in ENTER_VERBS:
+            return self.render_enter(index, rest, verb)
+        if verb in CLICK_VERBS:
+            return self.render_click(index, rest, verb)
+        if verb in SELECT_VERBS:
+            return self.render_select(index, rest)
+        if verb in VERIFY_VERBS:
+            return self.render_verify(index, rest)
+        if verb in CLEAR_VERBS:
+            element = self.resolve(index, words(rest), self.is_text_input)
+            if element is None:
+                return None
+            return [f"        element = self.find({self.locator(index, element)})", "        element.clear()"]
+        return None
+
+    def render_enter(self, index: HTMLIndex, rest: str, verb: str) -> Optional[List[str]]:
+        value, target = self.split_value(rest)
+        target_words = words(target)
+        if verb in ("fill", "populate") and value is None:
+            form = self.resolve(index, target_words, lambda element: element.tag == "form")
+            if form is not None:
+                return self.render_fill_form(index, form, words(rest) | set(rest.lower().split()))
+        element = self.resolve(index, target_words, self.is_text_input)
+        if element is None:
+            return None
+        if value is None:
+            value = self.field_value(element, set(rest.lower().split()))
+        return [
+            f"        element = self.find({self.locator(index, element)})",
+            "        element.clear()",
+            f"        element.send_keys({json.dumps(value)})"
+        ]
+
+    def render_fill_form(self, index: HTMLIndex, form: HTMLElement, step_words) -> Optional[List[str]]:
+        lines = []
+        for member in index.forms.get(form.index, []):
+            element = index.elements[member]
+            if not self.is_text_input(element):
+                continue
+            locator = self.locator(index, element)
+            if locator is None:
+                return None
+            lines += [f"        element = self.find({locator})", "        element.clear()",
+                      f"        element.send_keys({json.dumps(self.field_value(element, step_words))})"]
+        return lines or None
+
+    def render_click(self, index: HTMLIndex, rest: str, verb: str) -> Optional[List[str]]:
+        target_words = words(rest)
+        element = self.resolve(index, target_words, self.is_clickable)
+        if element is None and verb == "submit":
+            element = self.submit_button(index)
+        if element is None:
+            return None
+        return [f"        self.find({self.locator(index, element)}, clickable=True).click()"]
+
+    def render_select(self, index: HTMLIndex, rest: str) -> Optional[List[str]]:
+        value, target = self.split_value(rest)
+        target_words = words(target) | words(value or "")
+        element = self.resolve(index, target_words, self.is_choice)
+        if element is None:
+            return None
+        locator = self.locator(index, element)
+        if element.tag != "select":
+            return [f"        option = self.find({locator}, clickable=True)",
+                    "        if not option.is_selected():",
+                    "            option.click()",
+                    "        self.assertTrue(option.is_selected())"]
+        option = self.match_option(index, element, words(rest))
+        if option is None:
+            return None
+        return [f"        Select(self.find({locator})).select_by_visible_text({json.dumps(option)})"]
+
+    def render_verify(self, index: HTMLIndex, rest: str) -> Optional[List[str]]:
+        element = self.resolve(index, words(rest), lambda element: bool(element.id or element.name))
+        if element is None:
+            return None
+        locator = self.locator(index, element)
+        if element.tag in ("input", "textarea", "select"):
+            return [f"        element = self.find({locator})", "        self.assertTrue(element.is_displayed())"]
+        # Values are computed by the page; assert presence rather than a hardcoded number
+        return [f"        element = self.wait.until(EC.visibility_of_element_located(({locator})))",
+                "        self.assertTrue(element.text.strip() or element.get_attribute(\"value\"))"]
+
+    def resolve(self, index: HTMLIndex, step_words, accept) -> Optional[HTMLElement]:
+        """The single best-matching acceptable element; None when nothing or several tie."""
+        if not step_words:
+            return None
+        best, best_score, tied = None, 0, False
+        for element in index.elements:
+            if not accept(element):
+                continue
+            score = len(step_words & element_terms(element))
+            if score > best_score:
+                best, best_score, tied = element, score, False
+            elif score and score == best_score:
+                tied = True
+        if best is None or tied or self.locator(index, best) is None:
+            return None
+        return best
+
+    def locator(self, index: HTMLIndex, element: HTMLElement) -> Optional[str]:
+        if element.id and len(index.by_id.get(element.id, [])) == 1:
+            return f"By.ID, {json.dumps(element.id)}"
+        if element.name and len(index.by_name.get(element.name, [])) == 1:
+            return f"By.NAME, {json.dumps(element.name)}"
+        value = element.attrs.get("value")
+        if element.name and value and not CSS_STRING_UNSAFE.search(element.name + value):
+            # Radio groups share a name, the value tells the options apart
+            css = f'{element.tag}[name="{element.name}"][value="{value}"]'
+            return f"By.CSS_SELECTOR, {json.dumps(css)}"
+        for css_class in element.classes:
+            if CSS_IDENTIFIER.match(css_class) and len(index.by_class.get(css_class, [])) == 1:
+                return f"By.CSS_SELECTOR, {json.dumps(f'{element.tag}.{css_class}')}"
+        return None
+
+    def submit_button(self, index: HTMLIndex) -> Optional[HTMLElement]:
+        buttons = [index.elements[i] for i in index.by_type.get("submit", [])]
+        return buttons[0] if len(buttons) == 1 and self.locator(index, buttons[0]) else None
+
+    def match_option(self, index: HTMLIndex, select: HTMLElement, step_words) -> Optional[str]:
+        options = [index.elements[child] for child in select.children if index.elements[child].tag == "option"]
+        matches = [option.text for option in options if option.text and step_words & words(option.text)]
+        return matches[0] if len(matches) == 1 else None
+
+    def split_value(self, rest: str) -> Tuple[Optional[str], str]:
+        """Split "SAVE15 in the discount code field" into the value and the element phrase."""
+        quoted = QUOTED.search(rest)
+        if quoted:
+            return quoted.group(1), rest[:quoted.start()] + rest[quoted.end():]
+        literal = LITERAL.match(rest)
+        # A bare value must look like data (digits, @, uppercase code), not a word like "valid"
+        if literal and re.search(r"[\d@]|^[A-Z]{2,}", literal.group(1)):
+            return literal.group(1), literal.group(2)
+        return None, rest
+
+    def field_value(self, element: HTMLElement, step_words) -> str:
+        if step_words & EMPTY_WORDS:
+            return ""
+        negative = bool(step_words & NEGATIVE_WORDS)
+        terms = element_terms(element) | {element.attrs.get("type", "").lower()}
+        for field_terms, valid, invalid in FIELD_DATA:
+            if terms & field_terms:
+                return invalid if negative else valid
+        return "" if negative else "Test input"
+
+    def is_text_input(self, element: HTMLElement) -> bool:
+        if element.tag == "textarea":
+            return True
+        return element.tag == "input" and element.attrs.get("type", "").lower() in TEXT_INPUT_TYPES
+
+    def is_clickable(self, element: HTMLElement) -> bool:
+        if element.tag in ("button", "a"):
+            return True
+        return element.tag == "input" and element.attrs.get("type", "").lower() in CLICKABLE_INPUT_TYPES
+
+    def is_choice(self, element: HTMLElement) -> bool:
+        if element.tag == "select":
+            return True
+        return element.tag == "input" and element.attrs.get("type", "").lower() in ("radio", "checkbox")
+
+    @staticmethod
+    def identifier(text: str, title: bool = False) -> str:
+        parts = re.findall(r"[A-Za-z0-9]+", text)
+        if title:
+            return "".join(part[:1].upper() + part[1:] for part in parts)[:60]
+        return "_".join(part.lower() for part in parts)[:60]
+
+    @staticmethod
+    def comment(text: str) -> str:
+        return " ".join(text.split()).replace("\\", "/").replace('"""', "'''")
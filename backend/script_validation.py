@@ -0,0 +1,295 @@
+import ast
+import difflib
+import re
+from typing import Any, Dict, Generator, List, Optional, Tuple
+from html_index import HTMLElement, HTMLIndex
+
+CHECKED_STRATEGIES = {"ID", "NAME", "CSS_SELECTOR", "CLASS_NAME", "TAG_NAME"}
+CSS_COMPOUND = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*|\*)?(?P<rest>(?:[#.][\w-]+|\[[^\]]+\])*)$")
+CSS_PART = re.compile(r"#([\w-]+)|\.([\w-]+)|\[\s*([\w-]+)\s*(?:([~|^$*]?=)\s*(\"[^\"]*\"|'[^']*'|[^\]\s]*))?\s*\]")
+FRAGMENT_CONTEXT = 2  # lines kept around a failing line in the repair prompt
+
+REPAIR_TEMPLATE = """You are fixing specific lines of a generated Selenium Python test. Do not rewrite the script.
+
+{question}
+
+SELECTORS THAT EXIST ON THE PAGE:
+{context}
+
+For every fragment, return its corrected lines in exactly this format, with nothing else:
+### F1
+<corrected code for fragment F1, same indentation>
+### F2
+<corrected code for fragment F2>
+
+Keep lines that have no problem unchanged. Only use selectors listed above.
+"""
+
+
+class ScriptIssue:
+    def __init__(self, kind: str, line: int, message: str, strategy: str = None, selector: str = None,
+                 suggestion: str = None):
+        self.kind = kind  # "syntax" or "selector"
+        self.line = line
+        self.message = message
+        self.strategy = strategy
+        self.selector = selector
+        self.suggestion = suggestion  # closest existing selector of the same strategy, if any
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in vars(self).items() if value is not None}
+
+
+class ScriptValidator:
+    """Checks generated scripts locally: Python syntax, and selector literals against the page.
+
+    `By.ID`, `By.NAME`, `By.CLASS_NAME`, `By.TAG_NAME` and simple `By.CSS_SELECTOR`
+    literals are looked up in the HTML index. Selectors that can't be checked
+    statically (XPath, pseudo-classes, computed strings) are counted as unverifiable.
+    """
+
+    def validate(self, script: str, index: HTMLIndex) -> Tuple[List[ScriptIssue], Dict[str, int]]:
+        stats = {"selectors_checked": 0, "selectors_missing": 0, "selectors_unverifiable": 0}
+        try:
+            tree = ast.parse(script)
+        except SyntaxError as e:
+            return [ScriptIssue("syntax", e.lineno or 1, e.msg)], stats
+        issues = []
+        for line, strategy, selector in self.selector_literals(tree):
+            if strategy not in CHECKED_STRATEGIES or selector is None:
+                stats["selectors_unverifiable"] += 1
+                continue
+            found = self.exists(index, strategy, selector)
+            if found is None:
+                stats["selectors_unverifiable"] += 1
+                continue
+            stats["selectors_checked"] += 1
+            if not found:
+                stats["selectors_missing"] += 1
+                issues.append(ScriptIssue("selector", line, f"By.{strategy} {selector!r} matches nothing on the page",
+                                          strategy, selector, self.suggest(index, strategy, selector)))
+        return issues, stats
+
+    def repair(self, script: str, index: HTMLIndex,
+               max_attempts: int) -> Generator[Tuple[str, str], str, Tuple[str, Dict[str, Any]]]:
+        """Validate and repair a script; returns the script and a validation report.
+
+        A generator so callers pick how to reach the LLM: it yields (task, context)
+        repair prompts for REPAIR_TEMPLATE and expects the reply to be sent back.
+        Selector typos with a unique close match are fixed locally without a prompt.
+        """
+        issues, stats = self.validate(script, index)
+        report = {**stats, "syntax_ok": not any(issue.kind == "syntax" for issue in issues),
+                  "issues_found": len(issues), "local_fixes": 0, "llm_repairs": 0,
+                  "issue_kinds": {kind: sum(1 for issue in issues if issue.kind == kind) for kind in ("syntax", "selector")}}
+        attempts = 0
+        while issues:
+            candidate = self.local_fix(script, issues)
+            if candidate is not None:
+                candidate_issues, candidate_stats = self.validate(candidate, index)
+                if len(candidate_issues) < len(issues):
+                    report["local_fixes"] += 1
+                    script, issues = candidate, candidate_issues
+                    report.update(candidate_stats)
+                    continue
+            if attempts >= max_attempts:
+                break
+            attempts += 1
+            ranges = self.fragments(script, issues)
+            reply = yield self.repair_task(script, issues, ranges), self.selector_reference(index)
+            report["llm_repairs"] += 1
+            candidate = self.apply_repair(script, ranges, reply or "")
+            if candidate is None:
+                break
+            candidate_issues, candidate_stats = self.validate(candidate, index)
+            if not self.improved(issues, candidate_issues):
+                break  # keep the original rather than a repair that didn't help
+            script, issues = candidate, candidate_issues
+            report.update(candidate_stats)
+            report["syntax_ok"] = not any(issue.kind == "syntax" for issue in issues)
+        report["issues"] = [issue.to_dict() for issue in issues]
+        report["valid"] = not issues
+        return script, report
+
+    @staticmethod
+    def improved(issues: List[ScriptIssue], candidate_issues: List[ScriptIssue]) -> bool:
+        # Fixing syntax counts even if it exposes selector issues the parser hid before
+        had_syntax = any(issue.kind == "syntax" for issue in issues)
+        has_syntax = any(issue.kind == "syntax" for issue in candidate_issues)
+        if had_syntax != has_syntax:
+            return had_syntax
+        return len(candidate_issues) < len(issues)
+
+    def selector_literals(self, tree: ast.AST):
+        """(line, strategy, selector or None) for every `By.X, value` pair in a call or tuple."""
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                values = node.args
+            elif isinstance(node, ast.Tuple):
+                values = node.elts
+            else:
+                continue
+            for first, second in zip(values, values[1:]):
+                if (isinstance(first, ast.Attribute) and isinstance(first.value, ast.Name)
+                        and first.value.id == "By"):
+                    selector = second.value if isinstance(second, ast.Constant) and isinstance(second.value, str) else None
+                    yield first.lineno, first.attr, selector
+
+    def exists(self, index: HTMLIndex, strategy: str, selector: str) -> Optional[bool]:
+        if strategy == "ID":
+            return selector in index.by_id
+        if strategy == "NAME":
+            return selector in index.by_name
+        if strategy == "CLASS_NAME":
+            return selector in index.by_class
+        if strategy == "TAG_NAME":
+            return selector.lower() in index.by_tag
+        return self.css_exists(index, selector)
+
+    def css_exists(self, index: HTMLIndex, selector: str) -> Optional[bool]:
+        """Whether any element matches; None for syntax this matcher doesn't support."""
+        for alternative in selector.split(","):
+            steps = self.parse_css(alternative.strip())
+            if steps is None:
+                return None
+            if any(self.matches_path(index, element, steps) for element in index.elements):
+                return True
+        return False
+
+    def parse_css(self, selector: str) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
+        # Pseudo-classes and sibling combinators are left to the browser
+        if not selector or any(char in selector for char in ":+~"):
+            return None
+        steps, combinator = [], " "
+        for token in re.sub(r"\s*>\s*", " > ", selector).split():
+            if token == ">":
+                combinator = ">"
+                continue
+            parsed = self.parse_compound(token)
+            if parsed is None:
+                return None
+            # The combinator links this compound to the previous one
+            steps.append((combinator, parsed))
+            combinator = " "
+        return steps or None
+
+    def parse_compound(self, compound: str) -> Optional[Dict[str, Any]]:
+        match = CSS_COMPOUND.match(compound)
+        if not match or not compound:
+            return None
+        parsed = {"tag": (match.group("tag") or "*").lower(), "ids": [], "classes": [], "attrs": []}
+        for element_id, css_class, attr, operator, value in CSS_PART.findall(match.group("rest")):
+            if element_id:
+                parsed["ids"].append(element_id)
+            elif css_class:
+                parsed["classes"].append(css_class)
+            else:
+                parsed["attrs"].append((attr.lower(), operator, value.strip("\"'")))
+        return parsed
+
+    def matches_path(self, index: HTMLIndex, element: HTMLElement, steps) -> bool:
+        if not self.matches(element, steps[-1][1]):
+            return False
+        if len(steps) == 1:
+            return True
+        combinator = steps[-1][0]
+        parent = element.parent
+        while parent is not None:
+            if self.matches_path(index, index.elements[parent], steps[:-1]):
+                return True
+            if combinator == ">":
+                return False
+            parent = index.elements[parent].parent
+        return False
+
+    def matches(self, element: HTMLElement, compound: Dict[str, Any]) -> bool:
+        if compound["tag"] != "*" and element.tag != compound["tag"]:
+            return False
+        if any(element.id != element_id for element_id in compound["ids"]):
+            return False
+        if any(css_class not in element.classes for css_class in compound["classes"]):
+            return False
+        for attr, operator, value in compound["attrs"]:
+            actual = element.attrs.get(attr)
+            if actual is None:
+                return False
+            if operator == "=" and actual != value:
+                return False
+            if operator == "^=" and not actual.startswith(value):
+                return False
+            if operator == "$=" and not actual.endswith(value):
+                return False
+            if operator == "*=" and value not in actual:
+                return False
+            if operator == "~=" and value not in actual.split():
+                return False
+            if operator == "|=" and actual != value and not actual.startswith(value + "-"):
+                return False
+        return True
+
+    def suggest(self, index: HTMLIndex, strategy: str, selector: str) -> Optional[str]:
+        candidates = {"ID": index.by_id, "NAME": index.by_name, "CLASS_NAME": index.by_class}.get(strategy)
+        if candidates is None:
+            # For CSS, suggest by the id or class the selector was most likely aiming for
+            match = re.search(r"#([\w-]+)", selector)
+            if not match:
+                return None
+            close = difflib.get_close_matches(match.group(1), list(index.by_id), n=1, cutoff=0.6)
+            return selector.replace(match.group(0), f"#{close[0]}") if close else None
+        close = difflib.get_close_matches(selector, list(candidates), n=1, cutoff=0.6)
+        return close[0] if close else None
+
+    def local_fix(self, script: str, issues: List[ScriptIssue]) -> Optional[str]:
+        """Swap missing selectors for their close match; None when no issue has one."""
+        fixable = [issue for issue in issues if issue.kind == "selector" and issue.suggestion]
+        if not fixable:
+            return None
+        lines = script.splitlines()
+        for issue in fixable:
+            line = lines[issue.line - 1]
+            for quote in ('"', "'"):
+                line = line.replace(f"{quote}{issue.selector}{quote}", f"{quote}{issue.suggestion}{quote}")
+            lines[issue.line - 1] = line
+        return "\n".join(lines)
+
+    def fragments(self, script: str, issues: List[ScriptIssue]) -> List[Tuple[int, int]]:
+        """Merged 1-based inclusive line ranges around the failing lines."""
+        total = len(script.splitlines())
+        ranges = []
+        for line in sorted(issue.line for issue in issues):
+            start, end = max(1, line - FRAGMENT_CONTEXT), min(total, line + FRAGMENT_CONTEXT)
+            if ranges and start <= ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+            else:
+                ranges.append((start, end))
+        return ranges
+
+    def repair_task(self, script: str, issues: List[ScriptIssue], ranges: List[Tuple[int, int]]) -> str:
+        lines = script.splitlines()
+        parts = []
+        for number, (start, end) in enumerate(ranges, 1):
+            problems = [f"  - line {issue.line}: {issue.message}"
+                        + (f" (did you mean {issue.suggestion!r}?)" if issue.suggestion else "")
+                        for issue in sorted(issues, key=lambda issue: issue.line) if start <= issue.line <= end]
+            code = "\n".join(lines[start - 1:end])
+            parts.append(f"FRAGMENT F{number} (lines {start}-{end}):\nPROBLEMS:\n" + "\n".join(problems)
+                         + f"\nCODE:\n{code}")
+        return "\n\n".join(parts)
+
+    def selector_reference(self, index: HTMLIndex, limit: int = 200) -> str:
+        ids = list(index.by_id)[:limit]
+        names = list(index.by_name)[:limit]
+        return f"IDs: {', '.join(ids) or '(none)'}\nNAMEs: {', '.join(names) or '(none)'}"
+
+    def apply_repair(self, script: str, ranges: List[Tuple[int, int]], response: str) -> Optional[str]:
+        """Splice the LLM's corrected fragments into the script; None if the reply doesn't fit the format."""
+        response = re.sub(r"```(?:python)?", "", response)
+        blocks = dict(re.findall(r"^###\s*F(\d+)\s*\n(.*?)(?=^###\s*F\d+\s*$|\Z)", response, re.M | re.S))
+        if set(blocks) != {str(number) for number in range(1, len(ranges) + 1)}:
+            return None
+        lines = script.splitlines()
+        # Bottom-up, so earlier line numbers stay valid
+        for number in range(len(ranges), 0, -1):
+            start, end = ranges[number - 1]
+            lines[start - 1:end] = blocks[str(number)].rstrip("\n").splitlines()
+        return "\n".join(lines)
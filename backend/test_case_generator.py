@@ -1,19 +1,14 @@
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional
+import asyncio
+import os
 from rag_system import RAGSystem
+from context_assembly import AssembledContext
+from test_case_store import TestCaseStore
+from metrics import span
 
-class TestCaseGenerator:
-    def __init__(self, rag_system: RAGSystem):
-        self.rag_system = rag_system
-
-    def generate_test_cases(self, query: str) -> List[Dict[str, Any]]:
-        context = self.rag_system.query_knowledge_base(query)
-        if not context or context.strip() == "":
-            print("⚠️ WARNING: No documents found in knowledge base!")
-            return self.create_fallback_test_cases(query, "")
-        
-        prompt = f"""You are a QA expert. Generate comprehensive test cases based on the user query and user uploaded documents.
+TEST_CASE_TEMPLATE = """You are a QA expert. Generate comprehensive test cases based on the user query and user uploaded documents.
 
-User Query: {query}
+User Query: {question}
 
 Documentation Context:
 {context}
@@ -43,49 +38,156 @@ Output Format Example:
 | TC-001 | Login | Valid Login | Open app; Enter user; Click login | Dashboard loads | Positive | auth.md |
 """
 
-        response = self.rag_system.llm.invoke(prompt).content
-        test_cases = self.parse_markdown_response(response)
+class MarkdownTableStreamParser:
+    """Incremental parser for the test-case table: feed text as it arrives, get rows as they complete."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.header_seen = False
+        self.cases: List[Dict[str, Any]] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self.buffer += text
+        completed = []
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            test_case = self.parse_line(line)
+            if test_case:
+                completed.append(test_case)
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        line, self.buffer = self.buffer, ""
+        test_case = self.parse_line(line)
+        return [test_case] if test_case else []
+
+    def parse_line(self, line: str) -> Optional[Dict[str, Any]]:
+        stripped = line.strip()
+        if not self.header_seen:
+            # Rows start after the |---|---| separator line
+            if stripped and set(stripped) <= {'|', '-', ' ', ':'}:
+                self.header_seen = True
+            return None
+        if '|' not in line:
+            return None
+        cells = [cell.strip() for cell in stripped.strip('|').split('|')]
+        if len(cells) < 7:
+            return None
+        raw_steps = cells[3]
+        steps_list = [step.strip() for step in raw_steps.split(';') if step.strip()]
+
+        test_case = {
+            "test_id": cells[0],
+            "feature": cells[1],
+            "test_scenario": cells[2],
+            "test_steps": steps_list, # Converted to list for UI
+            "expected_result": cells[4],
+            "test_type": cells[5],
+            "grounded_in": cells[6]
+        }
+        self.cases.append(test_case)
+        return test_case
+
+
+class TestCaseGenerator:
+    def __init__(self, rag_system: RAGSystem, store: Optional[TestCaseStore] = None):
+        self.rag_system = rag_system
+        self.store = store
+
+    def generate_test_cases(self, query: str) -> List[Dict[str, Any]]:
+        retrieved = self.rag_system.retrieve_context(query)
+        context = retrieved.text
+        if not context or context.strip() == "":
+            print("⚠️ WARNING: No documents found in knowledge base!")
+            return self.create_fallback_test_cases(query, "")
+        response = self.rag_system.generate_with_context(query, context, TEST_CASE_TEMPLATE)
+        return self.process_response(response, query, context, retrieved)
+
+    async def agenerate_test_cases(self, query: str) -> List[Dict[str, Any]]:
+        retrieved = await self.rag_system.aretrieve_context(query)
+        context = retrieved.text
+        if not context or context.strip() == "":
+            print("⚠️ WARNING: No documents found in knowledge base!")
+            return self.create_fallback_test_cases(query, "")
+        response = await self.rag_system.agenerate_with_context(query, context, TEST_CASE_TEMPLATE)
+        # Storing embeds the new cases, keep that off the event loop
+        return await asyncio.to_thread(self.process_response, response, query, context, retrieved)
+
+    async def astream_test_cases(self, query: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield each test case as soon as its table row has been streamed by the LLM."""
+        retrieved = await self.rag_system.aretrieve_context(query)
+        context = retrieved.text
+        if not context or context.strip() == "":
+            print("⚠️ WARNING: No documents found in knowledge base!")
+            for test_case in self.create_fallback_test_cases(query, ""):
+                yield test_case
+            return
+        parser = MarkdownTableStreamParser()
+        seen = set()
+
+        async def stored(rows: List[Dict[str, Any]]):
+            if not rows:
+                return
+            # Rows merged into a case already sent in this stream are not sent twice
+            for test_case in await asyncio.to_thread(self.remember, [self.ground(row, retrieved) for row in rows], query):
+                if test_case["test_id"] not in seen:
+                    seen.add(test_case["test_id"])
+                    yield test_case
+
+        async for text in self.rag_system.astream_with_context(query, context, TEST_CASE_TEMPLATE):
+            async for test_case in stored(parser.feed(text)):
+                yield test_case
+        async for test_case in stored(parser.finish()):
+            yield test_case
+        if parser.cases:
+            print(f"✅ Successfully streamed {len(parser.cases)} test cases from documents")
+        else:
+            print("⚠️ Parsing failed or no cases generated. Using fallback.")
+            for test_case in self.create_fallback_test_cases(query, context):
+                yield test_case
+
+    def ground(self, test_case: Dict[str, Any], retrieved: AssembledContext) -> Dict[str, Any]:
+        """Point grounded_in at a source that was actually in the prompt context.
+
+        The model sometimes cites a path, a heading or a file that was trimmed from
+        the context; those are mapped to the matching or most relevant source.
+        """
+        names = retrieved.source_names
+        if not names:
+            return test_case
+        cited = str(test_case.get("grounded_in", "")).strip()
+        matches = [name for name in names
+                   if name.lower() in cited.lower() or os.path.splitext(name)[0].lower() in cited.lower()]
+        test_case["grounded_in"] = ", ".join(matches) if matches else names[0]
+        return test_case
+
+    def remember(self, test_cases: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        """Add parsed cases to the workspace store; returns the new and merged ones under stable IDs."""
+        if self.store is None or not test_cases:
+            return test_cases
+        return self.store.add(test_cases, self.rag_system.embedding, query)
+
+    def process_response(self, response: str, query: str, context: str,
+                         retrieved: Optional[AssembledContext] = None) -> List[Dict[str, Any]]:
+        with span("parse"):
+            test_cases = self.parse_markdown_response(response)
+            if test_cases and retrieved is not None:
+                test_cases = [self.ground(test_case, retrieved) for test_case in test_cases]
         if test_cases:
             print(f"✅ Successfully generated {len(test_cases)} test cases from documents")
-            return test_cases
+            return self.remember(test_cases, query)
         else:
             print("⚠️ Parsing failed or no cases generated. Using fallback.")
             return self.create_fallback_test_cases(query, context)
 
     def parse_markdown_response(self, response: str) -> List[Dict[str, Any]]:
         #Parse table into dictionaries
-        cases = []
+        parser = MarkdownTableStreamParser()
         try:
-            lines = response.strip().split('\n')
-            header_index = -1
-            for i, line in enumerate(lines):
-                if set(line.strip()) <= {'|', '-', ' ', ':'}:
-                    header_index = i
-                    break
-            if header_index == -1: 
-                return []
-            for line in lines[header_index + 1:]:
-                if '|' not in line:
-                    continue
-                cells = [cell.strip() for cell in line.strip('|').split('|')]  
-                if len(cells) < 7: 
-                    continue
-                raw_steps = cells[3]
-                steps_list = [step.strip() for step in raw_steps.split(';') if step.strip()]
-                
-                test_case = {
-                    "test_id": cells[0],
-                    "feature": cells[1],
-                    "test_scenario": cells[2],
-                    "test_steps": steps_list, # Converted to list for UI
-                    "expected_result": cells[4],
-                    "test_type": cells[5],
-                    "grounded_in": cells[6]
-                }
-                cases.append(test_case)
+            return parser.feed(response.strip()) + parser.finish()
         except Exception as e:
             print(f"❌ Markdown parsing error: {str(e)}")
-        return cases
+            return parser.cases
 
     def create_fallback_test_cases(self, query: str, context: str) -> List[Dict[str, Any]]:
         return [
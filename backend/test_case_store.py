@@ -0,0 +1,343 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from metrics import TEST_CASES, span
+
+SEARCH_BLOCK_ROWS = 16384
+MAX_QUERIES_PER_CASE = 20
+TYPE_CODES = {"positive": 1, "negative": 2}
+
+
+def case_text(test_case: Dict[str, Any]) -> str:
+    """What near-duplicate detection compares: the scenario and its steps."""
+    steps = test_case.get("test_steps") or []
+    if isinstance(steps, str):
+        steps = [steps]
+    return f"{test_case.get('test_scenario', '')}\n" + "; ".join(str(step) for step in steps)
+
+
+def feature_label(feature: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", (feature or "").lower())) or "general"
+
+
+class TestCaseStore:
+    """Persistent, de-duplicated test cases of one workspace, grouped into feature clusters.
+
+    Every case is embedded (scenario + steps) and compared against all stored cases
+    of the same test type with one blocked matrix product; a case at or above
+    `threshold` cosine similarity is merged into the stored one instead of getting a
+    new row. Stored cases keep a stable `TC-00001`-style ID, so scripts generated for
+    them stay valid across runs. Features are clustered the same way on their
+    labels, with `cluster_threshold`.
+
+    Rows live in SQLite; the float16 vector matrix is loaded on first use and kept
+    in memory (tens of thousands of cases are a few tens of MB).
+    """
+
+    def __init__(self, path: str, model_name: str, threshold: float = 0.92, cluster_threshold: float = 0.85):
+        self.path = path
+        self.model_name = model_name
+        self.threshold = threshold
+        self.cluster_threshold = cluster_threshold
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._ids: List[str] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float16)
+        self._types = np.zeros(0, dtype=np.int8)
+        self._size = 0
+        self._cluster_ids: List[int] = []
+        self._cluster_vectors = np.zeros((0, 0), dtype=np.float32)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS test_cases ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE, cluster INTEGER NOT NULL, "
+            "test_type INTEGER NOT NULL, data TEXT NOT NULL, vector BLOB, model TEXT, "
+            "occurrences INTEGER NOT NULL, created_at REAL NOT NULL, last_seen REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clusters ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, label TEXT NOT NULL, vector BLOB, model TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_test_cases_cluster ON test_cases(cluster)")
+        self._conn.commit()
+
+    # --- in-memory matrix ---------------------------------------------------
+
+    def _ensure_loaded(self, embeddings: Embeddings):
+        """Load stored vectors, re-embedding rows written with another embedding model first."""
+        if self._loaded:
+            return
+        self._reembed(embeddings)
+        rows = self._conn.execute(
+            "SELECT id, test_type, vector FROM test_cases WHERE model = ? ORDER BY seq", (self.model_name,)
+        ).fetchall()
+        self._ids = [row[0] for row in rows]
+        self._types = np.array([row[1] for row in rows], dtype=np.int8)
+        self._size = len(rows)
+        if rows:
+            self._vectors = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float16) \
+                .reshape(len(rows), -1).copy()
+        clusters = self._conn.execute(
+            "SELECT id, vector FROM clusters WHERE model = ? ORDER BY id", (self.model_name,)
+        ).fetchall()
+        self._cluster_ids = [row[0] for row in clusters]
+        if clusters:
+            self._cluster_vectors = np.frombuffer(b"".join(row[1] for row in clusters), dtype=np.float32) \
+                .reshape(len(clusters), -1).copy()
+        self._loaded = True
+
+    def _stale(self) -> bool:
+        return self._conn.execute(
+            "SELECT EXISTS(SELECT 1 FROM test_cases WHERE model IS NOT ?) "
+            "OR EXISTS(SELECT 1 FROM clusters WHERE model IS NOT ?)", (self.model_name, self.model_name)
+        ).fetchone()[0] == 1
+
+    def _reembed(self, embeddings: Embeddings, batch_size: int = 256):
+        if not self._stale():
+            return
+        print(f"⚠️ Re-embedding stored test cases for {self.model_name}")
+        while True:
+            rows = self._conn.execute(
+                "SELECT seq, data FROM test_cases WHERE model IS NOT ? LIMIT ?", (self.model_name, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            vectors = self._normalize(embeddings.embed_documents([case_text(json.loads(data)) for _, data in rows]))
+            self._conn.executemany(
+                "UPDATE test_cases SET vector = ?, model = ? WHERE seq = ?",
+                [(vector.astype(np.float16).tobytes(), self.model_name, seq) for (seq, _), vector in zip(rows, vectors)]
+            )
+        clusters = self._conn.execute("SELECT id, label FROM clusters WHERE model IS NOT ?", (self.model_name,)).fetchall()
+        if clusters:
+            vectors = self._normalize(embeddings.embed_documents([label for _, label in clusters]))
+            self._conn.executemany(
+                "UPDATE clusters SET vector = ?, model = ? WHERE id = ?",
+                [(vector.tobytes(), self.model_name, cluster_id) for (cluster_id, _), vector in zip(clusters, vectors)]
+            )
+        self._conn.commit()
+
+    def _append(self, case_ids: List[str], vectors: np.ndarray, types: np.ndarray):
+        needed = self._size + len(case_ids)
+        if needed > len(self._vectors) or self._vectors.shape[1] != vectors.shape[1]:
+            # Grow geometrically so appends stay amortized O(1)
+            grown = np.zeros((max(needed, 2 * len(self._vectors), 1024), vectors.shape[1]), dtype=np.float16)
+            types_grown = np.zeros(len(grown), dtype=np.int8)
+            if self._size:
+                grown[:self._size] = self._vectors[:self._size]
+                types_grown[:self._size] = self._types[:self._size]
+            self._vectors, self._types = grown, types_grown
+        self._vectors[self._size:needed] = vectors
+        self._types[self._size:needed] = types
+        self._ids.extend(case_ids)
+        self._size = needed
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _best_matches(self, vectors: np.ndarray, types: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Most similar stored case of the same type per query vector: (rows, scores); row -1 if none."""
+        best_rows = np.full(len(vectors), -1, dtype=np.int64)
+        best_scores = np.full(len(vectors), -1.0, dtype=np.float32)
+        for start in range(0, self._size, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self._size)
+            scores = self._vectors[start:stop].astype(np.float32) @ vectors.T
+            scores[self._types[start:stop, None] != types[None, :]] = -1.0
+            rows = scores.argmax(axis=0)
+            block_best = scores[rows, np.arange(len(vectors))]
+            better = block_best > best_scores
+            best_rows[better] = rows[better] + start
+            best_scores[better] = block_best[better]
+        return best_rows, best_scores
+
+    # --- clusters -----------------------------------------------------------
+
+    def _assign_clusters(self, features: List[str], embeddings: Embeddings) -> List[int]:
+        labels = [feature_label(feature) for feature in features]
+        unique = list(dict.fromkeys(labels))
+        vectors = self._normalize(embeddings.embed_documents(unique))
+        assigned: Dict[str, int] = {}
+        for label, vector in zip(unique, vectors):
+            if self._cluster_ids:
+                scores = self._cluster_vectors @ vector
+                best = int(scores.argmax())
+                if scores[best] >= self.cluster_threshold:
+                    assigned[label] = self._cluster_ids[best]
+                    continue
+            cursor = self._conn.execute(
+                "INSERT INTO clusters (label, vector, model) VALUES (?, ?, ?)",
+                (label, vector.tobytes(), self.model_name)
+            )
+            self._cluster_ids.append(cursor.lastrowid)
+            self._cluster_vectors = np.vstack([self._cluster_vectors.reshape(-1, len(vector)), vector[None, :]])
+            assigned[label] = cursor.lastrowid
+        return [assigned[label] for label in labels]
+
+    # --- public API ---------------------------------------------------------
+
+    def add(self, test_cases: List[Dict[str, Any]], embeddings: Embeddings, query: str = "") -> List[Dict[str, Any]]:
+        """Store generated cases; returns each new or merged case once, under its stable ID.
+
+        Returned cases carry `status` ("new" or "merged"), and merged ones the
+        `similarity` to the stored case they matched and its `occurrences`.
+        """
+        if not test_cases:
+            return []
+        with span("dedup"):
+            vectors = self._normalize(embeddings.embed_documents([case_text(case) for case in test_cases]))
+            types = np.array([TYPE_CODES.get(str(case.get("test_type", "")).strip().lower(), 0)
+                              for case in test_cases], dtype=np.int8)
+            with self._lock:
+                return self._add(test_cases, vectors, types, embeddings, query)
+
+    def _add(self, test_cases: List[Dict[str, Any]], vectors: np.ndarray, types: np.ndarray,
+             embeddings: Embeddings, query: str) -> List[Dict[str, Any]]:
+        self._ensure_loaded(embeddings)
+        best_rows, best_scores = self._best_matches(vectors, types)
+        within = vectors @ vectors.T  # duplicates inside this batch
+        now = time.time()
+        within[types[:, None] != types[None, :]] = -1.0
+        is_fresh = np.zeros(len(test_cases), dtype=bool)
+        fresh: List[int] = []  # batch positions that become new rows
+        target: Dict[int, Tuple[str, float]] = {}  # batch position -> (existing id or "#position", score)
+        for position in range(len(test_cases)):
+            # Earlier cases of this batch that became new rows compete with the stored ones
+            batch_scores = np.where(is_fresh, within[position], -1.0)
+            batch_best = int(batch_scores.argmax())
+            if best_scores[position] >= self.threshold and best_scores[position] >= batch_scores[batch_best]:
+                target[position] = (self._ids[best_rows[position]], float(best_scores[position]))
+            elif batch_scores[batch_best] >= self.threshold:
+                target[position] = (f"#{batch_best}", float(batch_scores[batch_best]))
+            else:
+                is_fresh[position] = True
+                fresh.append(position)
+
+        clusters = self._assign_clusters([test_cases[position].get("feature", "") for position in fresh], embeddings) \
+            if fresh else []
+        new_ids: Dict[int, str] = {}
+        for position, cluster in zip(fresh, clusters):
+            test_case = {key: value for key, value in test_cases[position].items()
+                         if key not in ("test_id", "status", "similarity", "occurrences")}
+            test_case["queries"] = [query] if query else []
+            cursor = self._conn.execute(
+                "INSERT INTO test_cases (cluster, test_type, data, vector, model, occurrences, created_at, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                (cluster, int(types[position]), json.dumps(test_case),
+                 vectors[position].astype(np.float16).tobytes(), self.model_name, now, now)
+            )
+            new_ids[position] = f"TC-{cursor.lastrowid:05d}"
+            self._conn.execute("UPDATE test_cases SET id = ? WHERE seq = ?", (new_ids[position], cursor.lastrowid))
+        if fresh:
+            self._append([new_ids[position] for position in fresh], vectors[fresh], types[fresh])
+
+        merged: Dict[str, float] = {}
+        for position, (case_id, score) in target.items():
+            if case_id.startswith("#"):
+                case_id = new_ids[int(case_id[1:])]
+            merged[case_id] = max(score, merged.get(case_id, 0.0))
+            self._merge(case_id, test_cases[position], query, now)
+        self._conn.commit()
+
+        results: List[Dict[str, Any]] = []
+        for case_id in list(new_ids.values()) + [case_id for case_id in merged if case_id not in new_ids.values()]:
+            stored = self._get(case_id)
+            if case_id in merged and case_id not in new_ids.values():
+                stored.update(status="merged", similarity=round(min(merged[case_id], 1.0), 4))
+            else:
+                stored["status"] = "new"
+            results.append(stored)
+        TEST_CASES.labels(outcome="new").inc(len(fresh))
+        TEST_CASES.labels(outcome="merged").inc(len(target))
+        if target:
+            print(f"✓ Test case store: {len(fresh)} new, {len(target)} merged into existing cases")
+        return results
+
+    def _merge(self, case_id: str, test_case: Dict[str, Any], query: str, now: float):
+        data, = self._conn.execute("SELECT data FROM test_cases WHERE id = ?", (case_id,)).fetchone()
+        stored = json.loads(data)
+        sources = [name.strip() for name in f"{stored.get('grounded_in', '')},{test_case.get('grounded_in', '')}".split(",")]
+        stored["grounded_in"] = ", ".join(dict.fromkeys(name for name in sources if name))
+        if query and query not in stored.get("queries", []):
+            stored["queries"] = (stored.get("queries", []) + [query])[-MAX_QUERIES_PER_CASE:]
+        self._conn.execute(
+            "UPDATE test_cases SET data = ?, occurrences = occurrences + 1, last_seen = ? WHERE id = ?",
+            (json.dumps(stored), now, case_id)
+        )
+
+    def _case(self, row) -> Dict[str, Any]:
+        case_id, cluster, data, occurrences = row
+        test_case = json.loads(data)
+        test_case.update(test_id=case_id, cluster=cluster, occurrences=occurrences)
+        return test_case
+
+    def _get(self, case_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT id, cluster, data, occurrences FROM test_cases WHERE id = ?", (case_id,)
+        ).fetchone()
+        return self._case(row) if row else None
+
+    def get(self, case_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(case_id)
+
+    def list_cases(self, cluster: Optional[int] = None, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            if cluster is None:
+                rows = self._conn.execute(
+                    "SELECT id, cluster, data, occurrences FROM test_cases ORDER BY seq LIMIT ? OFFSET ?",
+                    (limit, offset)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, cluster, data, occurrences FROM test_cases WHERE cluster = ? ORDER BY seq LIMIT ? OFFSET ?",
+                    (cluster, limit, offset)
+                ).fetchall()
+        return [self._case(row) for row in rows]
+
+    def clusters(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT clusters.id, clusters.label, COUNT(test_cases.seq), COALESCE(SUM(test_cases.occurrences), 0) "
+                "FROM clusters LEFT JOIN test_cases ON test_cases.cluster = clusters.id "
+                "GROUP BY clusters.id ORDER BY COUNT(test_cases.seq) DESC, clusters.id"
+            ).fetchall()
+        return [{"cluster": cluster_id, "feature": label, "test_cases": count, "occurrences": occurrences}
+                for cluster_id, label, count, occurrences in rows if count]
+
+    def release(self):
+        """Drop the in-memory matrix; it is reloaded from SQLite on the next add."""
+        with self._lock:
+            self._loaded = False
+            self._ids, self._size = [], 0
+            self._vectors = np.zeros((0, 0), dtype=np.float16)
+            self._types = np.zeros(0, dtype=np.int8)
+            self._cluster_ids = []
+            self._cluster_vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def memory_bytes(self) -> int:
+        return self._vectors.nbytes + self._cluster_vectors.nbytes + 64 * len(self._ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cases, occurrences = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(occurrences), 0) FROM test_cases"
+            ).fetchone()
+            clusters = self._conn.execute("SELECT COUNT(*) FROM clusters").fetchone()[0]
+        return {
+            "test_cases": cases,
+            "generated": occurrences,
+            "merged": occurrences - cases,
+            "clusters": clusters,
+            "threshold": self.threshold
+        }
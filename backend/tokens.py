@@ -0,0 +1,8 @@
+import math
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/code), no tokenizer needed."""
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
@@ -0,0 +1,299 @@
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+SEARCH_BLOCK_ROWS = 16384
+COPY_BLOCK_ROWS = 16384
+
+
+class QuantizedVectorStore(VectorStore):
+    """In-process vector index over a memory-mapped float16/int8 matrix.
+
+    Vectors are L2-normalized on insert, so a query is one matrix product against
+    the stored rows (cosine similarity). int8 rows carry a per-row scale. Each
+    upserted batch is quantized and appended to a staging file straight away, so
+    a build holds one batch of float32 vectors at a time. `flush()` merges the
+    staged rows into the collection's files atomically, copying block by block;
+    reads flush implicitly.
+
+    Files per collection: vectors.npy, scales.npy (int8 only) and records.json
+    (ids, texts and metadata in row order), plus staged.bin / staged_scales.bin
+    between an upsert and the next flush.
+    """
+
+    def __init__(self, collection_name: str, embedding_function: Embeddings,
+                 persist_directory: str, dtype: str = "float16"):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        self.collection_name = collection_name
+        self.embedding_function = embedding_function
+        self.directory = os.path.join(persist_directory, collection_name)
+        self.dtype = dtype
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._rows: Dict[str, int] = {}
+        # chunk id -> (row in the staging file, text, metadata)
+        self._pending: Dict[str, Tuple[int, str, Dict[str, Any]]] = {}
+        self._staged_rows = 0
+        self._dim: Optional[int] = None
+        self._deleted: set = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    # --- persistence -------------------------------------------------------
+
+    def _load(self):
+        # Staged rows never reached records.json, so a leftover staging file is garbage
+        self._discard_staged()
+        records_path = os.path.join(self.directory, "records.json")
+        if not os.path.exists(records_path):
+            return
+        with open(records_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        if records.get("dtype", self.dtype) != self.dtype:
+            raise ValueError(f"Collection {self.collection_name} is stored as {records['dtype']}, not {self.dtype}")
+        self._ids = records["ids"]
+        self._texts = records["texts"]
+        self._metadatas = records["metadatas"]
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        if self._ids:
+            self._vectors = np.load(os.path.join(self.directory, "vectors.npy"), mmap_mode="r")
+            self._dim = self._vectors.shape[1]
+            if self.dtype == "int8":
+                self._scales = np.load(os.path.join(self.directory, "scales.npy"))
+
+    def flush(self):
+        """Merge staged upserts/deletes into the on-disk matrix."""
+        if not self._pending and not self._deleted:
+            return
+        with self._lock:
+            if self._pending or self._deleted:
+                self._flush()
+
+    def _flush(self):
+        keep = [row for row, chunk_id in enumerate(self._ids)
+                if chunk_id not in self._deleted and chunk_id not in self._pending]
+        pending = list(self._pending.items())
+        staged_rows = [row for _, (row, _, _) in pending]
+        ids = [self._ids[row] for row in keep] + [chunk_id for chunk_id, _ in pending]
+        texts = [self._texts[row] for row in keep] + [text for _, (_, text, _) in pending]
+        metadatas = [self._metadatas[row] for row in keep] + [metadata for _, (_, _, metadata) in pending]
+
+        os.makedirs(self.directory, exist_ok=True)
+        if ids:
+            staged = self._staged_matrix()
+            tmp_path = os.path.join(self.directory, "vectors.npy.tmp")
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self._row_dtype(), shape=(len(ids), self._dim))
+            # Block copies keep the working set to COPY_BLOCK_ROWS rows, however large the collection
+            for source, rows, offset in ((self._vectors, keep, 0), (staged, staged_rows, len(keep))):
+                for start in range(0, len(rows), COPY_BLOCK_ROWS):
+                    block = rows[start:start + COPY_BLOCK_ROWS]
+                    out[offset + start:offset + start + len(block)] = source[block]
+            out.flush()
+            del out
+            if self.dtype == "int8":
+                staged_scales = self._staged_scales()
+                scales = np.concatenate([self._scales[keep] if keep else np.empty(0, np.float32),
+                                         staged_scales[staged_rows] if pending else np.empty(0, np.float32)])
+                del staged_scales
+            del staged
+            # Drop the old map before replacing the file underneath it
+            self._vectors = None
+            os.replace(tmp_path, os.path.join(self.directory, "vectors.npy"))
+            if self.dtype == "int8":
+                self._write_array("scales.npy", scales)
+        tmp_path = os.path.join(self.directory, "records.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dtype": self.dtype, "ids": ids, "texts": texts, "metadatas": metadatas}, f)
+        os.replace(tmp_path, os.path.join(self.directory, "records.json"))
+
+        self._pending = {}
+        self._deleted = set()
+        self._vectors = self._scales = None
+        self._load()
+
+    def _write_array(self, name: str, array: np.ndarray):
+        tmp_path = os.path.join(self.directory, name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, os.path.join(self.directory, name))
+
+    # --- staging -------------------------------------------------------------
+
+    def _row_dtype(self):
+        return np.float16 if self.dtype == "float16" else np.int8
+
+    def _stage(self, vectors: np.ndarray) -> int:
+        """Append quantized rows to the staging file; returns the first new row. Caller holds the lock."""
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        elif vectors.shape[1] != self._dim:
+            raise ValueError(f"Collection {self.collection_name} holds {self._dim}-d vectors, got {vectors.shape[1]}-d")
+        rows, scales = self._quantize(vectors)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "staged.bin"), "ab") as f:
+            f.write(rows.tobytes())
+        if scales is not None:
+            with open(os.path.join(self.directory, "staged_scales.bin"), "ab") as f:
+                f.write(scales.tobytes())
+        first = self._staged_rows
+        self._staged_rows += len(rows)
+        return first
+
+    def _staged_matrix(self) -> np.ndarray:
+        if not self._staged_rows:
+            return np.empty((0, self._dim or 0), dtype=self._row_dtype())
+        return np.memmap(os.path.join(self.directory, "staged.bin"), dtype=self._row_dtype(), mode="r",
+                         shape=(self._staged_rows, self._dim))
+
+    def _staged_scales(self) -> np.ndarray:
+        return np.fromfile(os.path.join(self.directory, "staged_scales.bin"), dtype=np.float32)
+
+    def _discard_staged(self):
+        for name in ("staged.bin", "staged_scales.bin"):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+        self._staged_rows = 0
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _dequantize(self, rows: List[int]) -> np.ndarray:
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self.dtype == "int8":
+            vectors *= self._scales[rows][:, None]
+        return vectors
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    @staticmethod
+    def list_collections(persist_directory: str) -> List[str]:
+        if not os.path.isdir(persist_directory):
+            return []
+        return sorted(name for name in os.listdir(persist_directory)
+                      if os.path.isdir(os.path.join(persist_directory, name)))
+
+    def delete_collection(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self._vectors = self._scales = None
+        self._ids, self._texts, self._metadatas, self._rows = [], [], [], {}
+        self._pending, self._deleted = {}, set()
+        self._staged_rows, self._dim = 0, None
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size: the mapped matrix (once paged in) plus texts and metadata."""
+        total = sum(len(text) for text in self._texts) + 200 * len(self._ids)
+        if self._vectors is not None:
+            total += self._vectors.nbytes
+        if self._scales is not None:
+            total += self._scales.nbytes
+        return total
+
+    # --- collection API (mirrors the subset of Chroma's used by RAGSystem) --
+
+    def count(self) -> int:
+        self.flush()
+        return len(self._ids)
+
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]):
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            first = self._stage(vectors)
+            for offset, (chunk_id, text, metadata) in enumerate(zip(ids, documents, metadatas)):
+                self._deleted.discard(chunk_id)
+                self._pending[chunk_id] = (first + offset, text, metadata or {})
+
+    def get(self, ids: List[str], include: Iterable[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        self.flush()
+        rows = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        result: Dict[str, Any] = {"ids": [self._ids[row] for row in rows]}
+        if "embeddings" in include:
+            result["embeddings"] = self._dequantize(rows).tolist() if rows else []
+        if "documents" in include:
+            result["documents"] = [self._texts[row] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[row] for row in rows]
+        return result
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        for chunk_id in ids or []:
+            self._pending.pop(chunk_id, None)
+            if chunk_id in self._rows:
+                self._deleted.add(chunk_id)
+        return True
+
+    # --- VectorStore -------------------------------------------------------
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        ids = ids or [f"{self.collection_name}:{len(self._ids) + len(self._pending) + i}" for i in range(len(texts))]
+        self.upsert(ids, self.embedding_function.embed_documents(texts), texts,
+                    metadatas or [{} for _ in texts])
+        return ids
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float],
+                                               k: int = 4) -> List[Tuple[Document, float]]:
+        self.flush()
+        if not self._ids:
+            return []
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        # Blocks bound the float32 working copy; a few thousand chunks is one product
+        scores = np.empty(len(self._ids), dtype=np.float32)
+        for start in range(0, len(self._ids), SEARCH_BLOCK_ROWS):
+            block = self._vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(Document(page_content=self._texts[row], metadata=self._metadatas[row]), float(scores[row]))
+                for row in top]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   collection_name: str = "langchain", persist_directory: str = "./vector_index",
+                   **kwargs: Any) -> "QuantizedVectorStore":
+        store = cls(collection_name, embedding, persist_directory, **kwargs)
+        store.add_texts(texts, metadatas)
+        store.flush()
+        return store
@@ -0,0 +1,189 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from rag_system import RAGSystem
+from test_case_generator import TestCaseGenerator
+from script_generator import ScriptGenerator
+from html_index import get_html_index
+from llm_cache import LLMResponseCache
+from test_case_store import TestCaseStore
+from config import (CHROMA_DIR, EMBEDDING_MODEL, FEATURE_CLUSTER_THRESHOLD, LLM_CACHE_PATH, LLM_CACHE_TTL,
+                    LLM_CACHE_MAX_ENTRIES, TEST_CASE_DUP_THRESHOLD, TEST_CASE_STORE_PATH, WORKSPACES_DIR,
+                    WORKSPACE_MEMORY_CAP_MB)
+
+DEFAULT_WORKSPACE = "default"
+UPLOAD_DIR = "uploads"
+HTML_DIR = "html_files"
+WORKSPACE_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class Workspace:
+    """One team's uploads, HTML page, index, LLM cache and test-case store.
+
+    The default workspace keeps the original single-tenant locations (uploads/,
+    html_files/, chroma_db/), so existing data is served without migration.
+    """
+
+    def __init__(self, name: str, root: str = WORKSPACES_DIR):
+        self.name = name
+        if name == DEFAULT_WORKSPACE:
+            self.upload_dir, self.html_dir = UPLOAD_DIR, HTML_DIR
+            self.persist_directory, llm_cache_path = CHROMA_DIR, LLM_CACHE_PATH
+            test_case_store_path = TEST_CASE_STORE_PATH
+        else:
+            base = os.path.join(root, name)
+            self.upload_dir = os.path.join(base, UPLOAD_DIR)
+            self.html_dir = os.path.join(base, HTML_DIR)
+            self.persist_directory = os.path.join(base, "chroma_db")
+            llm_cache_path = os.path.join(base, "llm_cache", "responses.sqlite")
+            test_case_store_path = os.path.join(base, "test_case_store", "cases.sqlite")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.html_dir, exist_ok=True)
+        self.llm_cache = LLMResponseCache(llm_cache_path, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES)
+        self.test_case_store = TestCaseStore(test_case_store_path, EMBEDDING_MODEL,
+                                             TEST_CASE_DUP_THRESHOLD, FEATURE_CLUSTER_THRESHOLD)
+        self.rag_system: Optional[RAGSystem] = None
+        self.test_case_generator: Optional[TestCaseGenerator] = None
+        self.script_generator: Optional[ScriptGenerator] = None
+        self.index_source: Optional[str] = None  # "warm_loaded" or "rebuilt"
+        self.html_content: Optional[str] = None
+        self.loaded = False
+        self.requests = 0
+        self.loads = 0
+        self.evictions = 0
+        self.last_used = 0.0
+        self.load_seconds = 0.0
+        self._load_lock = threading.Lock()
+
+    def new_rag_system(self) -> RAGSystem:
+        return RAGSystem(self.upload_dir, persist_directory=self.persist_directory, llm_cache=self.llm_cache)
+
+    def load(self):
+        """Reopen the persisted index and the most recent HTML page, if any."""
+        with self._load_lock:
+            if self.loaded:
+                return
+            start = time.perf_counter()
+            self.html_content = self.latest_html()
+            if self.html_content:
+                get_html_index(self.html_content)
+            system = self.new_rag_system()
+            try:
+                if system.load_existing_index():
+                    self.activate(system, "warm_loaded")
+            except Exception as e:
+                print(f"✗ Warm start of workspace {self.name} failed: {str(e)}")
+            self.loaded = True
+            self.loads += 1
+            self.load_seconds = time.perf_counter() - start
+
+    def latest_html(self) -> Optional[str]:
+        pages = [os.path.join(self.html_dir, name) for name in os.listdir(self.html_dir) if name.endswith('.html')]
+        if not pages:
+            return None
+        with open(max(pages, key=os.path.getmtime), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def activate(self, system: RAGSystem, source: str):
+        self.rag_system = system
+        self.test_case_generator = TestCaseGenerator(system, self.test_case_store)
+        self.script_generator = ScriptGenerator(system)
+        self.index_source = source
+        self.loaded = True
+        self.llm_cache.invalidate_index(system.index_version)
+
+    def unload(self):
+        # In-flight requests keep their own references; everything is reloadable from disk
+        self.rag_system = self.test_case_generator = self.script_generator = None
+        self.index_source = None
+        self.html_content = None
+        self.test_case_store.release()
+        self.loaded = False
+        self.evictions += 1
+
+    def memory_estimate(self) -> int:
+        total = len(self.html_content or "") + self.test_case_store.memory_bytes()
+        if self.rag_system is not None:
+            total += self.rag_system.memory_estimate()
+        return total
+
+    def documents_count(self) -> int:
+        return len(os.listdir(self.upload_dir)) if os.path.exists(self.upload_dir) else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workspace": self.name,
+            "loaded": self.loaded,
+            "knowledge_base_built": self.rag_system is not None,
+            "memory_mb": round(self.memory_estimate() / (1024 * 1024), 2),
+            "requests": self.requests,
+            "hits": self.requests - self.loads,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "last_load_seconds": round(self.load_seconds, 3),
+            "last_used": self.last_used
+        }
+
+
+class WorkspaceManager:
+    """Loads workspaces on first use and evicts least-recently-used ones above a memory cap."""
+
+    def __init__(self, memory_cap_mb: int = WORKSPACE_MEMORY_CAP_MB, root: str = WORKSPACES_DIR,
+                 is_busy: Optional[Callable[[str], bool]] = None):
+        self.memory_cap_bytes = memory_cap_mb * 1024 * 1024
+        self.root = root
+        self.is_busy = is_busy or (lambda name: False)
+        self._workspaces: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def validate(name: str) -> str:
+        if not WORKSPACE_NAME.match(name or ""):
+            raise ValueError("Workspace names may only contain letters, digits, '-' and '_' (max 64)")
+        return name
+
+    def get(self, name: str = DEFAULT_WORKSPACE) -> Workspace:
+        """The workspace, loaded; blocking on first use, so call it off the event loop."""
+        self.validate(name)
+        with self._lock:
+            workspace = self._workspaces.get(name)
+            if workspace is None:
+                workspace = self._workspaces[name] = Workspace(name, self.root)
+            self._workspaces.move_to_end(name)
+            workspace.requests += 1
+            workspace.last_used = time.time()
+        if not workspace.loaded:
+            workspace.load()
+            self.evict(keep=name)
+        return workspace
+
+    def evict(self, keep: str):
+        """Unload least-recently-used workspaces until the loaded ones fit the memory cap."""
+        with self._lock:
+            loaded = [workspace for workspace in self._workspaces.values() if workspace.loaded]
+            total = sum(workspace.memory_estimate() for workspace in loaded)
+            for workspace in loaded:  # oldest first
+                if total <= self.memory_cap_bytes:
+                    break
+                if workspace.name == keep or self.is_busy(workspace.name):
+                    continue
+                total -= workspace.memory_estimate()
+                workspace.unload()
+                print(f"✓ Evicted workspace {workspace.name} (memory cap {self.memory_cap_bytes // (1024 * 1024)} MB)")
+
+    def peek(self, name: str) -> Optional[Workspace]:
+        """The workspace if it is currently loaded, without loading it or touching LRU order."""
+        workspace = self._workspaces.get(name)
+        return workspace if workspace is not None and workspace.loaded else None
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            workspaces = list(self._workspaces.values())
+        return [workspace.stats() for workspace in workspaces]
+
+    def memory_estimate(self) -> int:
+        with self._lock:
+            return sum(workspace.memory_estimate() for workspace in self._workspaces.values() if workspace.loaded)
@@ -0,0 +1,97 @@
+"""Compare the semantic and structure chunking strategies on a document folder.
+
+Builds a throwaway index with each strategy (fresh vector store and embedding
+cache, so nothing is reused between runs) and reports build time, chunk count,
+embedding calls, and retrieval quality on a small labelled query set.
+
+    python benchmarks/compare_chunking.py [--docs supported_docs] [--out results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+# The LLM client is constructed during a build but never called here
+os.environ.setdefault("GOOGLE_API_KEY", "unused-by-benchmark")
+
+from config import RETRIEVAL_K  # noqa: E402
+from rag_system import RAGSystem  # noqa: E402
+
+# (query, expected source file, text the retrieved chunk must contain)
+QUERIES = [
+    ("Which discount codes are valid?", "product_specs.md", "SAVE15"),
+    ("What happens when an invalid coupon is applied?", "test_scenarios.md", "TS-007"),
+    ("How much does express shipping cost?", "product_specs.md", "$10.00"),
+    ("How is tax calculated?", "product_specs.md", "10% tax"),
+    ("What is the payload of the apply coupon endpoint?", "api_endpoints.json", "apply_coupon"),
+    ("Which fields does submit order accept?", "api_endpoints.json", "paymentMethod"),
+    ("What color must the Pay Now button be?", "ui_ux_guide.txt", "#00aa00"),
+    ("How should validation errors be displayed?", "ui_ux_guide.txt", "#ffcccc"),
+    ("Test scenario for invalid email format", "test_scenarios.md", "TS-016"),
+    ("Quantity limits per product", "product_specs.md", "1–10"),
+]
+
+
+def evaluate(system: RAGSystem) -> dict:
+    hits, reciprocal_ranks, context_chars, latencies = 0, [], [], []
+    for query, source, needle in QUERIES:
+        start = time.perf_counter()
+        docs = system.retriever.invoke(query)
+        latencies.append(time.perf_counter() - start)
+        context_chars.append(sum(len(doc.page_content) for doc in docs))
+        rank = next((position for position, doc in enumerate(docs, 1)
+                     if needle in doc.page_content and str(doc.metadata.get("source", "")).endswith(source)), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        f"hit_at_{RETRIEVAL_K}": round(hits / len(QUERIES), 3),
+        "mrr": round(sum(reciprocal_ranks) / len(QUERIES), 3),
+        "avg_context_chars": round(sum(context_chars) / len(QUERIES)),
+        "avg_query_ms": round(1000 * sum(latencies) / len(QUERIES), 2)
+    }
+
+
+def run(strategy: str, docs_folder: str) -> dict:
+    work_dir = tempfile.mkdtemp(prefix=f"chunking-{strategy}-")
+    try:
+        system = RAGSystem(docs_folder, persist_directory=os.path.join(work_dir, "chroma_db"),
+                           chunk_strategy=strategy,
+                           embedding_cache_path=os.path.join(work_dir, "embeddings.sqlite"))
+        start = time.perf_counter()
+        summary = system.build_knowledge_base()
+        build_seconds = time.perf_counter() - start
+        result = {
+            "strategy": strategy,
+            "build_seconds": round(build_seconds, 3),
+            "chunks": summary["total_chunks"],
+            "texts_embedded": system.embedding.stats()["misses"]
+        }
+        result.update(evaluate(system))
+        return result
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", default=os.path.join(BACKEND_DIR, "..", "supported_docs"))
+    parser.add_argument("--out", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = [run(strategy, os.path.abspath(args.docs)) for strategy in ("semantic", "structure")]
+    columns = list(results[0])
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
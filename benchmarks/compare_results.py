@@ -0,0 +1,79 @@
+"""Compare two run_benchmarks.py result files and flag regressions.
+
+Rows are matched by scenario and name. Metrics ending in _seconds, _ms or _mb
+count as lower-is-better, throughput metrics (_per_second) as higher-is-better;
+other fields are shown but never flagged.
+
+    python benchmarks/compare_results.py baseline.json candidate.json [--threshold 10] [--fail-on-regression]
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+LOWER_IS_BETTER = ("_seconds", "_ms", "_mb")
+HIGHER_IS_BETTER = ("_per_second",)
+IGNORED_ARGS = {"out", "keep"}
+
+
+def load(path: str) -> Tuple[Dict[str, Any], Dict[Tuple[str, str], Dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return report.get("meta", {}), {(row["scenario"], row["name"]): row for row in report["results"]}
+
+
+def settings(meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in meta.get("args", {}).items() if key not in IGNORED_ARGS}
+
+
+def direction(metric: str) -> Optional[int]:
+    """-1 when lower is better, 1 when higher is better, None when not a performance metric."""
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    base_meta, baseline = load(args.baseline)
+    cand_meta, candidate = load(args.candidate)
+    print(f"baseline {base_meta.get('commit')} vs candidate {cand_meta.get('commit')}")
+    if settings(base_meta) != settings(cand_meta):
+        print("⚠️ Runs used different arguments, results may not be comparable")
+
+    regressions = 0
+    print("scenario | name | metric | baseline | candidate | change")
+    for key in sorted(set(baseline) | set(candidate)):
+        if key not in baseline or key not in candidate:
+            print(f"{key[0]} | {key[1]} | - | {'present' if key in baseline else 'missing'} | "
+                  f"{'present' if key in candidate else 'missing'} | -")
+            continue
+        for metric, old in baseline[key].items():
+            new = candidate[key].get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or isinstance(old, bool):
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            sign = direction(metric)
+            flag = ""
+            if sign is not None and change * sign < -args.threshold:
+                flag = " ❌ regression"
+                regressions += 1
+            elif sign is not None and change * sign > args.threshold:
+                flag = " ✅ improvement"
+            print(f"{key[0]} | {key[1]} | {metric} | {old} | {new} | {change:+.1f}%{flag}")
+
+    print(f"{regressions} regression(s) above {args.threshold:g}%")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Compare the Chroma and in-process quantized vector backends.
+
+Chunks the document folder once (structure chunking, so no embedding calls for
+splitting), embeds the chunks with the configured model, then replicates them
+with a little noise up to --chunks rows. Each backend runs in its own process
+on the same vectors and reports build time, top-k query latency, resident
+memory growth, size on disk and top-k agreement with an exact float32 search.
+
+    python benchmarks/compare_vector_backends.py [--docs supported_docs] [--chunks 5000] [--out results.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("GOOGLE_API_KEY", "unused-by-benchmark")
+
+from config import RETRIEVAL_K  # noqa: E402
+from compare_chunking import QUERIES  # noqa: E402
+
+BACKENDS = [("chroma", None), ("quantized", "float16"), ("quantized", "int8")]
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+
+def build_corpus(docs_folder: str, target_chunks: int):
+    from chunking import StructureChunker
+    from model_registry import models
+    from rag_system import RAGSystem
+
+    system = RAGSystem(docs_folder, chunk_strategy="structure")
+    chunks = StructureChunker().split_documents(system.load_documents())
+    model = models.embedding_model()
+    base = np.asarray(model.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+    queries = np.asarray(model.embed_documents([query for query, _, _ in QUERIES]), dtype=np.float32)
+
+    # Noisy copies stand in for a larger corpus without paying for more embeddings
+    rng = np.random.default_rng(0)
+    copies = max(1, -(-target_chunks // len(chunks)))
+    vectors = np.concatenate([base] + [base + rng.normal(0, 0.02, base.shape).astype(np.float32)
+                                       for _ in range(copies - 1)])[:target_chunks]
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    texts = [chunks[row % len(chunks)].page_content for row in range(len(vectors))]
+    metadatas = [{"source": str(chunks[row % len(chunks)].metadata.get("source", "")), "row": row}
+                 for row in range(len(vectors))]
+    return vectors, texts, metadatas, queries
+
+
+def run_backend(backend, dtype, vectors, texts, metadatas, queries, work_dir, results):
+    from langchain_chroma import Chroma
+    from vector_index import QuantizedVectorStore
+
+    baseline = rss_mb()
+    ids = [f"chunk-{row}" for row in range(len(vectors))]
+    start = time.perf_counter()
+    if backend == "chroma":
+        store = Chroma(collection_name="bench", persist_directory=work_dir)
+        collection = store._collection
+    else:
+        store = QuantizedVectorStore("bench", None, work_dir, dtype=dtype)
+        collection = store
+    for offset in range(0, len(vectors), 500):
+        collection.upsert(ids=ids[offset:offset + 500], embeddings=vectors[offset:offset + 500].tolist(),
+                          documents=texts[offset:offset + 500], metadatas=metadatas[offset:offset + 500])
+    if backend != "chroma":
+        store.flush()
+    build_seconds = time.perf_counter() - start
+
+    latencies, top_rows = [], []
+    for _ in range(5):
+        for query in queries:
+            start = time.perf_counter()
+            docs = store.similarity_search_by_vector(query.tolist(), k=RETRIEVAL_K)
+            latencies.append(time.perf_counter() - start)
+            top_rows.append([doc.metadata["row"] for doc in docs])
+    results.put({
+        "backend": backend if dtype is None else f"{backend}/{dtype}",
+        "chunks": len(vectors),
+        "build_seconds": round(build_seconds, 3),
+        "avg_query_ms": round(1000 * float(np.mean(latencies)), 3),
+        "p95_query_ms": round(1000 * float(np.percentile(latencies, 95)), 3),
+        "rss_growth_mb": round(rss_mb() - baseline, 1),
+        "disk_mb": round(disk_mb(work_dir), 2),
+        "top_rows": top_rows[:len(queries)]
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", default=os.path.join(BACKEND_DIR, "..", "supported_docs"))
+    parser.add_argument("--chunks", type=int, default=5000, help="corpus size after replication")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    vectors, texts, metadatas, queries = build_corpus(os.path.abspath(args.docs), args.chunks)
+    exact = [set(np.argsort(-(vectors @ query))[:RETRIEVAL_K].tolist()) for query in queries]
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for backend, dtype in BACKENDS:
+        work_dir = tempfile.mkdtemp(prefix=f"vectors-{backend}-")
+        try:
+            queue = context.Queue()
+            process = context.Process(target=run_backend, args=(backend, dtype, vectors, texts, metadatas,
+                                                                queries, work_dir, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        top_rows = result.pop("top_rows")
+        result[f"recall_at_{RETRIEVAL_K}"] = round(
+            float(np.mean([len(exact[i] & set(rows)) / RETRIEVAL_K for i, rows in enumerate(top_rows)])), 3)
+        results.append(result)
+
+    columns = list(results[0])
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
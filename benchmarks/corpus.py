@@ -0,0 +1,59 @@
+"""Synthetic corpora built from supported_docs/ for load testing.
+
+Each copy renames identifiers (test ids, discount codes, endpoints, element ids)
+with a variant suffix, so copies are near-duplicates rather than exact ones and
+still produce distinct chunks, vectors and lexical terms.
+"""
+import os
+import re
+import shutil
+from typing import List
+
+CODE = re.compile(r"\b([A-Z]{2,}-?\d+)\b")
+ENDPOINT = re.compile(r"(\b(?:GET|POST|PUT|PATCH|DELETE) )/")
+ELEMENT_ID = re.compile(r'\b(id|for)="([^"]+)"')
+BODY = re.compile(r"(<body[^>]*>)(.*)(</body>)", re.S | re.I)
+DOC_EXTENSIONS = (".pdf", ".txt", ".md", ".json")
+
+
+def vary_text(text: str, variant: int) -> str:
+    if variant == 0:
+        return text
+    text = CODE.sub(lambda m: f"{m.group(1)}V{variant}", text)
+    return ENDPOINT.sub(lambda m: f"{m.group(1)}/v{variant}/", text)
+
+
+def scale_corpus(source_dir: str, target_dir: str, factor: int) -> List[str]:
+    """Write `factor` variants of every document in source_dir into target_dir (HTML is skipped)."""
+    if os.path.exists(target_dir):
+        shutil.rmtree(target_dir)
+    os.makedirs(target_dir)
+    written = []
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.lower().endswith(DOC_EXTENSIONS):
+            continue
+        path = os.path.join(source_dir, filename)
+        stem, extension = os.path.splitext(filename)
+        binary = extension.lower() == ".pdf"
+        with open(path, "rb" if binary else "r", **({} if binary else {"encoding": "utf-8"})) as f:
+            content = f.read()
+        for variant in range(factor):
+            target = os.path.join(target_dir, f"{stem}__{variant:04d}{extension}")
+            if binary:
+                shutil.copyfile(path, target)
+            else:
+                with open(target, "w", encoding="utf-8") as f:
+                    f.write(vary_text(content, variant))
+            written.append(target)
+    return written
+
+
+def scale_html(html: str, factor: int) -> str:
+    """Repeat the page body `factor` times with element ids (and label targets) made unique."""
+    match = BODY.search(html)
+    if not match or factor <= 1:
+        return html
+    body = match.group(2)
+    copies = [body] + [ELEMENT_ID.sub(lambda m: f'{m.group(1)}="{m.group(2)}-{variant}"', body)
+                       for variant in range(1, factor)]
+    return html[:match.start(2)] + "".join(copies) + html[match.end(2):]
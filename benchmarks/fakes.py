@@ -0,0 +1,299 @@
+"""Deterministic stand-ins for the embedding model and the LLM, for offline benchmarks.
+
+Neither needs network access or model weights, and both return the same output
+for the same input on every run, so differences between benchmark results come
+from the code under test rather than from the providers. FlakyChatModel adds a
+provider quota, 429s and transient 503s (from a seeded generator) for the
+rate-limiting and retry paths.
+"""
+import asyncio
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def stable_hash(text: str) -> int:
+    # hash() is salted per process, benchmark runs need to agree across processes
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashEmbeddings(Embeddings):
+    """Feature-hashed bag of words and bigrams, L2-normalized.
+
+    Texts sharing vocabulary get similar vectors, so retrieval and de-duplication
+    behave plausibly. `seconds_per_text` adds model-like compute time.
+    """
+
+    def __init__(self, dimensions: int = 384, seconds_per_text: float = 0.0):
+        self.dimensions = dimensions
+        self.seconds_per_text = seconds_per_text
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, text: str) -> List[float]:
+        words = TOKEN.findall(text.lower())
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            value = stable_hash(feature)
+            vector[value % self.dimensions] += 1.0 if (value >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers the repo's prompts with realistic output after a fixed delay.
+
+    Test-case prompts get a markdown table grounded in the `[SOURCE: ...]` files of
+    the context, script prompts a unittest/Selenium script using ids from the HTML
+    excerpt, repair prompts their fragments back unchanged, anything else a short
+    paragraph. Latency is `latency` seconds plus
+    `seconds_per_token` per output token; streaming spreads it over the lines.
+    """
+
+    latency: float = 0.2
+    seconds_per_token: float = 0.0
+    temperature: float = 0.3
+    test_cases: int = 5
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def respond(self, prompt: str) -> str:
+        if "FRAGMENT F1" in prompt:
+            return self.repair_fragments(prompt)
+        if "MARKDOWN TABLE" in prompt:
+            return self.test_case_table(prompt)
+        if "Selenium" in prompt:
+            return self.selenium_script(prompt)
+        seed = stable_hash(prompt)
+        return f"Based on the documentation, the answer depends on configuration #{seed % 97}. " \
+               "The checkout flow validates input before submission and shows errors inline."
+
+    def test_case_table(self, prompt: str) -> str:
+        match = re.search(r"User Query: (.*)", prompt)
+        query = match.group(1).strip() if match else "feature"
+        sources = sorted(set(re.findall(r"\[SOURCE: ([^\]]+)\]", prompt))) or ["product_specs.md"]
+        feature = " ".join(query.split()[:4]).title().replace("|", "/")
+        seed = stable_hash(prompt)
+        rows = ["| Test_ID | Feature | Test_Scenario | Test_Steps | Expected_Result | Test_Type | Grounded_In |",
+                "|---|---|---|---|---|---|---|"]
+        for number in range(1, self.test_cases + 1):
+            positive = (seed + number) % 3 != 0
+            rows.append(
+                f"| TC-{number:03d} | {feature} | {'Valid' if positive else 'Invalid'} {feature.lower()} case {number} "
+                f"| Open checkout page; Enter {'valid' if positive else 'invalid'} data; Click Pay Now "
+                f"| {'Order is accepted' if positive else 'An inline error message is shown'} "
+                f"| {'Positive' if positive else 'Negative'} | {sources[number % len(sources)]} |"
+            )
+        return "\n".join(rows)
+
+    def repair_fragments(self, prompt: str) -> str:
+        # Echo every fragment back unchanged, in the format the repair parser expects
+        fragments = re.findall(r"FRAGMENT (F\d+) \(lines [^)]*\):.*?CODE:\n(.*?)(?=\n\nFRAGMENT F\d+|\n\nSELECTORS THAT EXIST)",
+                               prompt, re.S)
+        return "\n".join(f"### {name}\n{code}" for name, code in fragments)
+
+    def selenium_script(self, prompt: str) -> str:
+        ids = list(dict.fromkeys(re.findall(r'id="([\w-]+)"', prompt)))[:6] or ["payBtn"]
+        steps = "\n".join(
+            f"        element = wait.until(EC.presence_of_element_located((By.ID, \"{element_id}\")))\n"
+            f"        driver.execute_script(\"arguments[0].scrollIntoView(true);\", element)"
+            for element_id in ids
+        )
+        return f'''```python
+import os
+import tempfile
+import unittest
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from webdriver_manager.chrome import ChromeDriverManager
+
+HTML_CONTENT = "__PAGE_HTML__"
+
+
+class TestCheckout(unittest.TestCase):
+    def setUp(self):
+        self.temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8')
+        self.temp_file.write(HTML_CONTENT)
+        self.temp_file.close()
+        options = webdriver.ChromeOptions()
+        options.add_argument("--start-maximized")
+        options.add_argument("--disable-notifications")
+        service = Service(ChromeDriverManager().install())
+        self.driver = webdriver.Chrome(service=service, options=options)
+        self.driver.get(f'file://{{self.temp_file.name}}')
+
+    def test_flow(self):
+        """Walk through the elements referenced by the test case."""
+        driver = self.driver
+        wait = WebDriverWait(driver, 15)
+{steps}
+        self.assertTrue(element.is_displayed())
+
+    def tearDown(self):
+        self.driver.quit()
+        os.remove(self.temp_file.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
+```'''
+
+    def delay(self, text: str) -> float:
+        return self.latency + self.seconds_per_token * (len(text) / 4)
+
+    @staticmethod
+    def prompt_text(messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        text = self.respond(self.prompt_text(messages))
+        time.sleep(self.delay(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        text = self.respond(self.prompt_text(messages))
+        await asyncio.sleep(self.delay(text))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        text = self.respond(self.prompt_text(messages))
+        lines = text.splitlines(keepends=True)
+        for line in lines:
+            time.sleep(self.delay(text) / len(lines))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=line))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        text = self.respond(self.prompt_text(messages))
+        lines = text.splitlines(keepends=True)
+        for line in lines:
+            await asyncio.sleep(self.delay(text) / len(lines))
+            yield ChatGenerationChunk(message=AIMessageChunk(content=line))
+
+
+class FakeProviderError(Exception):
+    """Shaped like the provider's errors: a status code and, for 429s, a retry hint."""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FlakyChatModel(FakeChatModel):
+    """FakeChatModel behind a simulated provider quota.
+
+    More than `quota` calls started within any `window` seconds, or more than
+    `max_in_flight` concurrent calls, are rejected with a 429 carrying a
+    retry hint; `error_rate` of the remaining calls fail with a 503. A value of
+    0 disables each check. Rejections happen before any output, like a real API.
+    """
+
+    quota: int = 0
+    window: float = 60.0
+    max_in_flight: int = 0
+    error_rate: float = 0.0
+    seed: int = 0
+    throttled: int = 0
+    errors: int = 0
+    peak_in_flight: int = 0
+    _starts: Any = PrivateAttr(default_factory=deque)
+    _in_flight: int = PrivateAttr(default=0)
+    _random: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def admit(self):
+        with self._lock:
+            if self._random is None:
+                self._random = random.Random(self.seed)
+            now = time.monotonic()
+            while self._starts and now - self._starts[0] >= self.window:
+                self._starts.popleft()
+            if self.quota and len(self._starts) >= self.quota:
+                self.throttled += 1
+                raise FakeProviderError(429, "Resource exhausted: quota exceeded",
+                                        retry_after=round(self.window - (now - self._starts[0]), 3))
+            if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                self.throttled += 1
+                raise FakeProviderError(429, "Too many concurrent requests", retry_after=self.latency)
+            self._starts.append(now)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                raise FakeProviderError(503, "Service unavailable")
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+
+    def done(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.admit()
+        try:
+            return super()._generate(messages, stop, run_manager, **kwargs)
+        finally:
+            self.done()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.admit()
+        try:
+            return await super()._agenerate(messages, stop, run_manager, **kwargs)
+        finally:
+            self.done()
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.admit()
+        try:
+            yield from super()._stream(messages, stop, run_manager, **kwargs)
+        finally:
+            self.done()
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.admit()
+        try:
+            async for chunk in super()._astream(messages, stop, run_manager, **kwargs):
+                yield chunk
+        finally:
+            self.done()
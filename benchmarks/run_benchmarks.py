@@ -0,0 +1,330 @@
+"""Offline benchmark suite: build throughput, retrieval latency, HTML analysis, endpoint load and LLM quota handling.
+
+The embedding model and LLM are replaced by the deterministic fakes in
+fakes.py, so runs need no network or model weights and results are comparable
+between commits (see compare_results.py). The corpus is supported_docs/ scaled
+up by each --scales factor with corpus.py. The llm scenario runs once, against
+FlakyChatModel's simulated quota rather than the corpus.
+
+    python benchmarks/run_benchmarks.py [--scales 10,100] [--scenarios build,retrieval,html,endpoints,llm]
+        [--llm-latency 0.2] [--concurrency 8] [--requests 32] [--out results.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCHMARK_DIR, "..", "backend")
+DOCS_DIR = os.path.join(BENCHMARK_DIR, "..", "supported_docs")
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("GOOGLE_API_KEY", "unused-by-benchmark")
+
+from corpus import scale_corpus, scale_html  # noqa: E402
+from fakes import FakeChatModel, FlakyChatModel, HashEmbeddings  # noqa: E402
+
+SCENARIOS = ["build", "retrieval", "html", "endpoints", "llm"]
+# Identifier lookups exercise the lexical path of hybrid retrieval
+IDENTIFIER_QUERIES = ["SAVE15", "TS-007", "apply_coupon", "paymentMethod"]
+HTML_TEST_CASES = [
+    {"test_id": "TC-001", "feature": "Discount code", "test_scenario": "Apply a valid discount code",
+     "test_steps": ["Enter SAVE15 in the discount code field", "Click apply"],
+     "expected_result": "Discount is applied to the total"},
+    {"test_id": "TC-002", "feature": "Checkout form", "test_scenario": "Submit with an invalid email",
+     "test_steps": ["Fill the form", "Enter an invalid email", "Click Pay Now"],
+     "expected_result": "Email error message is shown"},
+    {"test_id": "TC-003", "feature": "Shipping", "test_scenario": "Select express shipping",
+     "test_steps": ["Choose express shipping"], "expected_result": "Shipping cost updates to $10.00"},
+]
+
+
+def latency_stats(seconds: List[float]) -> Dict[str, float]:
+    values = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BENCHMARK_DIR, capture_output=True, text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def install_fakes(args) -> FakeChatModel:
+    from model_registry import models
+
+    # The registry is the single place RAGSystem gets its models from
+    llm = FakeChatModel(latency=args.llm_latency, seconds_per_token=args.llm_seconds_per_token)
+    models._embedding_model = HashEmbeddings(seconds_per_text=args.embed_seconds_per_text)
+    models._llm = llm
+    return llm
+
+
+def new_system(work_dir: str, docs_folder: str, args):
+    from rag_system import RAGSystem
+
+    return RAGSystem(docs_folder, persist_directory=os.path.join(work_dir, "index"),
+                     chunk_strategy=args.chunk_strategy, vector_backend=args.backend,
+                     embedding_cache_path=os.path.join(work_dir, "embeddings.sqlite"))
+
+
+def bench_build(scale: int, work_dir: str, args) -> Dict[str, Any]:
+    docs_folder = os.path.join(work_dir, "docs")
+    files = scale_corpus(DOCS_DIR, docs_folder, scale)
+    start = time.perf_counter()
+    summary = new_system(work_dir, docs_folder, args).build_knowledge_base()
+    build_seconds = time.perf_counter() - start
+    # Nothing changed, so this measures the manifest diff and chunk copy path
+    start = time.perf_counter()
+    new_system(work_dir, docs_folder, args).build_knowledge_base()
+    noop_seconds = time.perf_counter() - start
+    return {
+        "scenario": "build", "name": f"x{scale}", "files": len(files),
+        "chunks": summary["total_chunks"],
+        "build_seconds": round(build_seconds, 3),
+        "chunks_per_second": round(summary["total_chunks"] / build_seconds, 1),
+        "noop_rebuild_seconds": round(noop_seconds, 3)
+    }
+
+
+def bench_retrieval(scale: int, work_dir: str, args) -> Dict[str, Any]:
+    from compare_chunking import QUERIES
+
+    system = new_system(work_dir, os.path.join(work_dir, "docs"), args)
+    start = time.perf_counter()
+    if not system.load_existing_index():
+        raise RuntimeError(f"No index for x{scale}; run the build scenario too")
+    load_seconds = time.perf_counter() - start
+    queries = [query for query, _, _ in QUERIES] + IDENTIFIER_QUERIES
+    for query in queries:  # warm the embedding cache and lazy imports
+        system.retrieve_context(query)
+    latencies, tokens = [], []
+    for _ in range(args.repeats):
+        for query in queries:
+            start = time.perf_counter()
+            context = system.retrieve_context(query)
+            latencies.append(time.perf_counter() - start)
+            tokens.append(context.stats["context_tokens"])
+    return {"scenario": "retrieval", "name": f"x{scale}", "queries": len(latencies),
+            "load_index_seconds": round(load_seconds, 3), **latency_stats(latencies),
+            "mean_context_tokens": round(float(np.mean(tokens)), 1)}
+
+
+def bench_html(scale: int, args) -> Dict[str, Any]:
+    import html_index
+    from script_generator import ScriptGenerator
+
+    with open(os.path.join(DOCS_DIR, "checkout.html"), "r", encoding="utf-8") as f:
+        page = scale_html(f.read(), scale)
+    html_index._index_cache.clear()
+    start = time.perf_counter()
+    index = html_index.get_html_index(page)
+    cold_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    html_index.get_html_index(page)
+    warm_seconds = time.perf_counter() - start
+
+    generator = ScriptGenerator(None)  # slicing and analysis don't touch the RAG system
+    analyze, slices, excerpt_tokens = [], [], []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        generator.analyze_html_content(page)
+        analyze.append(time.perf_counter() - start)
+        for test_case in HTML_TEST_CASES:
+            start = time.perf_counter()
+            _, stats = generator.slice_html(test_case, page)
+            slices.append(time.perf_counter() - start)
+            excerpt_tokens.append(stats["excerpt_tokens"])
+    return {
+        "scenario": "html", "name": f"x{scale}", "elements": len(index.elements),
+        "page_tokens": stats["original_tokens"],
+        "cold_parse_ms": round(cold_seconds * 1000, 3), "warm_parse_ms": round(warm_seconds * 1000, 3),
+        "analyze_ms": latency_stats(analyze)["mean_ms"],
+        **{f"slice_{key}": value for key, value in latency_stats(slices).items()},
+        "mean_excerpt_tokens": round(float(np.mean(excerpt_tokens)), 1)
+    }
+
+
+async def bench_endpoints(scale: int, work_dir: str, args, llm: FakeChatModel) -> List[Dict[str, Any]]:
+    import httpx
+    import main as api
+
+    # The ASGI transport skips startup events, so nothing else is loaded or warmed
+    api.workspaces.root = os.path.join(work_dir, "workspaces")
+    workspace = f"bench-x{scale}"
+    params = {"workspace": workspace}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://bench",
+                                 timeout=600) as client:
+        ws = await api.open_workspace(workspace)
+        scale_corpus(DOCS_DIR, ws.upload_dir, scale)
+        with open(os.path.join(DOCS_DIR, "checkout.html"), "rb") as f:
+            response = await client.post("/upload-html", params=params,
+                                         files={"file": ("checkout.html", f, "text/html")})
+        response.raise_for_status()
+        job = (await client.post("/build-knowledge-base", params=params)).json()
+        while True:
+            status = (await client.get(f"/jobs/{job['job_id']}")).json()
+            if status["status"] in ("succeeded", "failed", "cancelled"):
+                break
+            await asyncio.sleep(0.05)
+        if status["status"] != "succeeded":
+            raise RuntimeError(f"Benchmark build failed: {status}")
+
+        async def load(name: str, make_request, unique: bool) -> Dict[str, Any]:
+            semaphore = asyncio.Semaphore(args.concurrency)
+            latencies, codes = [], {}
+            calls_before = llm.calls
+
+            async def one(number: int):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await make_request(number if unique else 0)
+                    latencies.append(time.perf_counter() - start)
+                    codes[str(response.status_code)] = codes.get(str(response.status_code), 0) + 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(one(number) for number in range(args.requests)))
+            elapsed = time.perf_counter() - start
+            return {"scenario": "endpoints", "name": f"{name}/x{scale}", "requests": args.requests,
+                    "concurrency": args.concurrency, "requests_per_second": round(args.requests / elapsed, 2),
+                    **latency_stats(latencies), "llm_calls": llm.calls - calls_before, "status_codes": codes}
+
+        def test_cases(number: int):
+            # A distinct query per request misses the LLM cache; number 0 repeats and hits it
+            return client.post("/generate-test-cases", params={**params, "query": f"Discount code checks #{number}"})
+
+        def script(number: int):
+            return client.post("/generate-script", params=params,
+                               json={**HTML_TEST_CASES[number % len(HTML_TEST_CASES)], "test_id": f"TC-{number:04d}"})
+
+        return [await load("generate-test-cases", test_cases, unique=True),
+                await load("generate-test-cases-cached", test_cases, unique=False),
+                await load("generate-script", script, unique=True)]
+
+
+async def bench_llm(args) -> List[Dict[str, Any]]:
+    """Burst of calls against a provider quota: the adaptive limiter vs. fixed concurrency without retries."""
+    from llm_limiter import LLMLimiter
+
+    window = 1.0  # seconds, so a run takes a few seconds instead of minutes
+    configs = {
+        "adaptive": dict(min_concurrency=1, rpm=int(args.llm_quota * 60 / window), retry_attempts=6,
+                         retry_base=0.05, retry_max=window, decrease_interval=2 * args.llm_latency,
+                         burst_seconds=window / 4),
+        "unmanaged": dict(min_concurrency=args.llm_concurrency, retry_attempts=0),
+    }
+    results = []
+    for name, options in configs.items():
+        llm = FlakyChatModel(latency=args.llm_latency, quota=args.llm_quota, window=window,
+                             max_in_flight=args.llm_provider_concurrency, error_rate=args.llm_error_rate)
+        limiter = LLMLimiter(args.llm_concurrency, queue_timeout=60, deadline=60, **options)
+        latencies, failures = [], {}
+
+        async def one(number: int):
+            start = time.perf_counter()
+            try:
+                await limiter.ainvoke(llm, f"Question #{number}")
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(number) for number in range(args.llm_requests)))
+        elapsed = time.perf_counter() - start
+        results.append({"scenario": "llm", "name": name, "requests": args.llm_requests,
+                        "succeeded": len(latencies), "failed": failures,
+                        "succeeded_per_second": round(len(latencies) / elapsed, 2),
+                        **(latency_stats(latencies) if latencies else {}),
+                        "provider_429s": llm.throttled, "provider_503s": llm.errors,
+                        "retries": limiter.retries, "final_concurrency_limit": limiter.concurrency_limit,
+                        "peak_in_flight": llm.peak_in_flight})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="10,100", help="comma-separated corpus multipliers of supported_docs")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--backend", default="quantized", choices=["chroma", "quantized"])
+    parser.add_argument("--dtype", default="float16", choices=["float16", "int8"], help="quantized backend storage")
+    parser.add_argument("--chunk-strategy", default="structure", choices=["semantic", "structure"])
+    parser.add_argument("--repeats", type=int, default=5, help="passes over the query/test-case sets")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM seconds per call")
+    parser.add_argument("--llm-seconds-per-token", type=float, default=0.0)
+    parser.add_argument("--embed-seconds-per-text", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent endpoint requests")
+    parser.add_argument("--requests", type=int, default=32, help="endpoint requests per load run")
+    parser.add_argument("--llm-requests", type=int, default=200, help="calls in the llm quota burst")
+    parser.add_argument("--llm-concurrency", type=int, default=32, help="llm scenario starting concurrency")
+    parser.add_argument("--llm-quota", type=int, default=40, help="fake provider calls allowed per second")
+    parser.add_argument("--llm-provider-concurrency", type=int, default=8, help="fake provider concurrent calls, 0 = any")
+    parser.add_argument("--llm-error-rate", type=float, default=0.05, help="fake provider transient 503 rate")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    args = parser.parse_args()
+    scales = [int(scale) for scale in args.scales.split(",")]
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",")]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    # Backend modules read these at import, so the API workspaces pick them up too
+    os.environ["VECTOR_BACKEND"] = args.backend
+    os.environ["VECTOR_DTYPE"] = args.dtype
+    os.environ["CHUNK_STRATEGY"] = args.chunk_strategy
+    llm = install_fakes(args)
+    out = os.path.abspath(args.out) if args.out else None
+    scratch = tempfile.mkdtemp(prefix="qa-bench-")
+    cwd = os.getcwd()
+    # Relative default paths (embedding cache, workspaces) then land in the scratch directory
+    os.chdir(scratch)
+    results = []
+    try:
+        for scale in scales:
+            work_dir = os.path.join(scratch, f"x{scale}")
+            os.makedirs(work_dir, exist_ok=True)
+            if "build" in scenarios:
+                results.append(bench_build(scale, work_dir, args))
+            if "retrieval" in scenarios:
+                results.append(bench_retrieval(scale, work_dir, args))
+            if "html" in scenarios:
+                results.append(bench_html(scale, args))
+            if "endpoints" in scenarios:
+                results.extend(asyncio.run(bench_endpoints(scale, work_dir, args, llm)))
+        if "llm" in scenarios:
+            results.extend(asyncio.run(bench_llm(args)))
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    for result in results:
+        print(" | ".join(f"{key}={value}" for key, value in result.items()))
+    report = {
+        "meta": {**git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "args": vars(args)},
+        "results": results
+    }
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
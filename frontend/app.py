@@ -2,10 +2,29 @@ import streamlit as st
 import requests
 from dotenv import load_dotenv
 import os
+import json
+import time
 
 load_dotenv()
 
 BACKEND_URL = os.environ["api"]
+# Teams sharing a backend each point their frontend at their own workspace
+WORKSPACE = {"workspace": os.environ.get("workspace", "default")}
+
+def read_sse(response):
+    """Yield (event, data) pairs from a server-sent events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
 
 st.set_page_config(
     page_title="Autonomous QA Agent",
@@ -23,6 +42,12 @@ if 'html_uploaded' not in st.session_state:
     st.session_state.html_uploaded = False
 if 'kb_built' not in st.session_state:
     st.session_state.kb_built = False
+    # The backend may have warm-loaded a persisted index at startup
+    try:
+        status = requests.get(f"{BACKEND_URL}/status", params=WORKSPACE).json()
+        st.session_state.kb_built = status.get("knowledge_base_built", False)
+    except requests.RequestException:
+        pass
 
 # Sidebar for document upload
 with st.sidebar:
@@ -40,7 +65,7 @@ with st.sidebar:
         with st.spinner("Uploading documents..."):
             files = [("files", (file.name, file.getvalue(), file.type)) 
                     for file in uploaded_docs]
-            response = requests.post(f"{BACKEND_URL}/upload-documents", files=files)        
+            response = requests.post(f"{BACKEND_URL}/upload-documents", files=files, params=WORKSPACE)        
             if response.status_code == 200:
                 st.success("✅ Documents uploaded successfully!")
             else:
@@ -48,13 +73,35 @@ with st.sidebar:
 
     st.subheader("2. Build Knowledge Base")
     if st.button("Build Knowledge Base"):
-        with st.spinner("Building knowledge base..."):
-            response = requests.post(f"{BACKEND_URL}/build-knowledge-base")
-            if response.status_code == 200:
-                st.success("✅ Knowledge base built successfully!")
-                st.session_state.kb_built = True
-            else:
-                st.error("❌ Failed to build knowledge base")
+        response = requests.post(f"{BACKEND_URL}/build-knowledge-base", params=WORKSPACE)
+        if response.status_code in (202, 409):
+            st.session_state.build_job_id = response.json()["job_id"]
+        else:
+            st.error("❌ Failed to build knowledge base")
+    if st.session_state.get("build_job_id"):
+        job_id = st.session_state.build_job_id
+        if st.button("Cancel Build"):
+            requests.delete(f"{BACKEND_URL}/jobs/{job_id}")
+        progress_box = st.empty()
+        while True:
+            job = requests.get(f"{BACKEND_URL}/jobs/{job_id}").json()
+            counts = job.get("counts", {})
+            progress_box.info(
+                f"⏳ {job.get('stage') or 'queued'}: "
+                f"{counts.get('files_done', 0)}/{counts.get('files_total', 0)} files, "
+                f"{counts.get('chunks_embedded', 0)}/{counts.get('chunks_total', 0)} chunks embedded"
+            )
+            if job.get("status") in ("succeeded", "failed", "cancelled"):
+                break
+            time.sleep(1)
+        st.session_state.build_job_id = None
+        if job["status"] == "succeeded":
+            progress_box.success("✅ Knowledge base built successfully!")
+            st.session_state.kb_built = True
+        elif job["status"] == "cancelled":
+            progress_box.warning("⚠️ Knowledge base build cancelled")
+        else:
+            progress_box.error(f"❌ Failed to build knowledge base: {job.get('error')}")
     st.divider()
     st.subheader("3. Upload HTML File")
     uploaded_html = st.file_uploader(
@@ -66,7 +113,7 @@ with st.sidebar:
     if uploaded_html and st.button("Upload HTML"):
         with st.spinner("Uploading HTML file..."):
             files = [("file", (uploaded_html.name, uploaded_html.getvalue(), "text/html"))]
-            response = requests.post(f"{BACKEND_URL}/upload-html", files=files)    
+            response = requests.post(f"{BACKEND_URL}/upload-html", files=files, params=WORKSPACE)    
             if response.status_code == 200:
                 st.success("✅ HTML file uploaded successfully!")
                 st.session_state.html_uploaded = True
@@ -91,20 +138,58 @@ with tab1:
         if not query:
             st.warning("Please enter a query")
         else:
+            st.session_state.test_cases = []
+            live_cases = st.container()
+            failed = False
             with st.spinner("Generating test cases..."):
                 response = requests.post(
-                    f"{BACKEND_URL}/generate-test-cases",
-                    params={"query": query}
+                    f"{BACKEND_URL}/generate-test-cases/stream",
+                    params={"query": query, **WORKSPACE},
+                    stream=True
                 )
                 if response.status_code == 200:
-                    data = response.json()
-                    st.session_state.test_cases = data.get("test_cases", [])
-                    st.success(f"✅ Generated {len(st.session_state.test_cases)} test cases!")
+                    # Render each case as soon as the backend emits it
+                    for event, data in read_sse(response):
+                        if event == "test_case":
+                            st.session_state.test_cases.append(data)
+                            seen_before = " _(seen before)_" if data.get("status") == "merged" else ""
+                            live_cases.write(f"🧪 **{data.get('test_id')}** - {data.get('feature')}: {data.get('test_scenario')}{seen_before}")
+                        elif event == "error":
+                            failed = True
                 else:
-                    st.error("❌ Failed to generate test cases")
+                    failed = True
+            if failed:
+                st.error("❌ Failed to generate test cases")
+            else:
+                st.success(f"✅ Generated {len(st.session_state.test_cases)} test cases!")
 
     if st.session_state.test_cases:
         st.header("Generated Test Cases")
+        if st.button("Generate All Scripts", disabled=not st.session_state.html_uploaded):
+            progress = st.progress(0.0, text="Generating Selenium scripts...")
+            total = len(st.session_state.test_cases)
+            completed, failures = 0, []
+            response = requests.post(
+                f"{BACKEND_URL}/generate-scripts/batch",
+                json=st.session_state.test_cases,
+                params=WORKSPACE,
+                stream=True
+            )
+            if response.status_code == 200:
+                for event, data in read_sse(response):
+                    if event == "script":
+                        st.session_state.generated_scripts[data["test_id"]] = data.get("script", "")
+                    elif event == "script_error":
+                        failures.append(f"{data['test_id']}: {data['error']}")
+                    else:
+                        continue
+                    completed += 1
+                    progress.progress(completed / total, text=f"Generated {completed}/{total} scripts")
+                if failures:
+                    st.warning("⚠️ Some scripts failed:\n\n" + "\n\n".join(failures))
+                st.success(f"✅ Generated {completed - len(failures)} scripts! See the Script Generation tab.")
+            else:
+                st.error("❌ Failed to generate scripts")
         
         for i, test_case in enumerate(st.session_state.test_cases):
             with st.expander(f"🧪 {test_case.get('test_id', f'TC-{i+1:03d}')} - {test_case.get('feature', 'Feature')}", expanded=False):
@@ -128,7 +213,8 @@ with tab1:
                         with st.spinner("Generating Selenium script..."):
                             script_response = requests.post(
                                 f"{BACKEND_URL}/generate-script",
-                                json=test_case
+                                json=test_case,
+                                params=WORKSPACE
                             )
                             if script_response.status_code == 200:
                                 script_data = script_response.json()
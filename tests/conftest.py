@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.environ.setdefault("GOOGLE_API_KEY", "unused-by-tests")
+
+
+@pytest.fixture
+def fake_models():
+    """The offline benchmark fakes installed in the model registry."""
+    from fakes import FakeChatModel, HashEmbeddings
+    from model_registry import models
+
+    previous = models._embedding_model, models._llm
+    models._embedding_model, models._llm = HashEmbeddings(), FakeChatModel(latency=0.0)
+    yield models
+    models._embedding_model, models._llm = previous
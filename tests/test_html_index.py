@@ -0,0 +1,19 @@
+import html_index
+from html_index import get_html_index
+
+PAGE = '<form id="login"><input id="username" name="username"><button id="submit">Log in</button></form>'
+
+
+def test_repeat_lookups_hash_the_page_once(monkeypatch):
+    hashes = []
+    real_hash = html_index.page_hash
+    monkeypatch.setattr(html_index, "page_hash", lambda content: hashes.append(1) or real_hash(content))
+    page = PAGE + "<!-- once -->"
+    first = get_html_index(page)
+    assert all(get_html_index(page) is first for _ in range(5))
+    assert len(hashes) == 1
+
+    # An equal page in a new string is hashed once more but not re-parsed
+    assert get_html_index("".join([PAGE, "<!-- once -->"])) is first
+    assert len(hashes) == 2
+    assert first.by_id["username"]
@@ -0,0 +1,32 @@
+import time
+
+from jobs import JobManager
+
+
+def finish(manager, workspace):
+    job = manager.submit(lambda job: None, workspace=workspace)
+    while not job.done:
+        time.sleep(0.001)
+    return job
+
+
+def test_finished_jobs_are_pruned_but_latest_per_workspace_kept():
+    manager = JobManager(retention_seconds=3600, max_finished=2)
+    old_a = finish(manager, "a")
+    latest_b = finish(manager, "b")
+    jobs_a = [finish(manager, "a") for _ in range(4)]
+    finish(manager, "c")
+    assert manager.get(old_a.id) is None
+    assert manager.get(latest_b.id) is not None
+    assert manager.get(jobs_a[-1].id) is not None
+    assert len(manager._jobs) <= 2 + 3  # retention count plus the latest job of a, b and c
+
+
+def test_expired_jobs_are_pruned_on_submit():
+    manager = JobManager(retention_seconds=60)
+    first = finish(manager, "a")
+    second = finish(manager, "a")
+    first.finished_at = second.finished_at = time.time() - 120
+    finish(manager, "b")
+    assert manager.get(first.id) is None
+    assert manager.get(second.id) is not None
@@ -0,0 +1,28 @@
+import json
+
+from json_ingest import iter_json_documents
+
+SPEC = {"paths": {
+    "/orders": {"post": {
+        "summary": "Create order",
+        "parameters": [{"name": f"p{i}", "in": "query", "description": "filter " * 30} for i in range(40)],
+        "responses": {str(code): {"description": "result " * 100} for code in (200, 400, 404, 500)}
+    }},
+    "/health": {"get": {"summary": "Liveness"}}
+}}
+
+
+def test_oversized_endpoint_is_split_with_its_metadata(tmp_path):
+    path = tmp_path / "api.json"
+    path.write_text(json.dumps(SPEC))
+    documents = list(iter_json_documents(str(path), max_chars=1500))
+
+    orders = [doc for doc in documents if doc.metadata.get("path") == "/orders"]
+    assert len(orders) > 1
+    assert all(len(doc.page_content) <= 1500 for doc in documents)
+    assert all(doc.metadata["method"] == "POST" and doc.metadata["kind"] == "endpoint" for doc in orders)
+    assert all(doc.page_content.startswith("POST /orders") for doc in orders)
+    assert [doc.metadata["part"] for doc in orders] == list(range(1, len(orders) + 1))
+
+    health = [doc for doc in documents if doc.metadata.get("path") == "/health"]
+    assert len(health) == 1 and "part" not in health[0].metadata
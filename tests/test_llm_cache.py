@@ -0,0 +1,47 @@
+import asyncio
+
+from fakes import FakeChatModel
+from llm_cache import LLMResponseCache
+from rag_system import RAGSystem
+
+
+def test_streamed_and_plain_requests_share_one_llm_call(tmp_path):
+    system = RAGSystem(str(tmp_path / "uploads"), persist_directory=str(tmp_path / "index"),
+                       llm_cache=LLMResponseCache(str(tmp_path / "responses.sqlite"), 3600, 100))
+    system.llm = FakeChatModel(latency=0.05)
+
+    async def stream():
+        return "".join([text async for text in system.astream_with_context("q", "context")])
+
+    async def scenario():
+        return await asyncio.gather(stream(), system.agenerate_with_context("q", "context"), stream())
+
+    first, plain, coalesced = asyncio.run(scenario())
+    assert first == plain == coalesced
+    assert system.llm.calls == 1
+    assert asyncio.run(stream()) == first  # served from the cache
+    assert system.llm.calls == 1
+    assert system.llm_cache.stats()["coalesced"] == 2
+
+
+def test_waiter_survives_a_cancelled_leader(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "responses.sqlite"), 3600, 100)
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get_or_create("key", create))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_create("key", create))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await waiter
+
+    # The waiter takes over the call instead of inheriting the leader's CancelledError
+    assert asyncio.run(scenario()) == "answer"
+    assert len(calls) == 2
+    assert cache.get("key") == "answer"
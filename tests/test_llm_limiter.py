@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+from llm_limiter import LLMBusyError, LLMLimiter
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = LLMLimiter(max_concurrency=1, queue_timeout=5)
+
+    async def scenario():
+        holder_entered = asyncio.Event()
+        release_holder = asyncio.Event()
+
+        async def holder():
+            async with limiter.slot():
+                holder_entered.set()
+                await release_holder.wait()
+
+        async def waiter():
+            async with limiter.slot():
+                pass
+
+        holding = asyncio.create_task(holder())
+        await holder_entered.wait()
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        release_holder.set()
+        await holding
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0
+
+
+def test_slots_work_across_event_loops():
+    limiter = LLMLimiter(max_concurrency=1, queue_timeout=1)
+
+    async def contend():
+        async def use_slot():
+            async with limiter.slot():
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(use_slot(), use_slot())
+
+    # A second loop (e.g. a test client or worker thread) must not hit a Condition bound to the first
+    asyncio.run(contend())
+    asyncio.run(contend())
+    assert limiter.in_flight == 0
+
+
+def test_queue_timeout_raises_busy():
+    limiter = LLMLimiter(max_concurrency=1, queue_timeout=0.05)
+
+    async def scenario():
+        async with limiter.slot():
+            with pytest.raises(LLMBusyError):
+                async with limiter.slot():
+                    pass
+
+    asyncio.run(scenario())
+    assert limiter.in_flight == 0 and limiter.rejected == 1
+
+
+def test_retried_stream_is_closed_before_the_next_attempt():
+    limiter = LLMLimiter(max_concurrency=1, queue_timeout=1, retry_base=0.001)
+    closed = []
+
+    class Chunk:
+        content = "ok"
+
+    class ProviderStream:
+        """Like an HTTP response stream: failing to read doesn't release it, aclose() does."""
+
+        def __init__(self, failing):
+            self.failing, self.sent = failing, False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if self.failing:
+                raise RuntimeError("503 unavailable")
+            if self.sent:
+                raise StopAsyncIteration
+            self.sent = True
+            return Chunk()
+
+        async def aclose(self):
+            closed.append(self.failing)
+
+    class FlakyModel:
+        attempts = 0
+
+        def astream(self, prompt):
+            self.attempts += 1
+            return ProviderStream(failing=self.attempts == 1)
+
+    async def consume():
+        return [chunk.content async for chunk in limiter.astream(FlakyModel(), "prompt")]
+
+    assert asyncio.run(consume()) == ["ok"]
+    assert closed == [True, False]
@@ -0,0 +1,39 @@
+import os
+import shutil
+
+from rag_system import RAGSystem
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supported_docs")
+
+
+def new_system(tmp_path) -> RAGSystem:
+    return RAGSystem(str(tmp_path / "uploads"), persist_directory=str(tmp_path / "index"),
+                     chunk_strategy="structure", vector_backend="quantized",
+                     embedding_cache_path=str(tmp_path / "embeddings.sqlite"))
+
+
+def test_file_without_chunks_does_not_block_warm_start(tmp_path, fake_models):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    shutil.copy(os.path.join(DOCS_DIR, "product_specs.md"), uploads)
+    (uploads / "empty.txt").write_text("")
+
+    result = new_system(tmp_path).build_knowledge_base()
+    assert result["total_chunks"] > 0
+
+    restarted = new_system(tmp_path)
+    assert restarted.load_existing_index()
+    assert restarted.retriever is not None
+
+
+def test_load_documents_skips_malformed_json(tmp_path, fake_models, capsys):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    shutil.copy(os.path.join(DOCS_DIR, "product_specs.md"), uploads)
+    # The first endpoint parses before the truncation is reached
+    (uploads / "broken.json").write_text('{"paths": {"/login": {"post": {"summary": "Log in"}}, "/logout": ')
+
+    documents = new_system(tmp_path).load_documents()
+    assert documents
+    assert not [doc for doc in documents if doc.metadata["source"].endswith("broken.json")]
+    assert "✗ Error loading broken.json" in capsys.readouterr().out
@@ -0,0 +1,61 @@
+import os
+
+from html_index import get_html_index
+from run_benchmarks import HTML_TEST_CASES
+from script_generator import ScriptGenerator
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supported_docs")
+
+with open(os.path.join(DOCS_DIR, "checkout.html"), "r", encoding="utf-8") as f:
+    PAGE = f.read()
+
+
+def test_tracked_excerpt_size_matches_render():
+    generator = ScriptGenerator(None)
+    index = get_html_index(PAGE)
+    elements = set(range(len(index.elements)))
+    growth, _ = generator._added_size(index, set(), elements, {}, set(), limit=len(PAGE) * 2)
+    assert growth == len(generator._render(index, elements)) + 1
+
+
+def test_slice_stays_within_budget_even_for_oversized_first_match():
+    generator = ScriptGenerator(None)
+    for test_case in HTML_TEST_CASES:
+        for budget in (50, 300, 2500):
+            excerpt, stats = generator.slice_html(test_case, PAGE, budget)
+            assert excerpt
+            assert stats["excerpt_tokens"] <= budget
+
+
+def test_task_ignores_store_bookkeeping_fields():
+    generator = ScriptGenerator(None)
+    test_case = dict(HTML_TEST_CASES[0])
+    stored = {**test_case, "queries": ["discounts", "promo codes"], "occurrences": 3, "cluster": 2,
+              "status": "merged", "similarity": 0.97}
+    assert generator.build_task(stored, "<form></form>", {}) == generator.build_task(test_case, "<form></form>", {})
+
+
+class StubRAG:
+    """Retrieval and generation stand-ins: every LLM script references the page's own ids."""
+
+    async def aquery_knowledge_base(self, question):
+        return "context"
+
+    async def agenerate_with_context(self, task, context, template, html_version=""):
+        return "driver.find_element(By.ID, 'email')"
+
+
+def test_malformed_case_is_reported_without_aborting_the_batch():
+    import asyncio
+
+    generator = ScriptGenerator(StubRAG())
+    cases = [dict(HTML_TEST_CASES[0]), {"test_id": "TC-BAD", "feature": "Checkout", "test_steps": None},
+             dict(HTML_TEST_CASES[2])]
+
+    async def collect():
+        return [result async for result in generator.astream_scripts(cases, PAGE)]
+
+    results = {result["test_id"]: result for result in asyncio.run(collect())}
+    assert set(results) == {"TC-001", "TC-BAD", "TC-003"}
+    assert "error" in results["TC-BAD"]
+    assert all("script" in results[test_id] for test_id in ("TC-001", "TC-003"))
@@ -0,0 +1,20 @@
+from html_index import HTMLIndex
+from script_templates import TemplateScriptSynthesizer
+
+
+def locate(page, element_id):
+    index = HTMLIndex(page)
+    element = next(element for element in index.elements if element.attrs.get("data-testid") == element_id)
+    return TemplateScriptSynthesizer("__PAGE_HTML__").locator(index, element)
+
+
+def test_radio_locator_uses_name_and_value():
+    page = '<input type="radio" name="ship" value="std" data-testid="a"><input type="radio" name="ship" value="exp">'
+    assert locate(page, "a") == r'By.CSS_SELECTOR, "input[name=\"ship\"][value=\"std\"]"'
+
+
+def test_values_needing_css_escapes_fall_back_to_the_llm():
+    page = ('<input type="radio" name="ship" value=\'say "hi"\' data-testid="a"><input type="radio" name="ship" value="x">'
+            '<span class="md:6" data-testid="b"></span>')
+    assert locate(page, "a") is None
+    assert locate(page, "b") is None
@@ -0,0 +1,14 @@
+from script_validation import ScriptValidator
+
+SCRIPT = "\n".join(f"line {number}" for number in range(1, 11))
+
+
+def test_apply_repair_splices_numbered_fragments():
+    repaired = ScriptValidator().apply_repair(SCRIPT, [(2, 3), (7, 7)], "### F1\nfixed 2\n### F2\nfixed 7\n")
+    assert repaired.splitlines() == ["line 1", "fixed 2", "line 4", "line 5", "line 6", "fixed 7",
+                                     "line 8", "line 9", "line 10"]
+
+
+def test_apply_repair_rejects_mismatched_fragment_numbers():
+    # Same number of blocks as ranges, but F3 instead of F2
+    assert ScriptValidator().apply_repair(SCRIPT, [(2, 3), (7, 7)], "### F1\nfixed 2\n### F3\nfixed 7\n") is None
@@ -0,0 +1,21 @@
+import tracemalloc
+
+import numpy as np
+
+from vector_index import QuantizedVectorStore
+
+
+def test_staged_batches_do_not_accumulate_in_memory(tmp_path):
+    store = QuantizedVectorStore("c", None, str(tmp_path), dtype="int8")
+    batch = np.random.default_rng(0).normal(size=(64, 384)).astype(np.float32)
+    tracemalloc.start()
+    for start in range(0, 19_968, 64):
+        ids = [f"id{start + i}" for i in range(64)]
+        store.upsert(ids, batch, ["text"] * 64, [{}] * 64)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # float32 rows for 20k vectors would be ~30 MB; staging keeps only ids, texts and row numbers
+    assert peak < 10_000_000
+    assert store.count() == 19_968
+    hit, _ = store.similarity_search_by_vector_with_score(batch[5].tolist(), k=1)[0]
+    assert hit.page_content == "text"